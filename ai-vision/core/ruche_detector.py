@@ -14,6 +14,7 @@ Usage:
 import argparse
 from pathlib import Path
 import time
+import uuid
 from datetime import datetime
 from ultralytics import YOLO
 
@@ -60,6 +61,10 @@ class RucheDetector:
         frame: image annotée (ou non)
         stats: dict {fps, beer_count, ...}
         detections: dict détaillé
+
+        stats["trace"] porte le contexte de trace de la frame (id,
+        horodatage de capture, durées des étapes en ms) à transmettre au
+        backend pour la mesure de latence de bout en bout.
         """
         print(f"Démarrage détection sur source: {source}")
         
@@ -72,9 +77,11 @@ class RucheDetector:
         )
 
         frame_idx = 0
+        stream_id = uuid.uuid4().hex[:8]
         
         try:
             for r in results_gen:
+                frame_ready = time.time()
                 frame_idx += 1
                 
                 # Compteurs instantanés pour cette frame
@@ -96,6 +103,7 @@ class RucheDetector:
 
                 # Préparation frame annotée
                 # Note: On force r.plot() pour avoir les boites, mais sans "show=True" dans config pour éviter display local
+                annotate_start = time.perf_counter()
                 annotated_frame = r.plot()
 
                 # Ajouter les stats textuelles sur l'image (comme dans l'ancienne version)
@@ -114,13 +122,24 @@ class RucheDetector:
                 cv2.putText(annotated_frame, f"Frelons: {current_hornets}", (10, 110),
                             cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
 
+                # Trace : YOLO fournit les durées pré/inférence/post (ms),
+                # la capture précède le prétraitement
+                stages = {name: round(ms, 2) for name, ms in (r.speed or {}).items() if ms is not None}
+                stages["annotate"] = round((time.perf_counter() - annotate_start) * 1000, 2)
+                trace = {
+                    "frame_id": f"{stream_id}-{frame_idx}",
+                    "captured_at": frame_ready - sum(ms for name, ms in stages.items() if name != "annotate") / 1000,
+                    "stages": stages
+                }
+
                 stats = {
                     "fps": fps,
                     "frame_idx": frame_idx,
                     "bees": current_bees,
                     "hornets": current_hornets,
                     "total_bees": self.detection_count["abeille"],
-                    "total_hornets": self.detection_count["frelon"]
+                    "total_hornets": self.detection_count["frelon"],
+                    "trace": trace
                 }
                 
                 yield annotated_frame, stats
@@ -6,7 +6,9 @@ import time
 import requests
 import queue
 import os
+import sys
 import glob
+import logging
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -14,12 +16,21 @@ from pydantic import BaseModel
 from typing import List, Optional, Union
 from ruche_detector import RucheDetector
 
+# Modules partagés avec le backend (shared/ : journalisation, profilage)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "shared"))
+import jsonlog
+from profiling import admin_router
+
 # Configuration
 BACKEND_URL = "http://localhost:2000/api/detections"
 # Utilisation du modèle .pt (PyTorch) pour une détection stable sur PC
 MODEL_PATH = "../models/best.pt"
 VIDEO_DIR = os.getenv("VIDEO_DIR", "assets/videos")
 
+# Logs JSON non bloquants, limités par site (boucle de détection, envois)
+jsonlog.setup_logging("video_server")
+log = logging.getLogger("smarthive.vision")
+
 app = FastAPI(title="Ruche Video Server")
 
 # CORS
@@ -31,6 +42,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profilage à la demande (/admin/*, désactivé sans ADMIN_TOKEN)
+app.include_router(admin_router())
+
 # Global State
 class VideoState:
     def __init__(self):
@@ -52,7 +66,7 @@ class SourceConfig(BaseModel):
 
 def scan_cameras(max_cameras=5):
     available_cameras = []
-    print("Scanning for cameras...")
+    log.info("Scanning for cameras")
     for i in range(max_cameras):
         try:
             cap = cv2.VideoCapture(i, cv2.CAP_DSHOW) # CAP_DSHOW is faster on Windows
@@ -63,7 +77,7 @@ def scan_cameras(max_cameras=5):
                 cap.release()
         except Exception:
             pass
-    print(f"Cameras found: {available_cameras}")
+    log.info("Cameras found", extra={"cameras": available_cameras})
     return available_cameras
 
 def scan_video_files():
@@ -111,7 +125,7 @@ async def set_source(config: SourceConfig):
         else:
             final_source = new_source
     
-    print(f"Switching source to: {final_source}")
+    log.info("Switching source", extra={"source": str(final_source)})
     with state.lock:
         state.source = final_source
         state.needs_restart = True
@@ -124,7 +138,7 @@ def detection_loop():
         current_source = state.source
         
         try:
-            print(f"Starting detection loop on {current_source}")
+            log.info("Starting detection loop", extra={"source": str(current_source)})
             # Get generator
             gen = state.detector.stream_detection(source=current_source)
             
@@ -132,12 +146,15 @@ def detection_loop():
             for frame, stats in gen:
                 # Check for source change request
                 if state.needs_restart:
-                    print("Restarting detector due to source change...")
+                    log.info("Restarting detector due to source change")
                     state.needs_restart = False
                     break # Break inner loop to restart with new source
                 
                 # Update frame for MJPEG stream
+                trace = stats["trace"]
+                encode_start = time.perf_counter()
                 ret, buffer = cv2.imencode('.jpg', frame)
+                trace["stages"]["encode"] = round((time.perf_counter() - encode_start) * 1000, 2)
                 if ret:
                     with state.lock:
                         state.current_frame = buffer.tobytes()
@@ -148,16 +165,20 @@ def detection_loop():
                 # Let's throttle slightly to 2Hz
                 if stats["frame_idx"] % 5 == 0:
                     try:
+                        # Trace propagée jusqu'au backend (cf. /api/latency)
+                        trace["sent_at"] = time.time()
                         requests.post(BACKEND_URL, json={
                             "bee_count": stats["bees"],
-                            "hornet_count": stats["hornets"]
+                            "hornet_count": stats["hornets"],
+                            "trace": trace
                         }, timeout=0.1)
-                    except:
-                        pass # Ignore network errors to keep video smooth
+                    except requests.RequestException as e:
+                        # Ignore network errors to keep video smooth (log rate-limited)
+                        log.warning("Backend unreachable", extra={"url": BACKEND_URL, "error": str(e)})
             
             # If generator finishes (end of video file), go to next video
             if not state.needs_restart:
-                print("Video ended, switching to next...")
+                log.info("Video ended, switching to next")
                 # Get list of videos
                 videos = scan_video_files()
                 if len(videos) > 1:
@@ -167,7 +188,7 @@ def detection_loop():
                         current_idx = videos.index(current_name)
                         next_idx = (current_idx + 1) % len(videos)
                         next_video = videos[next_idx]
-                        print(f"Switching to next video: {next_video}")
+                        log.info("Switching to next video", extra={"video": next_video})
                         with state.lock:
                             state.source = os.path.join(VIDEO_DIR, next_video)
                             state.needs_restart = True
@@ -176,11 +197,11 @@ def detection_loop():
                         time.sleep(0.5)
                 else:
                     # Only one video, loop it
-                    print("Looping same video...")
+                    log.info("Looping same video")
                     time.sleep(0.5)
 
         except Exception as e:
-            print(f"Error in detection loop: {e}")
+            log.error("Error in detection loop", extra={"error": str(e)})
             time.sleep(2) # Prevent rapid crash loops
 
 def generate_mjpeg():
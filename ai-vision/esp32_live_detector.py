@@ -15,7 +15,16 @@ import threading
 
 # Configuration
 import sys
+import os
 import argparse
+import logging
+
+# Logs JSON non bloquants et limités par site (cf. shared/jsonlog.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+import jsonlog
+
+jsonlog.setup_logging("esp32_detector")
+log = logging.getLogger("smarthive.esp32")
 
 # Parse arguments
 parser = argparse.ArgumentParser()
@@ -123,11 +132,13 @@ detection_count = {"abeille": 0, "frelon": 0}
 skip_counter = 0
 last_send_time = time.time()
 
-def send_data_to_backend(bee, hornet):
+def send_data_to_backend(bee, hornet, trace):
+    # Trace de la frame (capture -> dashboard, cf. /api/latency du backend)
+    trace["sent_at"] = time.time()
     try:
-        requests.post(BACKEND_URL, json={"bee_count": bee, "hornet_count": hornet}, timeout=0.5)
+        requests.post(BACKEND_URL, json={"bee_count": bee, "hornet_count": hornet, "trace": trace}, timeout=0.5)
     except Exception as e:
-        print(f"Erreur d'envoi au backend: {e}")
+        log.warning("Erreur d'envoi au backend", extra={"error": str(e)})
 
 try:
     cap = None
@@ -151,16 +162,17 @@ try:
                 pending_source = None
                 print("✓ Nouvelle source connectée")
             except Exception as e:
-                 print(f"Erreur de connexion: {e}")
+                 log.error("Erreur de connexion", extra={"source": str(current_source), "error": str(e)})
 
         if cap is None or not cap.isOpened():
              time.sleep(1) # Wait for source configuration
              continue
 
         ret, frame = cap.read()
+        captured_at = time.time()
 
         if not ret:
-            print("⚠️  Perte de connexion, tentative de reconnexion...")
+            log.warning("Perte de connexion, tentative de reconnexion", extra={"source": str(current_source)})
             cap.release()
             time.sleep(1)
             cap = cv2.VideoCapture(current_source, cv2.CAP_FFMPEG)
@@ -177,12 +189,18 @@ try:
         skip_counter = 0
 
         # Inférence YOLO
+        inference_start = time.perf_counter()
         results = model.predict(
             frame,
             imgsz=IMGSZ,
             conf=CONF,
             verbose=False,
         )
+        trace = {
+            "frame_id": f"esp32-{frame_count}",
+            "captured_at": captured_at,
+            "stages": {"inference": round((time.perf_counter() - inference_start) * 1000, 2)}
+        }
 
         # Réinitialiser les compteurs pour cette frame (ou garder cumulatif ?)
         # Ici on compte ce qu'on voit sur l'image courante
@@ -206,7 +224,7 @@ try:
         current_time = time.time()
         if current_time - last_send_time > SEND_INTERVAL:
             # Envoi dans un thread pour ne pas bloquer la vidéo
-            threading.Thread(target=send_data_to_backend, args=(current_bees, current_hornets)).start()
+            threading.Thread(target=send_data_to_backend, args=(current_bees, current_hornets, trace)).start()
             last_send_time = current_time
 
         # Afficher l'image avec détections
@@ -235,7 +253,12 @@ try:
 
         # Log toutes les 50 frames
         if frame_count % 50 == 0:
-            print(f"[{frame_count}] FPS: {fps:.2f} | Abeilles: {detection_count['abeille']} | Frelons: {detection_count['frelon']}")
+            log.info("Statistiques détection", extra={
+                "frame": frame_count,
+                "fps": round(fps, 2),
+                "bees": detection_count["abeille"],
+                "hornets": detection_count["frelon"]
+            })
 
         # Quitter avec 'q'
         if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -0,0 +1,431 @@
+"""
+SmartHive Backend - Analyses vectorisées de l'historique
+
+Colonnes de l'historique CSV chargées en mémoire sous forme de tableaux
+NumPy, puis agrégations vectorisées sur une plage de dates :
+
+- corrélations de Pearson entre champs (trafic vs température, ...)
+- profil d'activité par heure de la journée
+- totaux journaliers abeilles / frelons
+
+Le même store sert /api/history. Le fichier est append-only et trié par
+horodatage : seules les lignes ajoutées depuis le dernier chargement sont
+lues, et une plage de dates se résout par recherche dichotomique (vues,
+sans copie). Les lignes arrivées après la fenêtre de réordonnancement
+vivent dans un segment tardif à part (cf. CSVLogger) et sont insérées à
+leur place au chargement.
+
+Représentation compacte (32 octets par entrée, COLUMN_TYPES) : horodatage
+epoch en float64, mesures en float32 (bien au-delà de la résolution des
+capteurs), comptages en int32. La conversion en heure locale (format du
+CSV, heures et jours des agrégats vus par l'apiculteur) et en JSON n'a
+lieu qu'en sortie, avec orjson si disponible.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Dépendance optionnelle
+    orjson = None
+
+# Champs numériques (toutes les colonnes sauf l'horodatage)
+NUMERIC_FIELDS = ["temperature", "humidity", "mass", "luminosity", "bee_count", "hornet_count"]
+COUNT_FIELDS = ("bee_count", "hornet_count")
+# Types en mémoire (champ absent = mesure float32)
+COLUMN_TYPES = {"timestamp": np.float64, "bee_count": np.int32, "hornet_count": np.int32}
+
+
+def _hour_offsets(hours: np.ndarray, local: bool) -> np.ndarray:
+    """Décalage UTC (s) de chaque heure entière, calculé une fois par heure distincte."""
+    unique, inverse = np.unique(hours, return_inverse=True)
+    if local:
+        # Heure locale naïve -> epoch (mktime, heure d'été comprise)
+        offsets = [int(hour) * 3600 - time.mktime(time.gmtime(int(hour) * 3600)[:8] + (-1,)) for hour in unique]
+    else:
+        offsets = [time.localtime(int(hour) * 3600).tm_gmtoff for hour in unique]
+    return np.asarray(offsets, dtype=np.float64)[inverse.ravel()]
+
+
+def to_epoch(local: np.ndarray) -> np.ndarray:
+    """
+    Convertit des horodatages locaux naïfs (datetime64) en epoch.
+
+    Args:
+        local: Horodatages en heure locale, sans fuseau (format du CSV)
+
+    Returns:
+        Secondes epoch (float64)
+    """
+    seconds = local.astype("datetime64[us]").astype(np.int64) / 1e6
+    if not len(seconds):
+        return seconds
+    return seconds - _hour_offsets(np.floor_divide(seconds, 3600).astype(np.int64), local=True)
+
+
+def to_local(epoch: np.ndarray) -> np.ndarray:
+    """
+    Convertit des secondes epoch en horodatages locaux naïfs.
+
+    Args:
+        epoch: Secondes epoch
+
+    Returns:
+        datetime64[us] en heure locale, sans fuseau
+    """
+    if not len(epoch):
+        return np.empty(0, dtype="datetime64[us]")
+    local = epoch + _hour_offsets(np.floor_divide(epoch, 3600).astype(np.int64), local=False)
+    return np.round(local * 1e6).astype(np.int64).astype("datetime64[us]")
+
+
+def merge_sorted(left: Dict[str, np.ndarray], right: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Fusionne deux jeux de colonnes par horodatage.
+
+    Args:
+        left: Colonnes (prioritaires à horodatage égal)
+        right: Colonnes de mêmes champs, dans un ordre quelconque
+
+    Returns:
+        Colonnes triées par horodatage (nouveaux tableaux)
+    """
+    order = np.argsort(np.concatenate((left["timestamp"], right["timestamp"])), kind="stable")
+    return {field: np.concatenate((left[field], right[field]))[order] for field in left}
+
+
+def _file_size(filename: Optional[str]) -> int:
+    try:
+        return os.path.getsize(filename) if filename else 0
+    except OSError:
+        return 0
+
+
+class ColumnStore:
+    """
+    Colonnes de l'historique en mémoire, rafraîchies par lecture incrémentale.
+
+    Thread-safe : les requêtes d'analyse tournent dans le threadpool.
+    Seules les lignes écrites sont vues (fichier principal et segment
+    tardif), pas le tampon de réordonnancement.
+    """
+
+    def __init__(self, filename: str, headers: Sequence[str], late_filename: Optional[str] = None) -> None:
+        """
+        Args:
+            filename: Chemin du fichier CSV d'historique
+            headers: Colonnes du CSV (horodatage en premier)
+            late_filename: Segment des lignes tardives (même format, non trié)
+        """
+        self.filename = filename
+        self.late_filename = late_filename
+        self.headers = list(headers)
+        self.size = 0
+        self._offset = 0
+        self._late_offset = 0
+        # Format des lignes CSV (parseur) et types en mémoire
+        self._dtype = np.dtype([("timestamp", "datetime64[us]")] + [(field, np.float64) for field in self.headers[1:]])
+        self._types = {field: COLUMN_TYPES.get(field, np.float32) for field in self.headers}
+        self._columns: Dict[str, np.ndarray] = self._allocate(1024)
+        self._lock = threading.Lock()
+
+    def _allocate(self, capacity: int) -> Dict[str, np.ndarray]:
+        return {field: np.empty(capacity, dtype=self._types[field]) for field in self.headers}
+
+    def _append(self, rows: Dict[str, np.ndarray]) -> None:
+        count = len(rows["timestamp"])
+        capacity = len(self._columns["timestamp"])
+        if self.size + count > capacity:
+            # Croissance géométrique : ajout amorti O(1) par ligne
+            grown = self._allocate(max(capacity * 2, self.size + count))
+            for field, column in self._columns.items():
+                grown[field][:self.size] = column[:self.size]
+            self._columns = grown
+        end = self.size + count
+        for field in self.headers:
+            self._columns[field][self.size:end] = rows[field]
+        self.size = end
+
+    def parse(self, text: str) -> Dict[str, np.ndarray]:
+        """
+        Parse des lignes CSV complètes (parseur C de NumPy).
+
+        Args:
+            text: Lignes CSV, sans en-tête
+
+        Returns:
+            Colonnes typées (horodatage epoch), lignes illisibles ignorées
+        """
+        rows = self._load(text)
+        columns = {"timestamp": to_epoch(rows["timestamp"])}
+        for field in self.headers[1:]:
+            columns[field] = rows[field].astype(self._types[field])
+        return columns
+
+    def _load(self, text: str) -> np.ndarray:
+        try:
+            return np.loadtxt(io.StringIO(text), delimiter=",", dtype=self._dtype, ndmin=1)
+        except ValueError:
+            pass
+        # Ligne corrompue (écriture interrompue) : ignorée, les autres gardées.
+        # Filtre rapide sur le nombre de colonnes, puis ligne à ligne si besoin
+        separators = len(self.headers) - 1
+        lines = [line for line in text.splitlines() if line.count(",") == separators]
+        try:
+            return np.loadtxt(io.StringIO("\n".join(lines)), delimiter=",", dtype=self._dtype, ndmin=1)
+        except ValueError:
+            pass
+        rows = []
+        for line in lines:
+            try:
+                rows.append(np.loadtxt(io.StringIO(line), delimiter=",", dtype=self._dtype, ndmin=1))
+            except ValueError:
+                continue
+        return np.concatenate(rows) if rows else np.empty(0, dtype=self._dtype)
+
+    def _insert(self, rows: Dict[str, np.ndarray]) -> None:
+        # Lignes tardives (rares) : fusion à leur place, nouveaux tableaux
+        merged = merge_sorted({field: column[:self.size] for field, column in self._columns.items()}, rows)
+        count = len(merged["timestamp"])
+        self._columns = self._allocate(max(len(self._columns["timestamp"]), count))
+        for field in self.headers:
+            self._columns[field][:count] = merged[field]
+        self.size = count
+
+    def _read(self, filename: str, offset: int, file_size: int) -> Tuple[str, int]:
+        """Lignes complètes ajoutées après `offset` (sans en-tête) et nouvel offset."""
+        if file_size == offset:
+            return "", offset
+        with open(filename, mode='rb') as file:
+            file.seek(offset)
+            chunk = file.read(file_size - offset)
+        # Dernière ligne éventuellement en cours d'écriture : relue plus tard
+        complete = chunk.rfind(b"\n") + 1
+        text = chunk[:complete].decode('utf-8', errors='replace')
+        if offset == 0:
+            text = text.partition("\n")[2]
+        return text, offset + complete
+
+    def refresh(self) -> None:
+        """Charge les lignes ajoutées aux fichiers depuis le dernier appel."""
+        with self._lock:
+            file_size = _file_size(self.filename)
+            late_size = _file_size(self.late_filename)
+            if file_size < self._offset or late_size < self._late_offset:
+                # Fichier réinitialisé (reset_db) : rechargement complet
+                self.size = 0
+                self._offset = 0
+                self._late_offset = 0
+            # Fichier principal d'abord : une ligne tardive est toujours
+            # antérieure aux lignes principales écrites après elle
+            text, self._offset = self._read(self.filename, self._offset, file_size)
+            if text.strip():
+                rows = self.parse(text)
+                if len(rows["timestamp"]):
+                    self._append(rows)
+            if self.late_filename:
+                text, self._late_offset = self._read(self.late_filename, self._late_offset, late_size)
+                if text.strip():
+                    rows = self.parse(text)
+                    if len(rows["timestamp"]):
+                        self._insert(rows)
+
+    @property
+    def loaded(self) -> bool:
+        """True une fois le fichier chargé au moins une fois."""
+        return self._offset > 0
+
+    def select(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """
+        Colonnes sur une plage de dates, après rafraîchissement.
+
+        Args:
+            start: Début inclus (heure locale naïve, None = depuis le début)
+            end: Fin exclue (heure locale naïve, None = jusqu'à la fin)
+
+        Returns:
+            Champ -> tableau (vues en lecture seule sur le store)
+        """
+        self.refresh()
+        with self._lock:
+            timestamps = self._columns["timestamp"][:self.size]
+            lo = 0 if start is None else int(np.searchsorted(timestamps, start.timestamp(), side="left"))
+            hi = self.size if end is None else int(np.searchsorted(timestamps, end.timestamp(), side="left"))
+            selected = {field: column[lo:max(lo, hi)] for field, column in self._columns.items()}
+        for column in selected.values():
+            column.flags.writeable = False
+        return selected
+
+
+def _to_list(column: np.ndarray) -> list:
+    if column.dtype.kind == "M":
+        # Même forme que datetime.isoformat() : microsecondes si non nulles
+        text = np.datetime_as_string(column, unit="us")
+        whole = column.astype("datetime64[s]") == column
+        text[whole] = np.datetime_as_string(column[whole], unit="s")
+        return text.tolist()
+    if column.dtype == np.float32:
+        # Représentation la plus courte en float32 (22.3, pas 22.299999...)
+        return column.astype(str).astype(np.float64).tolist()
+    return column.tolist()
+
+
+def to_edge(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Prépare des colonnes pour la sortie : horodatages en heure locale.
+
+    Args:
+        columns: Champ -> tableau (horodatage epoch)
+
+    Returns:
+        Champ -> tableau contigu (horodatage datetime64 local)
+    """
+    return {
+        field: to_local(column) if field == "timestamp" else np.ascontiguousarray(column)
+        for field, column in columns.items()
+    }
+
+
+def to_lists(columns: Dict[str, np.ndarray]) -> Dict[str, list]:
+    """
+    Convertit des colonnes en listes Python (format `rows`, NDJSON).
+
+    Args:
+        columns: Champ -> tableau (horodatage epoch)
+
+    Returns:
+        Champ -> liste (horodatages en ISO 8601 local)
+    """
+    return {field: _to_list(column) for field, column in to_edge(columns).items()}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, np.ndarray):
+        return _to_list(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Sérialise en JSON, tableaux NumPy compris.
+
+    orjson (optionnel) sérialise les tableaux directement depuis leur
+    mémoire ; sinon repli sur json et conversion en listes.
+
+    Args:
+        value: Valeur à sérialiser (dict de colonnes, listes, ...)
+
+    Returns:
+        Document JSON encodé en UTF-8
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, default=_default).encode()
+
+
+def _range(columns: Dict[str, np.ndarray]) -> dict:
+    timestamps = columns["timestamp"]
+    if not len(timestamps):
+        return {"rows": 0, "first": None, "last": None}
+    bounds = to_local(timestamps[[0, -1]]).astype("datetime64[s]")
+    return {
+        "rows": int(len(timestamps)),
+        "first": str(bounds[0]),
+        "last": str(bounds[1]),
+    }
+
+
+def _clean(values: np.ndarray, digits: int = 3) -> List[Optional[float]]:
+    """Arrondit et remplace NaN (pas de données, variance nulle) par None."""
+    return [None if np.isnan(value) else value for value in np.round(values, digits).tolist()]
+
+
+def correlations(columns: Dict[str, np.ndarray], fields: Sequence[str] = NUMERIC_FIELDS) -> dict:
+    """
+    Matrice de corrélation de Pearson entre champs.
+
+    Args:
+        columns: Colonnes sélectionnées (ColumnStore.select)
+        fields: Champs à corréler
+
+    Returns:
+        Plage couverte, champs et matrice (None si indéfinie)
+    """
+    matrix = np.full((len(fields), len(fields)), np.nan)
+    if len(columns["timestamp"]) >= 2:
+        data = np.vstack([columns[field] for field in fields])
+        centered = data - data.mean(axis=1, keepdims=True)
+        norms = np.sqrt(np.einsum("ij,ij->i", centered, centered))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            matrix = (centered @ centered.T) / np.outer(norms, norms)
+    return {
+        **_range(columns),
+        "fields": list(fields),
+        "matrix": [_clean(row) for row in np.clip(matrix, -1.0, 1.0)],
+    }
+
+
+def hourly_profile(columns: Dict[str, np.ndarray], fields: Sequence[str] = NUMERIC_FIELDS) -> dict:
+    """
+    Profil moyen par heure de la journée (0-23, heure locale).
+
+    Args:
+        columns: Colonnes sélectionnées (ColumnStore.select)
+        fields: Champs à moyenner
+
+    Returns:
+        Plage couverte, échantillons par heure et moyennes par champ
+    """
+    hours = to_local(columns["timestamp"]).astype("datetime64[h]").astype(np.int64) % 24
+    samples = np.bincount(hours, minlength=24)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = {
+            field: _clean(np.bincount(hours, weights=columns[field], minlength=24) / samples)
+            for field in fields
+        }
+    return {
+        **_range(columns),
+        "hours": list(range(24)),
+        "samples": samples.tolist(),
+        "mean": means,
+    }
+
+
+def daily_totals(columns: Dict[str, np.ndarray]) -> dict:
+    """
+    Totaux journaliers des détections (heure locale).
+
+    Args:
+        columns: Colonnes sélectionnées (ColumnStore.select)
+
+    Returns:
+        Plage couverte, jours, échantillons, sommes et maxima par jour
+    """
+    timestamps = to_local(columns["timestamp"])
+    # Store trié : chaque jour est un bloc contigu de lignes
+    days, starts = np.unique(timestamps.astype("datetime64[D]"), return_index=True)
+    result = {
+        **_range(columns),
+        "days": [str(day) for day in days],
+        "samples": np.diff(np.append(starts, len(timestamps))).tolist(),
+    }
+    for field in COUNT_FIELDS:
+        values = columns[field]
+        totals = np.add.reduceat(values, starts) if len(days) else values[:0]
+        peaks = np.maximum.reduceat(values, starts) if len(days) else values[:0]
+        result[f"{field}_total"] = totals.astype(np.int64).tolist()
+        result[f"{field}_max"] = peaks.astype(np.int64).tolist()
+    return result
@@ -0,0 +1,163 @@
+"""
+SmartHive Backend - Détection d'anomalies en flux
+
+Détecteurs en ligne alimentés par chaque mesure capteur, à état constant
+par série (aucune relecture de l'historique) :
+
+- EWMA de la moyenne et de la variance : résidu standardisé (z-score)
+  de chaque mesure par rapport au niveau attendu
+- Pic : |z| au-delà d'un seuil (ex: chute brutale de masse = essaimage)
+- Dérive : CUSUM bilatéral sur les résidus standardisés, qui cumule les
+  petits écarts persistants (ex: température du couvain qui dérive)
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import math
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+
+class SeriesConfig(NamedTuple):
+    """Paramètres d'un détecteur."""
+    alpha: float = 0.1           # Poids EWMA d'une nouvelle mesure
+    z_threshold: float = 4.0     # Seuil de pic (écarts-types)
+    cusum_k: float = 0.5         # Tolérance CUSUM par mesure (écarts-types)
+    cusum_h: float = 8.0         # Seuil de dérive CUSUM
+    min_std: float = 0.05        # Écart-type plancher (résolution capteur)
+    warmup: int = 20             # Mesures avant la première alerte
+    cooldown: float = 600.0      # Délai min entre deux alertes d'une règle (s)
+
+
+# Séries surveillées : masse (kg) et température (°C)
+DEFAULT_SERIES: Dict[str, SeriesConfig] = {
+    "mass": SeriesConfig(min_std=0.05),
+    "temperature": SeriesConfig(min_std=0.1),
+}
+
+
+class SeriesDetector:
+    """Détecteur EWMA + CUSUM d'une série, O(1) en temps et en mémoire."""
+
+    __slots__ = ("config", "mean", "var", "count", "cusum_pos", "cusum_neg", "_last_alert")
+
+    def __init__(self, config: SeriesConfig) -> None:
+        self.config = config
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.cusum_pos = 0.0
+        self.cusum_neg = 0.0
+        self._last_alert: Dict[str, float] = {}
+
+    def _cooled(self, rule: str, timestamp: float) -> bool:
+        last = self._last_alert.get(rule)
+        if last is not None and timestamp - last < self.config.cooldown:
+            return False
+        self._last_alert[rule] = timestamp
+        return True
+
+    def update(self, value: float, timestamp: float) -> List[dict]:
+        """
+        Intègre une mesure.
+
+        Args:
+            value: Valeur mesurée
+            timestamp: Horodatage de la mesure (epoch)
+
+        Returns:
+            Anomalies détectées sur cette mesure (souvent vide)
+        """
+        cfg = self.config
+        self.count += 1
+        if self.count == 1:
+            self.mean = value
+            return []
+
+        expected = self.mean
+        std = max(math.sqrt(self.var), cfg.min_std)
+        z = (value - expected) / std
+
+        # Mise à jour EWMA (moyenne et variance exponentiellement pondérées)
+        diff = value - self.mean
+        increment = cfg.alpha * diff
+        self.mean += increment
+        self.var = (1 - cfg.alpha) * (self.var + diff * increment)
+
+        if self.count <= cfg.warmup:
+            return []
+
+        anomalies = []
+        if abs(z) >= cfg.z_threshold:
+            if self._cooled("spike", timestamp):
+                anomalies.append({
+                    "rule": "spike",
+                    "direction": "up" if z > 0 else "down",
+                    "score": round(z, 2),
+                    "value": value,
+                    "expected": round(expected, 3),
+                })
+            # Changement de niveau (essaimage, récolte) : la référence est
+            # recalée pour ne pas le signaler une seconde fois comme dérive
+            self.mean = value
+            self.cusum_pos = self.cusum_neg = 0.0
+            return anomalies
+
+        self.cusum_pos = max(0.0, self.cusum_pos + z - cfg.cusum_k)
+        self.cusum_neg = max(0.0, self.cusum_neg - z - cfg.cusum_k)
+        if self.cusum_pos > cfg.cusum_h or self.cusum_neg > cfg.cusum_h:
+            up = self.cusum_pos > cfg.cusum_h
+            score = self.cusum_pos if up else self.cusum_neg
+            self.cusum_pos = self.cusum_neg = 0.0
+            if self._cooled("drift", timestamp):
+                anomalies.append({
+                    "rule": "drift",
+                    "direction": "up" if up else "down",
+                    "score": round(score, 2),
+                    "value": value,
+                    "expected": round(expected, 3),
+                })
+        return anomalies
+
+
+class AnomalyMonitor:
+    """
+    Ensemble de détecteurs indexés par (ruche, champ).
+
+    Thread-safe : alimenté par la thread MQTT et par la boucle asyncio.
+    """
+
+    def __init__(self, series: Optional[Dict[str, SeriesConfig]] = None) -> None:
+        """
+        Args:
+            series: Champ surveillé -> paramètres (défaut: DEFAULT_SERIES)
+        """
+        self.series = DEFAULT_SERIES if series is None else series
+        self._detectors: Dict[tuple, SeriesDetector] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, values: dict, timestamp: float, hive: str = "default") -> List[dict]:
+        """
+        Intègre une mise à jour capteur.
+
+        Args:
+            values: Champs reçus (seuls les champs surveillés sont lus)
+            timestamp: Horodatage de la mesure (epoch)
+            hive: Identifiant de ruche (une série par ruche et par champ)
+
+        Returns:
+            Anomalies détectées, complétées de `series`, `hive` et `timestamp`
+        """
+        anomalies = []
+        with self._lock:
+            for field, config in self.series.items():
+                if field not in values:
+                    continue
+                key = (hive, field)
+                detector = self._detectors.get(key)
+                if detector is None:
+                    detector = self._detectors[key] = SeriesDetector(config)
+                for anomaly in detector.update(float(values[field]), timestamp):
+                    anomalies.append({"series": field, "hive": hive, "timestamp": timestamp, **anomaly})
+        return anomalies
@@ -0,0 +1,199 @@
+"""
+Outils communs aux benchmarks backend : percentiles, échantillonnage
+CPU/RSS du serveur et lancement d'une instance locale de l'API.
+
+psutil est optionnel : sans lui, CPU/RSS sont lus dans /proc (Linux).
+"""
+
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import psutil
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    psutil = None
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def percentiles(values: Sequence[float], points=(50, 90, 95, 99)) -> Dict[str, float]:
+    """
+    Calcule min/moyenne/percentiles/max d'une série (méthode nearest-rank).
+
+    Args:
+        values: Échantillons (ms, s...)
+        points: Percentiles à calculer
+
+    Returns:
+        Dictionnaire {"min", "mean", "p50", ..., "max"} (vide si aucune valeur)
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    n = len(ordered)
+    result = {"min": ordered[0], "mean": sum(ordered) / n}
+    for p in points:
+        idx = min(n - 1, max(0, math.ceil(p / 100.0 * n) - 1))
+        result[f"p{p}"] = ordered[idx]
+    result["max"] = ordered[-1]
+    return result
+
+
+def format_stats(stats: Dict[str, float], unit: str = "ms") -> str:
+    """Formate le résultat de percentiles() sur une ligne."""
+    if not stats:
+        return "n/a"
+    return " | ".join(f"{k}={v:.2f}{unit}" for k, v in stats.items())
+
+
+class ProcessSampler:
+    """
+    Échantillonne CPU (%) et RSS (MB) d'un processus et de ses enfants.
+
+    Les enfants sont inclus pour couvrir le mode multi-worker.
+    """
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.cpu: List[float] = []
+        self.rss: List[float] = []
+        self._last: Optional[tuple] = None
+
+    def _pids(self) -> List[int]:
+        if psutil:
+            try:
+                proc = psutil.Process(self.pid)
+                return [self.pid] + [c.pid for c in proc.children(recursive=True)]
+            except psutil.Error:
+                return []
+        return [self.pid]
+
+    def _read(self) -> Optional[tuple]:
+        """Retourne (temps CPU cumulé en s, RSS en MB) pour l'arbre de processus."""
+        cpu_time = 0.0
+        rss = 0.0
+        for pid in self._pids():
+            if psutil:
+                try:
+                    proc = psutil.Process(pid)
+                    times = proc.cpu_times()
+                    cpu_time += times.user + times.system
+                    rss += proc.memory_info().rss / 1e6
+                except psutil.Error:
+                    continue
+            else:
+                try:
+                    with open(f"/proc/{pid}/stat") as f:
+                        fields = f.read().rsplit(")", 1)[1].split()
+                    ticks = os.sysconf("SC_CLK_TCK")
+                    cpu_time += (int(fields[11]) + int(fields[12])) / ticks
+                    rss += int(fields[21]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+                except (OSError, IndexError, ValueError):
+                    return None
+        return cpu_time, rss
+
+    def sample(self) -> None:
+        """Prend un échantillon ; le CPU est calculé depuis l'échantillon précédent."""
+        now = time.perf_counter()
+        reading = self._read()
+        if reading is None:
+            return
+        if self._last is not None:
+            elapsed = now - self._last[0]
+            if elapsed > 0:
+                self.cpu.append(100.0 * (reading[0] - self._last[1]) / elapsed)
+        self.rss.append(reading[1])
+        self._last = (now, reading[0])
+
+    def summary(self) -> Dict[str, float]:
+        """Résumé CPU moyen/max et RSS max."""
+        if not self.rss:
+            return {}
+        return {
+            "cpu_mean_pct": sum(self.cpu) / len(self.cpu) if self.cpu else 0.0,
+            "cpu_max_pct": max(self.cpu) if self.cpu else 0.0,
+            "rss_max_mb": max(self.rss),
+        }
+
+
+def spawn_backend(port: int, workers: int = 1, env: Optional[dict] = None) -> subprocess.Popen:
+    """
+    Lance l'API réelle (backend/main.py) sur un historique temporaire.
+
+    Args:
+        port: Port HTTP
+        workers: Nombre de workers (1 = processus unique, sans reload)
+        env: Variables d'environnement supplémentaires
+
+    Returns:
+        Processus lancé (prêt lorsque /api/ws/stats répond)
+    """
+    history = tempfile.NamedTemporaryFile(prefix="bench-history-", suffix=".csv", delete=False)
+    history.close()
+    os.unlink(history.name)
+    full_env = dict(os.environ, HISTORY_FILE=history.name, **(env or {}))
+    if workers > 1:
+        cmd = [sys.executable, "main.py", "--port", str(port), "--workers", str(workers)]
+    else:
+        # Pings du protocole comme `python main.py` (cf. WS_PING_INTERVAL)
+        cmd = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+               "--log-level", "warning",
+               "--ws-ping-interval", full_env.get("WS_PING_INTERVAL", "20"),
+               "--ws-ping-timeout", full_env.get("WS_IDLE_TIMEOUT", "60")]
+    return subprocess.Popen(cmd, cwd=BACKEND_DIR, env=full_env)
+
+
+def spawn_broker(port: int) -> subprocess.Popen:
+    """
+    Lance le broker MQTT minimal (backend/mini_broker.py).
+
+    Args:
+        port: Port TCP d'écoute
+
+    Returns:
+        Processus lancé (prêt lorsque le port accepte les connexions)
+    """
+    import socket
+
+    proc = subprocess.Popen([sys.executable, "mini_broker.py", "--host", "127.0.0.1",
+                             "--port", str(port)], cwd=BACKEND_DIR)
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise TimeoutError(f"Broker non disponible sur le port {port}")
+
+
+def local_mqtt_env(port: int, topic: str) -> dict:
+    """Variables d'environnement pour brancher le backend sur un broker local."""
+    return {
+        "MQTT_BROKER": "127.0.0.1",
+        "MQTT_PORT": str(port),
+        "MQTT_TRANSPORT": "tcp",
+        "MQTT_TLS": "0",
+        "MQTT_TOPIC": topic,
+    }
+
+
+def wait_ready(base_url: str, timeout: float = 20.0) -> None:
+    """Attend que l'API réponde (lève TimeoutError sinon)."""
+    import urllib.request
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/ws/stats", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"API non disponible sur {base_url}")
@@ -0,0 +1,236 @@
+"""
+Benchmark du chemin d'ingestion MQTT du backend SmartHive.
+
+Publie des uplinks au format TTN (uplink_message.decoded_payload) à débit
+croissant et mesure, pour chaque palier, la latence de bout en bout
+publication MQTT -> on_message -> persistance -> broadcast WebSocket,
+ainsi que le débit réellement diffusé. Le débit de saturation est le
+dernier palier tenu (livraison >= --min-delivery et p95 <= --max-p95).
+
+Chaque message porte un identifiant dans `lum`, relu dans le
+sensor_update reçu sur /ws.
+
+Usage:
+  python benchmark/mqtt_ingest.py --spawn                       # broker + backend locaux
+  python benchmark/mqtt_ingest.py --spawn --rates 100,500,1000,2000 --step 5
+  python benchmark/mqtt_ingest.py --url http://localhost:2000 --mqtt-port 1883
+
+Dépendances : paho-mqtt, websockets (psutil optionnel),
+  pip install -r requirements-dev.txt
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import sys
+import time
+from typing import Dict, List
+
+import paho.mqtt.client as mqtt
+import websockets
+
+from common import (BACKEND_DIR, ProcessSampler, format_stats, local_mqtt_env, percentiles,
+                    spawn_backend, spawn_broker, wait_ready)
+
+# Layout de trame du backend : le benchmark suit ses évolutions
+sys.path.insert(0, str(BACKEND_DIR))
+from codec import SENSOR_FRAME  # noqa: E402
+
+TOPIC = "v3/bench@ttn/devices/bench/up"
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", type=str, default="http://localhost:2000",
+                   help="URL du backend (ignorée avec --spawn)")
+    p.add_argument("--spawn", action="store_true",
+                   help="Lance mini_broker.py et main.py branché dessus (historique temporaire)")
+    p.add_argument("--port", type=int, default=2100, help="Port HTTP du backend --spawn")
+    p.add_argument("--mqtt-host", dest="mqtt_host", type=str, default="127.0.0.1")
+    p.add_argument("--mqtt-port", dest="mqtt_port", type=int, default=1884)
+    p.add_argument("--topic", type=str, default=TOPIC,
+                   help="Topic publié (doit être celui écouté par le backend)")
+    p.add_argument("--rates", type=str, default="50,100,200,500,1000,2000,5000",
+                   help="Paliers de débit (msg/s), séparés par des virgules")
+    p.add_argument("--step", type=float, default=5.0, help="Durée d'un palier (s)")
+    p.add_argument("--drain", type=float, default=3.0, help="Attente max après un palier (s)")
+    p.add_argument("--min-delivery", dest="min_delivery", type=float, default=0.95)
+    p.add_argument("--max-p95", dest="max_p95", type=float, default=500.0,
+                   help="p95 de latence max (ms) pour considérer un palier tenu")
+    p.add_argument("--raw", action="store_true",
+                   help="Publie des frm_payload bruts (décodage local par le backend)")
+    p.add_argument("--json", action="store_true")
+    return p.parse_args()
+
+
+def uplink(msg_id: int, raw: bool = False) -> bytes:
+    """
+    Uplink TTN minimal ; l'identifiant voyage dans `lum` (exact en
+    float32 jusqu'à 2^24).
+    """
+    message = {"f_port": 1}
+    if raw:
+        frame = SENSOR_FRAME.encode({"temperature1": 20.0, "masse": 30.0, "temp3": 20.0,
+                                     "humd": 60.0, "lum": float(msg_id)})
+        message["frm_payload"] = base64.b64encode(frame).decode()
+    else:
+        message["decoded_payload"] = {"temperature1": 20.0, "masse": 30.0, "humd": 60.0,
+                                      "lum": float(msg_id)}
+    return json.dumps({"end_device_ids": {"device_id": "bench"},
+                       "uplink_message": message}).encode()
+
+
+class Receiver:
+    """Client /ws qui associe chaque sensor_update à son instant de publication."""
+
+    def __init__(self) -> None:
+        self.sent_at: Dict[int, float] = {}
+        self.latencies: Dict[int, float] = {}
+
+    async def run(self, ws_url: str, stop: asyncio.Event) -> None:
+        async with websockets.connect(ws_url, max_queue=None) as ws:
+            await ws.recv()  # init
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.perf_counter()
+                message = json.loads(raw)
+                if message.get("type") == "ping":
+                    await ws.send('{"type": "pong"}')
+                elif message.get("type") == "sensor_update":
+                    msg_id = int(message["data"].get("luminosity", -1))
+                    sent = self.sent_at.get(msg_id)
+                    if sent is not None:
+                        self.latencies[msg_id] = (now - sent) * 1000.0
+
+
+async def run_step(client: mqtt.Client, topic: str, receiver: Receiver, rate: float,
+                   duration: float, drain: float, first_id: int, raw: bool = False) -> dict:
+    """Publie à `rate` msg/s pendant `duration` puis attend la livraison."""
+    tick = 0.01
+    total = int(rate * duration)
+    ids = list(range(first_id, first_id + total))
+    start = time.perf_counter()
+    sent = 0
+    while sent < total:
+        due = min(total, int((time.perf_counter() - start) * rate) + 1)
+        while sent < due:
+            msg_id = ids[sent]
+            receiver.sent_at[msg_id] = time.perf_counter()
+            client.publish(topic, uplink(msg_id, raw), qos=0)
+            sent += 1
+        await asyncio.sleep(tick)
+    publish_time = time.perf_counter() - start
+
+    # Attente de la fin de livraison (ou du délai max)
+    deadline = time.perf_counter() + drain
+    last = -1
+    while time.perf_counter() < deadline:
+        done = sum(1 for i in ids if i in receiver.latencies)
+        if done == total or done == last:
+            break
+        last = done
+        await asyncio.sleep(0.3)
+    elapsed = time.perf_counter() - start
+
+    latencies = [receiver.latencies[i] for i in ids if i in receiver.latencies]
+    return {
+        "rate": rate,
+        "published": total,
+        "publish_rate": total / publish_time if publish_time else 0.0,
+        "delivered": len(latencies),
+        "delivery": len(latencies) / total if total else 0.0,
+        "delivered_rate": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+
+
+async def run_bench(args, base_url: str, sampler) -> List[dict]:
+    receiver = Receiver()
+    stop = asyncio.Event()
+    ws_task = asyncio.create_task(receiver.run(base_url.replace("http", "ws", 1) + "/ws", stop))
+    await asyncio.sleep(0.5)
+
+    client = mqtt.Client()
+    client.max_queued_messages_set(0)
+    client.connect(args.mqtt_host, args.mqtt_port, 60)
+    client.loop_start()
+
+    results = []
+    next_id = 1
+    try:
+        for rate in [float(r) for r in args.rates.split(",") if r.strip()]:
+            print(f"\n>>> Palier {rate:.0f} msg/s pendant {args.step:.0f}s")
+            if sampler:
+                sampler.sample()
+            step = await run_step(client, args.topic, receiver, rate, args.step, args.drain, next_id,
+                                  args.raw)
+            if sampler:
+                sampler.sample()
+                step["server"] = {"cpu_pct": sampler.cpu[-1] if sampler.cpu else 0.0,
+                                  "rss_mb": sampler.rss[-1]}
+            next_id += step["published"]
+            results.append(step)
+            print(f"    publié {step['publish_rate']:.0f}/s | livré {step['delivery'] * 100:.1f}% "
+                  f"({step['delivered_rate']:.0f}/s)")
+            print(f"    latence: {format_stats(step['latency_ms'])}")
+            if "server" in step:
+                print(f"    serveur: CPU {step['server']['cpu_pct']:.0f}% | "
+                      f"RSS {step['server']['rss_mb']:.0f} MB")
+            if not step_ok(step, args):
+                print("    -> saturation atteinte")
+                break
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        stop.set()
+        await ws_task
+    return results
+
+
+def step_ok(step: dict, args) -> bool:
+    p95 = step["latency_ms"].get("p95", float("inf"))
+    return step["delivery"] >= args.min_delivery and p95 <= args.max_p95
+
+
+def main():
+    args = parse_args()
+    procs = []
+    base_url = args.url.rstrip("/")
+    sampler = None
+    try:
+        if args.spawn:
+            procs.append(spawn_broker(args.mqtt_port))
+            backend = spawn_backend(args.port, env=local_mqtt_env(args.mqtt_port, args.topic))
+            procs.append(backend)
+            base_url = f"http://127.0.0.1:{args.port}"
+            sampler = ProcessSampler(backend.pid)
+        wait_ready(base_url)
+        # Laisse le backend s'abonner au topic
+        time.sleep(1.0)
+        results = asyncio.run(run_bench(args, base_url, sampler))
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    sustained = [r["rate"] for r in results if step_ok(r, args)]
+    print("\n" + "=" * 60)
+    print("INGESTION MQTT -> BROADCAST")
+    print("=" * 60)
+    for r in results:
+        flag = "ok " if step_ok(r, args) else "SAT"
+        p95 = r["latency_ms"].get("p95", float("nan"))
+        print(f"  [{flag}] {r['rate']:>7.0f} msg/s -> livré {r['delivered_rate']:>7.0f}/s "
+              f"({r['delivery'] * 100:5.1f}%) p95={p95:.1f}ms")
+    print(f"Débit soutenu max: {max(sustained):.0f} msg/s" if sustained else "Aucun palier tenu")
+    print("=" * 60)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+"""
+Benchmark de fan-out WebSocket du backend SmartHive.
+
+Ouvre des milliers de clients asyncio sur /ws pendant qu'un driver poste
+sur /api/detections à débit fixe, puis mesure :
+  - la latence de livraison POST -> réception client (percentiles)
+  - le débit de messages reçus (msg/s, tous clients confondus)
+  - les clients perdus (connexion refusée, fermée ou messages manquants)
+  - CPU/RSS du serveur (avec --spawn ou --server-pid)
+
+Chaque POST porte un identifiant dans bee_count, ce qui permet de
+retrouver l'instant d'envoi à la réception (même horloge, même processus).
+
+Usage:
+  python benchmark/ws_fanout.py --spawn --clients 2000 --rate 20 --duration 30
+  python benchmark/ws_fanout.py --url http://localhost:2000 --server-pid 1234
+
+Dépendances : websockets, httpx (psutil optionnel),
+  pip install -r requirements-dev.txt
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import httpx
+import websockets
+
+from common import ProcessSampler, format_stats, percentiles, spawn_backend, wait_ready
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", type=str, default="http://localhost:2000",
+                   help="URL de base de l'API (ignorée avec --spawn)")
+    p.add_argument("--spawn", action="store_true",
+                   help="Lance une instance locale de main.py sur un historique temporaire")
+    p.add_argument("--port", type=int, default=2100, help="Port de l'instance lancée par --spawn")
+    p.add_argument("--workers", type=int, default=1, help="Workers de l'instance --spawn")
+    p.add_argument("--server-pid", dest="server_pid", type=int, default=None,
+                   help="PID du serveur à échantillonner (CPU/RSS) sans --spawn")
+    p.add_argument("--clients", type=int, default=1000)
+    p.add_argument("--ramp", type=float, default=200.0,
+                   help="Connexions ouvertes par seconde")
+    p.add_argument("--rate", type=float, default=10.0, help="POST /api/detections par seconde")
+    p.add_argument("--duration", type=float, default=20.0, help="Durée du driver (s)")
+    p.add_argument("--drain", type=float, default=2.0,
+                   help="Attente après le dernier POST avant le bilan (s)")
+    p.add_argument("--json", action="store_true", help="Affiche aussi le rapport en JSON")
+    return p.parse_args()
+
+
+class Results:
+    """Mesures partagées entre clients et driver."""
+
+    def __init__(self) -> None:
+        self.sent_at: Dict[int, float] = {}
+        self.latencies_ms: List[float] = []
+        self.received = 0
+        self.connected = 0
+        self.failed = 0
+        self.dropped = 0
+        self.post_errors = 0
+        self.per_client: List[int] = []
+
+
+async def run_client(ws_url: str, results: Results, stop: asyncio.Event) -> None:
+    """Client WebSocket : mesure les detection_update et répond aux pings."""
+    count = 0
+    try:
+        async with websockets.connect(ws_url, max_queue=None, open_timeout=30) as ws:
+            init = json.loads(await ws.recv())
+            if init.get("type") != "init":
+                raise RuntimeError("init attendu")
+            results.connected += 1
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                now = time.perf_counter()
+                message = json.loads(raw)
+                if message.get("type") == "ping":
+                    await ws.send('{"type": "pong"}')
+                    continue
+                if message.get("type") != "detection_update":
+                    continue
+                sent = results.sent_at.get(message["data"]["bee_count"])
+                if sent is not None:
+                    results.latencies_ms.append((now - sent) * 1000.0)
+                    results.received += 1
+                    count += 1
+    except websockets.ConnectionClosed:
+        results.dropped += 1
+    except Exception:
+        results.failed += 1
+    finally:
+        results.per_client.append(count)
+
+
+async def run_driver(base_url: str, rate: float, duration: float, results: Results) -> int:
+    """Poste des détections numérotées à débit constant."""
+    interval = 1.0 / rate
+    total = int(rate * duration)
+    start = time.perf_counter()
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        for i in range(1, total + 1):
+            target = start + i * interval
+            delay = target - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            results.sent_at[i] = time.perf_counter()
+            try:
+                response = await client.post("/api/detections",
+                                             json={"bee_count": i, "hornet_count": 0})
+                response.raise_for_status()
+            except httpx.HTTPError:
+                results.post_errors += 1
+                results.sent_at.pop(i, None)
+    return total - results.post_errors
+
+
+async def sample_loop(sampler: ProcessSampler, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        sampler.sample()
+        await asyncio.sleep(0.5)
+
+
+async def run_bench(args, base_url: str, pid) -> dict:
+    ws_url = base_url.replace("http", "ws", 1) + "/ws"
+    results = Results()
+    stop = asyncio.Event()
+    sampler = ProcessSampler(pid) if pid else None
+    sampler_task = asyncio.create_task(sample_loop(sampler, stop)) if sampler else None
+
+    print(f"Ouverture de {args.clients} clients sur {ws_url} ({args.ramp:.0f}/s)...")
+    clients = []
+    for i in range(args.clients):
+        clients.append(asyncio.create_task(run_client(ws_url, results, stop)))
+        if args.ramp > 0:
+            await asyncio.sleep(1.0 / args.ramp)
+    while results.connected + results.failed + results.dropped < args.clients:
+        await asyncio.sleep(0.1)
+    print(f"Clients connectés: {results.connected} (échecs: {results.failed})")
+
+    print(f"Driver: {args.rate:.1f} POST/s pendant {args.duration:.0f}s...")
+    t0 = time.perf_counter()
+    posted = await run_driver(base_url, args.rate, args.duration, results)
+    await asyncio.sleep(args.drain)
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    await asyncio.gather(*clients)
+    if sampler_task:
+        await sampler_task
+
+    expected = posted * results.connected
+    incomplete = sum(1 for c in results.per_client if c < posted)
+    return {
+        "clients": args.clients,
+        "connected": results.connected,
+        "failed_connect": results.failed,
+        "dropped": results.dropped,
+        "incomplete_clients": incomplete,
+        "posted": posted,
+        "post_errors": results.post_errors,
+        "delivered": results.received,
+        "delivery_ratio": results.received / expected if expected else 0.0,
+        "msg_per_s": results.received / elapsed if elapsed else 0.0,
+        "latency_ms": percentiles(results.latencies_ms),
+        "server": sampler.summary() if sampler else {},
+    }
+
+
+def print_report(report: dict) -> None:
+    print("\n" + "=" * 60)
+    print("RÉSULTATS FAN-OUT WEBSOCKET")
+    print("=" * 60)
+    print(f"Clients: {report['connected']}/{report['clients']} connectés | "
+          f"échecs: {report['failed_connect']} | perdus: {report['dropped']} | "
+          f"incomplets: {report['incomplete_clients']}")
+    print(f"POST: {report['posted']} (erreurs: {report['post_errors']})")
+    print(f"Livrés: {report['delivered']} ({report['delivery_ratio'] * 100:.1f}%) | "
+          f"{report['msg_per_s']:.0f} msg/s")
+    print(f"Latence: {format_stats(report['latency_ms'])}")
+    server = report["server"]
+    if server:
+        print(f"Serveur: CPU moy {server['cpu_mean_pct']:.0f}% / max {server['cpu_max_pct']:.0f}% | "
+              f"RSS max {server['rss_max_mb']:.0f} MB")
+    print("=" * 60)
+
+
+def main():
+    args = parse_args()
+    proc = None
+    base_url = args.url.rstrip("/")
+    pid = args.server_pid
+    if args.spawn:
+        base_url = f"http://127.0.0.1:{args.port}"
+        # Plafond de connexions relevé pour ne mesurer que le fan-out
+        proc = spawn_backend(args.port, args.workers,
+                             env={"WS_MAX_CONNECTIONS": str(args.clients + 100)})
+        pid = proc.pid
+    try:
+        wait_ready(base_url)
+        report = asyncio.run(run_bench(args, base_url, pid))
+        print_report(report)
+        if args.json:
+            print(json.dumps(report, indent=2))
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+SmartHive Backend - Bus inter-processus
+
+Pub/sub local entre le processus propriétaire (MQTT + persistance) et
+les workers uvicorn qui servent les WebSocket :
+- Le propriétaire diffuse chaque évènement numéroté à tous les workers
+- Les workers renvoient au propriétaire les ingestions reçues en HTTP
+
+Transport : socket Unix (POSIX) ou TCP local ("host:port", Windows),
+messages JSON délimités par des retours à la ligne.
+
+Chaque worker a sa file d'envoi bornée, vidée par sa propre tâche : un
+worker lent ne retarde pas les autres. File pleine = worker déconnecté ;
+il se reconnecte et se resynchronise par le message `hello`.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+# Adresse du bus : chemin de socket Unix ou "host:port"
+BUS_ADDRESS = os.getenv(
+    "BUS_ADDRESS",
+    "127.0.0.1:2003" if os.name == "nt" else "/tmp/smarthive-bus.sock"
+)
+# Délai entre deux tentatives de connexion d'un worker
+BUS_RETRY_DELAY = float(os.getenv("BUS_RETRY_DELAY", "0.5"))
+# Taille maximale d'une ligne (un hello contient le buffer de rejeu)
+BUS_LINE_LIMIT = 16 * 1024 * 1024
+# Messages en attente par worker avant déconnexion du retardataire
+BUS_QUEUE_SIZE = int(os.getenv("BUS_QUEUE_SIZE", "10000"))
+
+log = logging.getLogger("smarthive.bus")
+
+
+def _parse_address(address: str) -> Optional[tuple]:
+    """
+    Interprète une adresse de bus.
+
+    Args:
+        address: Chemin de socket Unix ou "host:port"
+
+    Returns:
+        (host, port) pour TCP, None pour une socket Unix
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return host, int(port)
+    return None
+
+
+class BusServer:
+    """
+    Côté propriétaire du bus : accepte les workers et leur diffuse les évènements.
+
+    Chaque worker reçoit à la connexion un message `hello` (état courant
+    et buffer de rejeu) puis tous les évènements publiés.
+    """
+
+    def __init__(
+        self,
+        on_hello: Callable[[], dict],
+        on_command: Callable[[dict], Awaitable[None]],
+        address: str = BUS_ADDRESS
+    ) -> None:
+        """
+        Initialise le serveur de bus.
+
+        Args:
+            on_hello: Construit le message d'accueil d'un nouveau worker
+            on_command: Traite une commande envoyée par un worker
+            address: Adresse d'écoute
+        """
+        self.address = address
+        self.on_hello = on_hello
+        self.on_command = on_command
+        # Worker -> file des lignes à envoyer
+        self.clients: Dict[asyncio.StreamWriter, asyncio.Queue] = {}
+        self.dropped_workers = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Démarre l'écoute sur l'adresse configurée."""
+        tcp = _parse_address(self.address)
+        if tcp:
+            self._server = await asyncio.start_server(
+                self._handle, tcp[0], tcp[1], limit=BUS_LINE_LIMIT
+            )
+        else:
+            if os.path.exists(self.address):
+                os.unlink(self.address)
+            self._server = await asyncio.start_unix_server(
+                self._handle, self.address, limit=BUS_LINE_LIMIT
+            )
+        log.info("Bus en écoute", extra={"address": self.address})
+
+    async def stop(self) -> None:
+        """Ferme le serveur et toutes les connexions workers."""
+        for writer in list(self.clients):
+            writer.close()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Gère la connexion d'un worker jusqu'à sa fermeture.
+
+        Args:
+            reader: Flux entrant (commandes du worker)
+            writer: Flux sortant (évènements)
+        """
+        hello = dict(self.on_hello(), op="hello")
+        queue: asyncio.Queue = asyncio.Queue(maxsize=BUS_QUEUE_SIZE)
+        queue.put_nowait(json.dumps(hello).encode() + b"\n")
+        self.clients[writer] = queue
+        sender = asyncio.create_task(self._send_loop(writer, queue))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    await self.on_command(json.loads(line))
+                except Exception as e:
+                    log.warning("Erreur commande worker", extra={"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.pop(writer, None)
+            sender.cancel()
+            writer.close()
+
+    async def _send_loop(self, writer: asyncio.StreamWriter, queue: asyncio.Queue) -> None:
+        """
+        Vide la file d'un worker (drain par worker, sans bloquer les autres).
+
+        Args:
+            writer: Flux sortant du worker
+            queue: Lignes en attente
+        """
+        try:
+            while True:
+                writer.write(await queue.get())
+                if queue.empty():
+                    await writer.drain()
+        except ConnectionError:
+            self.clients.pop(writer, None)
+            writer.close()
+
+    def publish(self, message: dict) -> None:
+        """
+        Diffuse un message à tous les workers connectés.
+
+        Sérialisé une seule fois puis déposé dans la file de chaque
+        worker, sans attente. Un worker dont la file est pleine est
+        déconnecté (resynchronisé à sa reconnexion). Doit être appelé
+        depuis la boucle du bus.
+
+        Args:
+            message: Message JSON (champ `op` requis)
+        """
+        if not self.clients:
+            return
+        line = json.dumps(message).encode() + b"\n"
+        for writer, queue in list(self.clients.items()):
+            if writer.is_closing():
+                self.clients.pop(writer, None)
+                continue
+            try:
+                queue.put_nowait(line)
+            except asyncio.QueueFull:
+                self.clients.pop(writer, None)
+                self.dropped_workers += 1
+                log.warning("Worker trop lent, déconnecté", extra={"queued": queue.qsize()})
+                writer.close()
+
+
+class BusClient:
+    """
+    Côté worker du bus : reçoit les évènements et envoie les commandes.
+
+    Se reconnecte automatiquement si le propriétaire redémarre ; le
+    message `hello` suivant resynchronise alors l'état local.
+    """
+
+    def __init__(
+        self,
+        on_message: Callable[[dict], Awaitable[None]],
+        address: str = BUS_ADDRESS
+    ) -> None:
+        """
+        Initialise le client de bus.
+
+        Args:
+            on_message: Traite un message reçu du propriétaire
+            address: Adresse du serveur de bus
+        """
+        self.address = address
+        self.on_message = on_message
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def connected(self) -> bool:
+        """Indique si la connexion au propriétaire est établie."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    def start(self) -> None:
+        """Lance la boucle de connexion/réception en tâche de fond."""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Arrête la boucle et ferme la connexion."""
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+    async def _open(self) -> tuple:
+        """Ouvre la connexion selon le type d'adresse."""
+        tcp = _parse_address(self.address)
+        if tcp:
+            return await asyncio.open_connection(tcp[0], tcp[1], limit=BUS_LINE_LIMIT)
+        return await asyncio.open_unix_connection(self.address, limit=BUS_LINE_LIMIT)
+
+    async def _run(self) -> None:
+        """Boucle de connexion et de réception avec reconnexion."""
+        while True:
+            try:
+                reader, self._writer = await self._open()
+            except OSError:
+                await asyncio.sleep(BUS_RETRY_DELAY)
+                continue
+
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        await self.on_message(json.loads(line))
+                    except Exception as e:
+                        log.warning("Erreur traitement évènement", extra={"error": str(e)})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self._writer.close()
+                self._writer = None
+
+            log.warning("Connexion au propriétaire perdue, reconnexion")
+            await asyncio.sleep(BUS_RETRY_DELAY)
+
+    async def send(self, message: dict) -> bool:
+        """
+        Envoie une commande au propriétaire.
+
+        Args:
+            message: Commande JSON (champ `op` requis)
+
+        Returns:
+            False si le bus n'est pas connecté ou si la connexion a été
+            perdue pendant l'envoi
+        """
+        if not self.connected:
+            return False
+        writer = self._writer
+        try:
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+        except ConnectionError:
+            # Propriétaire parti : la boucle de réception se reconnecte
+            writer.close()
+            return False
+        return True
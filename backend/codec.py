@@ -0,0 +1,327 @@
+"""
+SmartHive Backend - Décodage des uplinks binaires
+
+Ingestion compacte pour les équipements edge (Pi vision, passerelles) :
+enregistrements msgpack ou CBOR, unitaires ou par lots, validés par un
+chemin rapide spécialisé au schéma (mêmes bornes que LoraData/YoloData,
+sans passer par Pydantic champ par champ).
+
+Formats d'enregistrement acceptés :
+- Tableau positionnel (le plus compact) :
+    [0, bee_count, hornet_count, timestamp?]                        détection
+    [1, temperature, mass, humidity?, luminosity?, timestamp?]       capteurs
+    [2, frame, f_port?, timestamp?]                        trame LoRa brute
+- Map avec les noms de champs de l'API JSON (+ "timestamp" epoch optionnel)
+
+Un lot est un tableau d'enregistrements. Les trames brutes d'un lot
+(passerelle qui relaie ses uplinks en bloc) sont décodées ensemble, par
+layout, avec FrameLayout.decode_batch.
+
+Contient aussi le décodeur des trames LoRa brutes (`frm_payload` TTN),
+décrites de façon déclarative par un format struct et des noms de champs.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import base64
+import math
+import struct
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import msgpack
+except ImportError:  # Dépendance optionnelle
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:  # Dépendance optionnelle
+    cbor2 = None
+
+RECORD_DETECTION = 0
+RECORD_SENSOR = 1
+RECORD_FRAME = 2
+
+# (valeurs de l'état, horodatage epoch ou None)
+Record = Tuple[dict, Optional[float]]
+
+
+class RecordError(ValueError):
+    """Enregistrement binaire invalide (index dans le lot + raison)."""
+
+    def __init__(self, index: int, reason: str) -> None:
+        super().__init__(f"Enregistrement {index}: {reason}")
+        self.index = index
+        self.reason = reason
+
+
+def decoder_for(content_type: str):
+    """
+    Retourne la fonction de décodage associée à un Content-Type.
+
+    Args:
+        content_type: En-tête Content-Type de la requête
+
+    Returns:
+        Fonction bytes -> objet, None si le format est inconnu ou si la
+        bibliothèque correspondante n'est pas installée
+    """
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack"):
+        return (lambda body: msgpack.unpackb(body, raw=False)) if msgpack else None
+    if media_type == "application/cbor":
+        return cbor2.loads if cbor2 else None
+    return None
+
+
+def _number(value: Any, index: int, name: str, low: float, high: float) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RecordError(index, f"{name} doit être numérique")
+    if not low <= value <= high:
+        raise RecordError(index, f"{name} hors bornes [{low}, {high}]")
+    return float(value)
+
+
+def _count(value: Any, index: int, name: str) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise RecordError(index, f"{name} doit être un entier >= 0")
+    return value
+
+
+def _timestamp(value: Any, index: int) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RecordError(index, "timestamp doit être un epoch numérique")
+    if not math.isfinite(value):
+        raise RecordError(index, "timestamp doit être un epoch fini")
+    return float(value)
+
+
+def _sensor(index: int, temperature: Any, mass: Any, humidity: Any = None,
+            luminosity: Any = None) -> dict:
+    values = {
+        "temperature": _number(temperature, index, "temperature", -40, 80),
+        "mass": _number(mass, index, "mass", 0, 200),
+    }
+    if humidity is not None:
+        values["humidity"] = _number(humidity, index, "humidity", 0, 100)
+    if luminosity is not None:
+        values["luminosity"] = _number(luminosity, index, "luminosity", 0, 200000)
+    return values
+
+
+def parse_record(record: Any, index: int = 0) -> Record:
+    """
+    Valide un enregistrement décodé.
+
+    Args:
+        record: Tableau positionnel ou map
+        index: Position dans le lot (messages d'erreur)
+
+    Returns:
+        Tuple (valeurs de l'état, horodatage epoch ou None)
+    """
+    if isinstance(record, (list, tuple)):
+        if not record:
+            raise RecordError(index, "enregistrement vide")
+        kind = record[0]
+        if kind == RECORD_DETECTION and 3 <= len(record) <= 4:
+            values = {
+                "bee_count": _count(record[1], index, "bee_count"),
+                "hornet_count": _count(record[2], index, "hornet_count"),
+            }
+            return values, _timestamp(record[3] if len(record) > 3 else None, index)
+        if kind == RECORD_SENSOR and 3 <= len(record) <= 6:
+            fields = list(record[1:5]) + [None] * (5 - len(record))
+            values = _sensor(index, *fields[:4])
+            return values, _timestamp(record[5] if len(record) > 5 else None, index)
+        raise RecordError(index, f"type {kind!r} ou longueur {len(record)} inconnus")
+
+    if isinstance(record, dict):
+        timestamp = _timestamp(record.get("timestamp"), index)
+        if "bee_count" in record or "hornet_count" in record:
+            values = {
+                "bee_count": _count(record.get("bee_count"), index, "bee_count"),
+                "hornet_count": _count(record.get("hornet_count"), index, "hornet_count"),
+            }
+            return values, timestamp
+        if "temperature" in record or "mass" in record:
+            values = _sensor(index, record.get("temperature"), record.get("mass"),
+                             record.get("humidity"), record.get("luminosity"))
+            return values, timestamp
+        raise RecordError(index, "champs inconnus")
+
+    raise RecordError(index, "tableau ou map attendu")
+
+
+def _is_frame(record: Any) -> bool:
+    return isinstance(record, (list, tuple)) and len(record) > 0 and record[0] == RECORD_FRAME
+
+
+def _frame(record: Sequence, index: int) -> Tuple["FrameLayout", bytes, Optional[float]]:
+    """Valide un enregistrement trame : (layout, octets, horodatage)."""
+    if not 2 <= len(record) <= 4:
+        raise RecordError(index, f"type {record[0]!r} ou longueur {len(record)} inconnus")
+    frame = record[1]
+    if not isinstance(frame, (bytes, bytearray)):
+        raise RecordError(index, "frame doit être binaire")
+    f_port = record[2] if len(record) > 2 else None
+    if f_port is not None and (isinstance(f_port, bool) or not isinstance(f_port, int)):
+        raise RecordError(index, "f_port doit être un entier")
+    layout = FRAME_LAYOUTS.get(f_port, SENSOR_FRAME)
+    if len(frame) != layout.size:
+        raise RecordError(index, f"trame de {len(frame)} octets, {layout.size} attendus")
+    return layout, bytes(frame), _timestamp(record[3] if len(record) > 3 else None, index)
+
+
+def _frame_values(decoded: Dict[str, float], index: int) -> dict:
+    """Champs `decoded_payload` d'une trame -> valeurs de l'état validées."""
+    fields = {FRAME_FIELDS[name]: value for name, value in decoded.items() if name in FRAME_FIELDS}
+    if "temperature" not in fields or "mass" not in fields:
+        raise RecordError(index, "trame sans température ou masse valide")
+    return _sensor(index, fields["temperature"], fields["mass"],
+                   fields.get("humidity"), fields.get("luminosity"))
+
+
+def parse_records(payload: Any) -> List[Record]:
+    """
+    Valide un enregistrement unique ou un lot.
+
+    Args:
+        payload: Objet décodé (msgpack/CBOR)
+
+    Returns:
+        Liste d'enregistrements validés, dans l'ordre d'envoi
+    """
+    is_batch = (
+        isinstance(payload, (list, tuple))
+        and len(payload) > 0
+        and isinstance(payload[0], (list, tuple, dict))
+    )
+    if not is_batch:
+        if _is_frame(payload):
+            layout, frame, timestamp = _frame(payload, 0)
+            return [(_frame_values(layout.decode(frame), 0), timestamp)]
+        return [parse_record(payload)]
+
+    records: List[Optional[Record]] = [None] * len(payload)
+    frames: Dict[FrameLayout, List[Tuple[int, bytes, Optional[float]]]] = {}
+    for i, record in enumerate(payload):
+        if _is_frame(record):
+            layout, frame, timestamp = _frame(record, i)
+            frames.setdefault(layout, []).append((i, frame, timestamp))
+        else:
+            records[i] = parse_record(record, i)
+    for layout, items in frames.items():
+        decoded = layout.decode_batch(frame for _, frame, _ in items)
+        for (i, _, timestamp), values in zip(items, decoded):
+            records[i] = (_frame_values(values, i), timestamp)
+    return records
+
+
+# ============================================================================
+# TRAMES LORA BRUTES (frm_payload)
+# ============================================================================
+
+class FrameLayout:
+    """
+    Description déclarative d'une trame binaire de capteurs.
+
+    Les noms de champs sont ceux du `decoded_payload` produit par le
+    formatter TTN, pour que le reste du chemin d'ingestion soit identique.
+    """
+
+    def __init__(self, fmt: str, fields: Sequence[str]) -> None:
+        """
+        Args:
+            fmt: Format struct (ex: "<5f" = 5 float32 little-endian)
+            fields: Nom de chaque valeur, dans l'ordre de la trame
+        """
+        self.struct = struct.Struct(fmt)
+        self.fields = tuple(fields)
+        if len(self.fields) != len(self.struct.unpack(bytes(self.struct.size))):
+            raise ValueError("Nombre de champs incohérent avec le format")
+
+    @property
+    def size(self) -> int:
+        """Taille de la trame en octets."""
+        return self.struct.size
+
+    def decode(self, frame: bytes) -> Dict[str, float]:
+        """
+        Décode une trame.
+
+        Args:
+            frame: Octets bruts (taille exacte attendue)
+
+        Returns:
+            Dictionnaire champ -> valeur (valeurs non finies omises)
+        """
+        if len(frame) != self.size:
+            raise ValueError(f"Trame de {len(frame)} octets, {self.size} attendus")
+        return self._to_dict(self.struct.unpack(frame))
+
+    def encode(self, values: Dict[str, float]) -> bytes:
+        """
+        Encode une trame (simulateur, benchmarks).
+
+        Args:
+            values: Champ -> valeur ; un champ absent est encodé en NaN
+                (capteur en défaut, format flottant uniquement)
+
+        Returns:
+            Octets de la trame
+        """
+        return self.struct.pack(*(values.get(name, math.nan) for name in self.fields))
+
+    def decode_batch(self, frames: Iterable[bytes]) -> List[Dict[str, float]]:
+        """
+        Décode un lot de trames en un seul passage.
+
+        Les trames sont concaténées puis dépaquetées par struct.iter_unpack
+        (boucle en C) plutôt qu'un unpack Python par trame.
+
+        Args:
+            frames: Trames brutes de même layout
+
+        Returns:
+            Liste de dictionnaires, dans l'ordre des trames
+        """
+        frames = list(frames)
+        for frame in frames:
+            if len(frame) != self.size:
+                raise ValueError(f"Trame de {len(frame)} octets, {self.size} attendus")
+        return [self._to_dict(values) for values in self.struct.iter_unpack(b"".join(frames))]
+
+    def _to_dict(self, values: Tuple) -> Dict[str, float]:
+        # NaN/inf = capteur en défaut côté firmware : champ ignoré
+        return {name: value for name, value in zip(self.fields, values)
+                if not isinstance(value, float) or math.isfinite(value)}
+
+
+# Trame du firmware Arduino (cf. docs/HARDWARE.md) : 5 float32 via union C,
+# little-endian sur AVR/ARM
+SENSOR_FRAME = FrameLayout("<5f", ("temperature1", "masse", "temp3", "humd", "lum"))
+
+# Layout par f_port LoRaWAN ; les ports absents utilisent SENSOR_FRAME
+FRAME_LAYOUTS: Dict[int, FrameLayout] = {}
+
+# Champs `decoded_payload` -> champs de l'état (cf. on_message)
+FRAME_FIELDS = {"temperature1": "temperature", "masse": "mass", "humd": "humidity", "lum": "luminosity"}
+
+
+def decode_frm_payload(frm_payload: str, f_port: Optional[int] = None) -> Dict[str, float]:
+    """
+    Décode le `frm_payload` base64 d'un uplink TTN.
+
+    Args:
+        frm_payload: Payload applicatif encodé en base64
+        f_port: Port LoRaWAN (choix du layout)
+
+    Returns:
+        Valeurs au format `decoded_payload`
+    """
+    layout = FRAME_LAYOUTS.get(f_port, SENSOR_FRAME)
+    return layout.decode(base64.b64decode(frm_payload))
@@ -0,0 +1,214 @@
+"""
+SmartHive Backend - Export en flux de l'historique
+
+Générateurs d'export lisant le CSV d'historique par blocs, sans jamais
+charger la plage demandée en mémoire :
+
+- csv      : lignes du fichier recopiées telles quelles (avec en-tête)
+- ndjson   : un objet JSON par entrée
+- columnar : un objet JSON {champ: [valeurs]} par bloc d'entrées, à la
+             manière des groupes de lignes Parquet / batches Arrow
+
+Le fichier étant trié par horodatage, le début de plage est trouvé par
+recherche dichotomique sur les positions en octets, et la lecture
+s'arrête à la première ligne après la fin de plage. Les lignes du segment
+tardif (petit, cf. CSVLogger) sont fusionnées à leur place dans les
+blocs. La compression gzip est appliquée au fil de l'eau, bloc par bloc.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import bisect
+import heapq
+import os
+import zlib
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from analytics import dumps, to_edge, to_lists
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "columnar": ("application/x-ndjson", "columnar.ndjson"),
+}
+# Taille indicative d'un bloc lu (octets) et d'un groupe de lignes columnar
+EXPORT_BLOCK_SIZE = 256 * 1024
+
+
+def _timestamp(line: bytes) -> str:
+    return line.split(b",", 1)[0].decode('ascii', errors='replace')
+
+
+def seek_time(file, bound: str, data_start: int, size: int) -> int:
+    """
+    Position de la première ligne d'horodatage >= `bound`.
+
+    Les horodatages ISO 8601 naïfs se comparent comme des chaînes.
+
+    Args:
+        file: Fichier CSV ouvert en binaire
+        bound: Horodatage ISO recherché
+        data_start: Position de la première ligne de données
+        size: Taille du fichier à considérer
+
+    Returns:
+        Position en octets (size si aucune ligne ne convient)
+    """
+    # Invariant : toutes les lignes commençant avant `low` sont < bound
+    low, high = data_start, size
+    while high - low > EXPORT_BLOCK_SIZE:
+        middle = (low + high) // 2
+        file.seek(middle)
+        file.readline()  # Ligne coupée
+        position = file.tell()
+        line = file.readline()
+        if position >= high or not line.endswith(b"\n") or _timestamp(line) >= bound:
+            high = middle
+        else:
+            low = position + len(line)
+    file.seek(low)
+    while low < size:
+        line = file.readline()
+        if not line.endswith(b"\n") or _timestamp(line) >= bound:
+            break
+        low += len(line)
+    return low
+
+
+def _late_lines(
+    filename: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> List[bytes]:
+    """Lignes du segment tardif dans la plage [start, end[, triées."""
+    if not filename or not os.path.exists(filename):
+        return []
+    lower = None if start is None else start.isoformat()
+    upper = None if end is None else end.isoformat()
+    with open(filename, mode='rb') as file:
+        file.readline()
+        lines = [
+            line for line in file
+            if line.endswith(b"\n")
+            and (lower is None or _timestamp(line) >= lower)
+            and (upper is None or _timestamp(line) < upper)
+        ]
+    return sorted(lines, key=_timestamp)
+
+
+def _blocks(
+    filename: str,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    late_filename: Optional[str] = None
+) -> Iterator[bytes]:
+    """Blocs de lignes CSV complètes de la plage [start, end[ (sans en-tête)."""
+    late = _late_lines(late_filename, start, end)
+    keys = [_timestamp(line) for line in late]
+    position = 0
+    for block in _file_blocks(filename, start, end):
+        if position < len(late):
+            last = block[block.rfind(b"\n", 0, len(block) - 1) + 1:]
+            stop = bisect.bisect_right(keys, _timestamp(last), position)
+            if stop > position:
+                block = b"".join(heapq.merge(block.splitlines(keepends=True),
+                                             late[position:stop], key=_timestamp))
+                position = stop
+        yield block
+    if position < len(late):
+        yield b"".join(late[position:])
+
+
+def _file_blocks(
+    filename: str,
+    start: Optional[datetime],
+    end: Optional[datetime]
+) -> Iterator[bytes]:
+    """Blocs de lignes du fichier principal de la plage [start, end[."""
+    if not os.path.exists(filename):
+        return
+    upper = None if end is None else end.isoformat()
+    with open(filename, mode='rb') as file:
+        # Taille figée : une ligne en cours d'écriture n'est pas exportée
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        data_start = len(file.readline())
+        position = data_start if start is None else seek_time(file, start.isoformat(), data_start, size)
+        file.seek(position)
+        while position < size:
+            lines = file.readlines(min(EXPORT_BLOCK_SIZE, size - position))
+            if not lines:
+                break
+            position += sum(len(line) for line in lines)
+            if not lines[-1].endswith(b"\n"):
+                lines.pop()
+            if upper is not None and lines and _timestamp(lines[-1]) >= upper:
+                # Fin de plage dans ce bloc
+                lines = [line for line in lines if _timestamp(line) < upper]
+                if lines:
+                    yield b"".join(lines)
+                return
+            if lines:
+                yield b"".join(lines)
+
+
+def stream_export(
+    filename: str,
+    parse: Callable[[str], Dict[str, np.ndarray]],
+    format: str = "csv",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    compress: bool = False,
+    late_filename: Optional[str] = None
+) -> Iterator[bytes]:
+    """
+    Export en flux d'une plage de l'historique.
+
+    Générateur synchrone : StreamingResponse l'itère dans le threadpool,
+    la boucle asyncio ne bloque pas sur les lectures disque.
+
+    Args:
+        filename: Chemin du fichier CSV d'historique
+        parse: Parseur de lignes CSV en colonnes typées (ColumnStore.parse)
+        format: "csv", "ndjson" ou "columnar"
+        start: Début de plage inclus (heure locale, None = depuis le début)
+        end: Fin de plage exclue (heure locale, None = jusqu'à la fin)
+        compress: Compresse le flux en gzip
+        late_filename: Segment tardif à fusionner (optionnel)
+
+    Yields:
+        Morceaux du corps de la réponse
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def encode() -> Iterator[bytes]:
+        if format == "csv" and os.path.exists(filename):
+            with open(filename, mode='rb') as file:
+                yield file.readline()
+        for block in _blocks(filename, start, end, late_filename):
+            if format == "csv":
+                yield block
+                continue
+            columns = parse(block.decode('utf-8', errors='replace'))
+            if not len(columns["timestamp"]):
+                continue
+            if format == "columnar":
+                yield dumps(to_edge(columns)) + b"\n"
+            else:
+                values = to_lists(columns)
+                names = list(values)
+                yield b"".join(dumps(dict(zip(names, row))) + b"\n" for row in zip(*values.values()))
+
+    for chunk in encode():
+        if compressor is None:
+            yield chunk
+        else:
+            compressed = compressor.compress(chunk)
+            if compressed:
+                yield compressed
+    if compressor is not None:
+        yield compressor.flush()
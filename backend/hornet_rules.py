@@ -0,0 +1,190 @@
+"""
+SmartHive Backend - Règles d'alerte frelons
+
+Moteur de règles évaluées incrémentalement sur le flux de détections,
+avec des fenêtres glissantes (coût amorti O(1) par détection) :
+
+- presence : frelon vu pendant au moins `threshold` secondes distinctes
+  parmi les `window` dernières (ex: ≥ 3 des 5 dernières secondes)
+- rate     : moyenne de frelons par seconde sur `window` secondes
+  au-dessus de `threshold`
+
+Anti-rebond : une règle émet `raised` au passage à l'état actif, puis
+`cleared` quand la condition est fausse depuis `clear_after` secondes.
+Entre les deux, aucune nouvelle alerte pour la même règle.
+
+L'état est tenu par ruche. La fin d'alerte est aussi évaluée sur une
+horloge (`expire`, appelée périodiquement) : une caméra muette ne laisse
+pas une alerte levée indéfiniment.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import json
+import threading
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+
+class HornetRule(NamedTuple):
+    """Définition d'une règle."""
+    name: str
+    kind: str                   # "presence" ou "rate"
+    window: float               # Fenêtre glissante (s)
+    threshold: float            # Secondes avec frelon (presence) ou frelons/s (rate)
+    clear_after: float = 30.0   # Durée de condition fausse avant `cleared` (s)
+
+
+DEFAULT_RULES: Tuple[HornetRule, ...] = (
+    HornetRule("hornet_presence", "presence", window=5.0, threshold=3),
+    HornetRule("hornet_rate", "rate", window=60.0, threshold=0.5),
+)
+
+
+def parse_rules(text: str) -> Tuple[HornetRule, ...]:
+    """
+    Lit des règles au format JSON (variable d'environnement HORNET_RULES).
+
+    Args:
+        text: Liste JSON d'objets {name, kind, window, threshold, clear_after?}
+
+    Returns:
+        Règles validées
+    """
+    rules = []
+    for item in json.loads(text):
+        rule = HornetRule(**item)
+        if rule.kind not in ("presence", "rate") or rule.window <= 0:
+            raise ValueError(f"Règle invalide: {item}")
+        rules.append(rule)
+    return tuple(rules)
+
+
+class _RuleState:
+    """Fenêtre glissante et état anti-rebond d'une règle."""
+
+    __slots__ = ("rule", "events", "total", "last_second", "active", "false_since")
+
+    def __init__(self, rule: HornetRule) -> None:
+        self.rule = rule
+        # presence : secondes entières avec frelon ; rate : (ts, nombre)
+        self.events: Deque[Tuple[float, int]] = deque()
+        self.total = 0
+        self.last_second: Optional[int] = None
+        self.active = False
+        self.false_since: Optional[float] = None
+
+    def observe(self, timestamp: float, hornets: int) -> Tuple[bool, float]:
+        """Intègre une détection, retourne (condition, valeur mesurée)."""
+        rule = self.rule
+        if hornets > 0:
+            if rule.kind == "presence":
+                second = int(timestamp)
+                if second != self.last_second:
+                    self.events.append((second, 1))
+                    self.total += 1
+                    self.last_second = second
+            else:
+                self.events.append((timestamp, hornets))
+                self.total += hornets
+
+        horizon = timestamp - rule.window
+        while self.events and self.events[0][0] <= horizon:
+            self.total -= self.events.popleft()[1]
+
+        value = self.total if rule.kind == "presence" else self.total / rule.window
+        return value >= rule.threshold, value
+
+
+class HornetRuleEngine:
+    """Évalue toutes les règles sur chaque détection, par ruche (thread-safe)."""
+
+    def __init__(self, rules: Sequence[HornetRule] = DEFAULT_RULES) -> None:
+        """
+        Args:
+            rules: Règles à évaluer
+        """
+        self.rules = tuple(rules)
+        # Ruche -> états des règles
+        self._states: Dict[str, List[_RuleState]] = {}
+        self._lock = threading.Lock()
+
+    def _update(self, state: _RuleState, condition: bool, value: float, timestamp: float,
+                hive: str, transitions: List[dict]) -> None:
+        """Applique l'anti-rebond à une évaluation de règle."""
+        rule = state.rule
+        if condition:
+            state.false_since = None
+            if not state.active:
+                state.active = True
+                transitions.append(self._transition(rule, "raised", value, timestamp, hive))
+        elif state.active:
+            if state.false_since is None:
+                state.false_since = timestamp
+            elif timestamp - state.false_since >= rule.clear_after:
+                state.active = False
+                state.false_since = None
+                transitions.append(self._transition(rule, "cleared", value, timestamp, hive))
+
+    def observe(self, hornet_count: int, timestamp: float, hive: str = "default") -> List[dict]:
+        """
+        Intègre une détection.
+
+        Args:
+            hornet_count: Frelons détectés sur la frame
+            timestamp: Horodatage de la détection (epoch)
+            hive: Identifiant de ruche
+
+        Returns:
+            Transitions d'état (`raised` / `cleared`), souvent vide
+        """
+        transitions = []
+        with self._lock:
+            states = self._states.get(hive)
+            if states is None:
+                states = self._states[hive] = [_RuleState(rule) for rule in self.rules]
+            for state in states:
+                condition, value = state.observe(timestamp, hornet_count)
+                self._update(state, condition, value, timestamp, hive, transitions)
+        return transitions
+
+    def expire(self, now: float) -> List[dict]:
+        """
+        Réévalue les règles actives sans nouvelle détection.
+
+        Les fenêtres glissent jusqu'à `now` : sans détection, la condition
+        devient fausse puis l'alerte passe à `cleared` après `clear_after`.
+
+        Args:
+            now: Horodatage courant (epoch)
+
+        Returns:
+            Transitions `cleared` (souvent vide)
+        """
+        transitions = []
+        with self._lock:
+            for hive, states in self._states.items():
+                for state in states:
+                    if state.active:
+                        condition, value = state.observe(now, 0)
+                        self._update(state, condition, value, now, hive, transitions)
+        return transitions
+
+    @staticmethod
+    def _transition(rule: HornetRule, status: str, value: float, timestamp: float, hive: str) -> dict:
+        return {
+            "rule": rule.name,
+            "status": status,
+            "value": round(value, 3),
+            "threshold": rule.threshold,
+            "window_s": rule.window,
+            "hive": hive,
+            "timestamp": timestamp,
+        }
+
+    def active(self) -> List[str]:
+        """Règles actuellement déclenchées, au format "ruche:règle"."""
+        with self._lock:
+            return [f"{hive}:{state.rule.name}"
+                    for hive, states in self._states.items() for state in states if state.active]
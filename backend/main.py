@@ -11,18 +11,51 @@ Auteur: SmartHive Team
 Version: 1.0.0
 """
 
+import argparse
 import asyncio
+import atexit
 import csv
+import heapq
 import json
+import logging
+import math
 import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
 from datetime import datetime
-from typing import List, Optional
+from typing import (Any, AsyncIterator, Callable, Deque, Dict, Iterable, List, NamedTuple, Optional,
+                    Sequence, Tuple)
 
+import numpy as np
 import paho.mqtt.client as mqtt
 import uvicorn
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, confloat
+
+# Modules partagés avec ai-vision (journalisation, profilage)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+import analytics
+import export
+import jsonlog
+import metrics
+from anomaly import AnomalyMonitor
+from bus import BusClient, BusServer
+from codec import Record, RecordError, decode_frm_payload, decoder_for, parse_records
+from hornet_rules import DEFAULT_RULES, HornetRuleEngine, parse_rules
+from mqtt_link import MqttLink
+from profiling import admin_router
+from recorder import KIND_HTTP, KIND_MQTT, UplinkRecorder
+from response_cache import ResponseCache
+from tracing import LatencyTracker
 
 # ============================================================================
 # CONFIGURATION
@@ -31,6 +64,10 @@ from pydantic import BaseModel, Field
 APP_TITLE = "SmartHive API"
 APP_VERSION = "1.0.0"
 
+# Rôle du processus : "single" (tout-en-un) ou "worker" (sert HTTP/WS,
+# MQTT et persistance délégués au processus propriétaire via le bus)
+RUN_ROLE = os.getenv("SMARTHIVE_ROLE", "single")
+
 # MQTT Configuration
 MQTT_BROKER = os.getenv("MQTT_BROKER", "mqtt.example.com")
 MQTT_PORT = int(os.getenv("MQTT_PORT", "1883"))
@@ -40,10 +77,68 @@ MQTT_TOPIC = os.getenv(
     "MQTT_TOPIC",
     "v3/user@ttn/devices/device/up"
 )
+# Transport : "websockets" + TLS pour TTN, "tcp" sans TLS pour un broker
+# local (cf. mini_broker.py)
+MQTT_TRANSPORT = os.getenv("MQTT_TRANSPORT", "websockets")
+MQTT_TLS = os.getenv("MQTT_TLS", "1") == "1"
+MQTT_WS_PATH = os.getenv("MQTT_WS_PATH", "/ws")
+# Reconnexion en arrière-plan : backoff exponentiel borné (s), avec jitter
+MQTT_BACKOFF_MIN = float(os.getenv("MQTT_BACKOFF_MIN", "1"))
+MQTT_BACKOFF_MAX = float(os.getenv("MQTT_BACKOFF_MAX", "60"))
+# Si activé, /api/ready répond 503 tant que le broker n'est pas connecté
+MQTT_REQUIRED = os.getenv("MQTT_REQUIRED", "0") == "1"
+# Décodage local du frm_payload brut : "auto" (si decoded_payload absent),
+# "always" (ignore le formatter TTN) ou "off"
+FRM_PAYLOAD_DECODE = os.getenv("FRM_PAYLOAD_DECODE", "auto")
 
 # CSV Configuration
 HISTORY_FILE = os.getenv("HISTORY_FILE", "history.csv")
 CSV_HEADERS = ["timestamp", "temperature", "humidity", "mass", "luminosity", "bee_count", "hornet_count"]
+# Fenêtre de réordonnancement (s) : les lignes sont retenues en mémoire
+# puis écrites triées par horodatage source (0 = écriture immédiate)
+REORDER_WINDOW = float(os.getenv("REORDER_WINDOW", "2.0"))
+# Segment des lignes arrivées après la fenêtre (uplinks LoRa relancés,
+# détections edge bufferisées) : horodatage source conservé
+HISTORY_LATE_FILE = os.getenv("HISTORY_LATE_FILE", "")
+# Taille des blocs lus depuis la fin du fichier (redémarrage, historique borné)
+TAIL_BLOCK_SIZE = 64 * 1024
+# Cache des réponses /api/history (octets, 0 = coalescence seule)
+HISTORY_CACHE_BYTES = int(os.getenv("HISTORY_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Alertes (anomalies capteurs, frelons) : journal JSON lines
+ALERTS_FILE = os.getenv("ALERTS_FILE", "alerts.jsonl")
+# Détection d'anomalies en ligne sur la masse et la température
+ANOMALY_DETECTION = os.getenv("ANOMALY_DETECTION", "1") == "1"
+# Lignes de fin d'historique rejouées au démarrage dans les détecteurs
+RESTORE_WINDOW = int(os.getenv("RESTORE_WINDOW", "500"))
+# Règles d'alerte frelons (JSON, cf. hornet_rules.py ; vide = règles par défaut)
+HORNET_RULES = parse_rules(os.environ["HORNET_RULES"]) if os.getenv("HORNET_RULES") else DEFAULT_RULES
+
+# Enregistrement des entrées brutes pour rejeu (vide = désactivé, cf. replay.py)
+RECORD_FILE = os.getenv("RECORD_FILE", "")
+
+# WebSocket Configuration
+# Nombre de messages conservés pour rejouer les deltas après reconnexion
+WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", "1024"))
+# Heartbeat : pings du protocole WebSocket (uvicorn), auxquels les
+# navigateurs répondent automatiquement ; sans pong sous WS_IDLE_TIMEOUT
+# la connexion est morte (TCP half-open) et fermée. Ils sont réglés par
+# `python main.py` ; sous `uvicorn main:app`, passer les mêmes valeurs via
+# --ws-ping-interval/--ws-ping-timeout. Un ping applicatif JSON est aussi
+# diffusé : y répondre par {"type": "pong"} est optionnel, mais un client
+# qui a déjà répondu puis se tait plus de WS_IDLE_TIMEOUT est fermé
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", "20"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "500"))
+# SSE : messages en attente par abonné avant resynchronisation par snapshot
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "256"))
+
+# Traces de latence capture -> dashboard : échantillons conservés par étape
+TRACE_WINDOW = int(os.getenv("TRACE_WINDOW", "1000"))
+# Écart max (s) entre les horodatages d'une trace et l'horloge serveur :
+# au-delà (horloge edge déréglée), la trace est ignorée, pas la détection
+TRACE_MAX_SKEW = float(os.getenv("TRACE_MAX_SKEW", "300"))
 
 
 # ============================================================================
@@ -54,12 +149,28 @@ class LoraData(BaseModel):
     """Modèle de données pour réception payload LoRaWAN."""
     temperature: float = Field(..., description="Température en degrés Celsius", ge=-40, le=80)
     mass: float = Field(..., description="Masse de la ruche en kg", ge=0, le=200)
+    timestamp: Optional[datetime] = Field(None, description="Horodatage de mesure (défaut: réception)")
+    device_id: Optional[str] = Field(None, description="Ruche émettrice (détecteurs par ruche)", max_length=64)
+
+
+class TraceContext(BaseModel):
+    """Contexte de trace d'une frame, propagé de la capture au dashboard."""
+    frame_id: str = Field(..., description="Identifiant de la frame source")
+    captured_at: float = Field(..., description="Horodatage de capture (epoch)", allow_inf_nan=False)
+    sent_at: Optional[float] = Field(None, description="Horodatage d'envoi au backend (epoch)",
+                                     allow_inf_nan=False)
+    stages: Dict[str, confloat(ge=0, allow_inf_nan=False)] = Field(
+        {}, description="Durées des étapes edge (ms)"
+    )
 
 
 class YoloData(BaseModel):
     """Modèle de données pour réception statistiques YOLO."""
     bee_count: int = Field(..., description="Nombre d'abeilles détectées", ge=0)
     hornet_count: int = Field(..., description="Nombre de frelons détectés", ge=0)
+    timestamp: Optional[datetime] = Field(None, description="Horodatage de capture (défaut: réception)")
+    device_id: Optional[str] = Field(None, description="Ruche observée (règles par ruche)", max_length=64)
+    trace: Optional[TraceContext] = Field(None, description="Contexte de trace (latence de bout en bout)")
 
 
 class SensorState(BaseModel):
@@ -72,108 +183,430 @@ class SensorState(BaseModel):
     hornet_count: int = 0
 
 
+# ============================================================================
+# METRICS
+# ============================================================================
+
+registry = metrics.Registry()
+
+MQTT_MESSAGES = registry.counter(
+    "smarthive_mqtt_messages_total", "Messages MQTT reçus par résultat", ("result",))
+INGEST_RECORDS = registry.counter(
+    "smarthive_ingest_records_total", "Enregistrements ingérés via l'API HTTP/binaire")
+INGEST_PERSIST_SECONDS = registry.histogram(
+    "smarthive_ingest_persist_seconds", "Délai réception -> écriture CSV (fenêtre de réordonnancement comprise)")
+STORE_WRITE_SECONDS = registry.histogram(
+    "smarthive_store_write_seconds", "Durée d'une écriture de lot dans le CSV")
+HISTORY_SECONDS = registry.histogram(
+    "smarthive_history_seconds", "Durée de lecture de l'historique")
+HISTORY_ROWS = registry.counter(
+    "smarthive_history_rows_scanned_total", "Lignes d'historique lues")
+BROADCAST_SECONDS = registry.histogram(
+    "smarthive_broadcast_seconds", "Durée d'un fan-out WebSocket/SSE")
+ALERTS_RAISED = registry.counter(
+    "smarthive_alerts_total", "Alertes émises par famille", ("kind",))
+TRACE_STAGE_SECONDS = registry.histogram(
+    "smarthive_trace_stage_seconds", "Durée par étape des détections tracées", ("stage",))
+
+registry.gauge("smarthive_websocket_active", "Connexions WebSocket actives",
+               lambda: len(manager.active_connections))
+registry.gauge("smarthive_websocket_rejected_total", "Connexions refusées (limite atteinte)",
+               lambda: manager.rejected_total, kind="counter")
+registry.gauge("smarthive_websocket_reaped_total", "Connexions mortes fermées",
+               lambda: manager.reaped_total, kind="counter")
+registry.gauge("smarthive_sse_active", "Abonnés SSE actifs",
+               lambda: len(manager.subscribers))
+registry.gauge("smarthive_sse_queue_depth_max", "Profondeur maximale des files SSE",
+               lambda: max((queue.qsize() for queue in manager.subscribers), default=0))
+registry.gauge("smarthive_store_pending_rows", "Lignes dans le tampon de réordonnancement",
+               lambda: logger.pending_count)
+registry.gauge("smarthive_store_late_rows_total", "Lignes arrivées après la fenêtre de réordonnancement",
+               lambda: logger.late_rows, kind="counter")
+registry.gauge("smarthive_mqtt_connected", "Session MQTT établie (1/0)",
+               lambda: int(mqtt_link is not None and mqtt_link.connected))
+registry.gauge("smarthive_history_cache_hits_total", "Réponses /api/history servies depuis le cache",
+               lambda: history_cache.hits, kind="counter")
+registry.gauge("smarthive_history_cache_coalesced_total", "Requêtes /api/history coalescées",
+               lambda: history_cache.coalesced, kind="counter")
+registry.gauge("smarthive_history_cache_bytes", "Taille du cache /api/history",
+               lambda: history_cache.size)
+registry.gauge("smarthive_hornet_rules_active", "Règles d'alerte frelons déclenchées",
+               lambda: len(hornet_engine.active()))
+registry.gauge("smarthive_log_suppressed_total", "Logs supprimés par limitation de débit",
+               lambda: jsonlog.stats()["suppressed"], kind="counter")
+registry.gauge("smarthive_log_dropped_total", "Logs abandonnés (file pleine)",
+               lambda: jsonlog.stats()["dropped"], kind="counter")
+
+
 # ============================================================================
 # CSV LOGGER
 # ============================================================================
 
+def read_tail_lines(filename: str, count: int, header: bool = False) -> List[str]:
+    """
+    Lit les dernières lignes d'un fichier sans le parcourir en entier.
+    
+    Le fichier est lu par blocs depuis la fin jusqu'à couvrir `count`
+    lignes : le coût dépend de `count`, pas de la taille du fichier.
+    
+    Args:
+        filename: Chemin du fichier texte
+        count: Nombre de lignes voulues
+        header: La première ligne du fichier est un en-tête à ignorer
+        
+    Returns:
+        Lignes, de la plus ancienne à la plus récente
+    """
+    if count <= 0 or not os.path.exists(filename):
+        return []
+    with open(filename, mode='rb') as file:
+        position = file.seek(0, os.SEEK_END)
+        chunk = b""
+        while position > 0 and chunk.count(b"\n") <= count:
+            step = min(TAIL_BLOCK_SIZE, position)
+            position -= step
+            file.seek(position)
+            chunk = file.read(step) + chunk
+    lines = chunk.decode('utf-8', errors='replace').splitlines()
+    # Première ligne : coupée par le bloc, ou en-tête
+    if position > 0 or header:
+        lines = lines[1:]
+    return lines[-count:]
+
+
 class CSVLogger:
     """
     Gestionnaire de persistance des mesures en format CSV.
     
     Thread-safe pour écriture append-only. Crée le fichier avec
     headers si inexistant.
+    
+    Les lignes portent l'horodatage source (TTN `received_at` ou client)
+    et transitent par un tampon de réordonnancement borné dans le temps :
+    une ligne n'est écrite qu'une fois son horodatage plus vieux que
+    REORDER_WINDOW, ce qui garde le fichier trié. Une ligne arrivant
+    après la fenêtre (plus ancienne que la dernière ligne écrite) va
+    dans un segment tardif, avec son horodatage source ; l'historique,
+    les analyses et l'export le fusionnent au fichier principal.
     """
     
-    def __init__(self, filename: str = HISTORY_FILE) -> None:
+    def __init__(self, filename: str = HISTORY_FILE, late_filename: Optional[str] = None) -> None:
         """
         Initialise le logger CSV.
         
         Args:
             filename: Chemin du fichier CSV d'historique
+            late_filename: Segment tardif (défaut: HISTORY_LATE_FILE, sinon
+                <historique>.late.csv)
         """
         self.filename = filename
+        self.late_filename = late_filename or HISTORY_LATE_FILE or (
+            os.path.splitext(filename)[0] + ".late.csv"
+        )
         self.headers = CSV_HEADERS
+        self.reorder_window = REORDER_WINDOW
+        # Tas (epoch, ordre d'arrivée, ligne CSV, réception monotonic)
+        # en attente d'écriture
+        self._pending: List[Tuple[float, int, list, float]] = []
+        self._arrivals = 0
+        self._lock = threading.Lock()
+        # Dernier horodatage écrit (garantit un fichier trié)
+        self.watermark = 0.0
+        self.late_rows = 0
         self._init_file()
+        # Colonnes en mémoire (historique, analyses), chargées à la demande
+        self.columns = analytics.ColumnStore(filename, self.headers, self.late_filename)
+        # Reprise après redémarrage : les nouvelles lignes restent après
+        # la dernière ligne écrite
+        last = self.tail(1)
+        if last:
+            self.watermark = self._parse_ts(last[0]["timestamp"])
     
-    def _init_file(self) -> None:
-        """Crée le fichier avec headers s'il n'existe pas."""
-        if not os.path.exists(self.filename):
-            with open(self.filename, mode='w', newline='', encoding='utf-8') as file:
+    def _init_file(self, filename: Optional[str] = None) -> None:
+        """Crée le fichier (défaut: historique) avec headers s'il n'existe pas."""
+        filename = filename or self.filename
+        if not os.path.exists(filename):
+            with open(filename, mode='w', newline='', encoding='utf-8') as file:
                 writer = csv.writer(file)
                 writer.writerow(self.headers)
     
-    def log(self, state: 'SystemState') -> None:
+    def log(self, state: 'StateSnapshot', timestamp: Optional[float] = None) -> None:
         """
-        Ajoute une ligne de données au CSV.
+        Ajoute une ligne de données au CSV (via le tampon de réordonnancement).
         
         Args:
-            state: État système à persister
+            state: Snapshot de l'état à persister
+            timestamp: Horodatage source epoch (défaut: maintenant). Un
+                horodatage dans le futur (horloge device) est ramené à maintenant.
         """
-        with open(self.filename, mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            writer.writerow([
-                datetime.now().isoformat(),
-                state.temperature,
-                state.humidity,
-                state.mass,
-                state.luminosity,
-                state.bee_count,
-                state.hornet_count
-            ])
+        if timestamp is not None and not math.isfinite(timestamp):
+            # NaN bloquerait le tas (jamais <= deadline) : ligne abandonnée
+            log.warning("Horodatage non fini ignoré", extra={"timestamp": str(timestamp)})
+            return
+        now = time.time()
+        timestamp = now if timestamp is None else min(timestamp, now)
+        row = [
+            state.temperature,
+            state.humidity,
+            state.mass,
+            state.luminosity,
+            state.bee_count,
+            state.hornet_count
+        ]
+        with self._lock:
+            self._arrivals += 1
+            heapq.heappush(self._pending, (timestamp, self._arrivals, row, time.monotonic()))
+        self.flush()
     
-    def get_history(self, limit: Optional[int] = None) -> List[dict]:
+    def flush(self, force: bool = False) -> int:
         """
-        Récupère l'historique complet ou partiel.
+        Écrit les lignes sorties de la fenêtre de réordonnancement.
         
         Args:
-            limit: Nombre maximum de lignes (None = tout)
+            force: Écrit toutes les lignes en attente (arrêt)
             
         Returns:
-            Liste de dictionnaires représentant les entrées CSV
-        """
-        data = []
-        if os.path.exists(self.filename):
-            with open(self.filename, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    data.append({
-                        "timestamp": row.get("timestamp", ""),
-                        "temperature": float(row.get("temperature", 0) or 0),
-                        "humidity": float(row.get("humidity", 0) or 0),
-                        "mass": float(row.get("mass", 0) or 0),
-                        "luminosity": float(row.get("luminosity", 0) or 0),
-                        "bee_count": int(row.get("bee_count", 0) or 0),
-                        "hornet_count": int(row.get("hornet_count", 0) or 0)
+            Nombre de lignes écrites
+        """
+        deadline = time.time() - self.reorder_window
+        with self._lock:
+            due = []
+            late = []
+            received = []
+            while self._pending and (force or self._pending[0][0] <= deadline):
+                timestamp, _, row, arrival = heapq.heappop(self._pending)
+                received.append(arrival)
+                if timestamp < self.watermark:
+                    # Arrivée après la fenêtre : segment tardif, horodatage
+                    # source conservé (le fichier principal reste trié)
+                    self.late_rows += 1
+                    log.warning("Ligne tardive écrite dans le segment tardif", extra={
+                        "timestamp": self._format_ts(timestamp),
+                        "watermark": self._format_ts(self.watermark),
+                        "delay_s": round(self.watermark - timestamp, 3)
                     })
+                    late.append([self._format_ts(timestamp)] + row)
+                    continue
+                self.watermark = timestamp
+                due.append([self._format_ts(timestamp)] + row)
+            
+            if due or late:
+                start = time.monotonic()
+                if due:
+                    with open(self.filename, mode='a', newline='', encoding='utf-8') as file:
+                        csv.writer(file).writerows(due)
+                if late:
+                    self._init_file(self.late_filename)
+                    with open(self.late_filename, mode='a', newline='', encoding='utf-8') as file:
+                        csv.writer(file).writerows(late)
+                end = time.monotonic()
+                STORE_WRITE_SECONDS.observe(end - start)
+                for arrival in received:
+                    INGEST_PERSIST_SECONDS.observe(end - arrival)
+        return len(due) + len(late)
+    
+    @staticmethod
+    def _format_ts(timestamp: float) -> str:
+        """Formate un epoch en ISO local naïf (format historique du CSV)."""
+        return datetime.fromtimestamp(timestamp).isoformat()
+    
+    @staticmethod
+    def _parse_ts(value: str) -> float:
+        """Convertit un horodatage du CSV en epoch (0 si illisible)."""
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return 0.0
+    
+    def tail(self, count: int) -> List[dict]:
+        """
+        Lit les dernières lignes écrites sans parcourir tout le fichier.
+        
+        Args:
+            count: Nombre de lignes voulues
+            
+        Returns:
+            Entrées typées, de la plus ancienne à la plus récente
+        """
+        return [
+            self._parse_row(dict(zip(self.headers, values)))
+            for values in csv.reader(read_tail_lines(self.filename, count, header=True))
+            if values
+        ]
+    
+    def write_version(self) -> Tuple[int, int, int]:
+        """
+        Version d'écriture du store, pour invalider les réponses en cache.
+        
+        Combine les lignes reçues par ce processus (tampon compris) et
+        l'état du fichier, modifié aussi par le propriétaire en multi-worker.
+        
+        Returns:
+            (lignes reçues, taille du fichier, mtime en ns)
+        """
+        try:
+            stat = os.stat(self.filename)
+            return self._arrivals, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return self._arrivals, 0, 0
+    
+    @property
+    def pending_count(self) -> int:
+        """Nombre de lignes dans le tampon de réordonnancement."""
+        return len(self._pending)
+    
+    def pending_rows(self) -> List[list]:
+        """Lignes en attente d'écriture, triées, au format CSV."""
+        with self._lock:
+            pending = sorted(self._pending)
+        return [[self._format_ts(ts)] + row for ts, _, row, _ in pending]
+    
+    def late_rows_text(self) -> str:
+        """Lignes du segment tardif (sans en-tête, "" s'il n'existe pas)."""
+        try:
+            with open(self.late_filename, mode='r', encoding='utf-8') as file:
+                return file.read().partition("\n")[2]
+        except OSError:
+            return ""
+    
+    def get_history(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        descending: bool = False
+    ) -> Dict[str, np.ndarray]:
+        """
+        Récupère une fenêtre de l'historique, colonne par colonne.
         
-        if limit:
-            data = data[-limit:]
+        La fenêtre est comptée depuis l'entrée la plus récente : `offset`
+        entrées récentes sont sautées, puis les `limit` précédentes sont
+        retournées (sans `offset`, les `limit` dernières entrées).
+        
+        Args:
+            fields: Colonnes voulues (None = toutes)
+            limit: Nombre maximum d'entrées (None = tout)
+            offset: Entrées les plus récentes à sauter
+            descending: Plus récente en premier
+            
+        Returns:
+            Colonne -> tableau NumPy typé (seules les colonnes demandées,
+            horodatage epoch ; cf. analytics.to_edge pour la sortie)
+        """
+        start = time.perf_counter()
+        fields = list(fields or self.headers)
+        if limit is not None and not self.columns.loaded:
+            # Colonnes pas encore chargées (démarrage) : seule la fin du
+            # fichier est lue, sans déclencher le chargement complet ; le
+            # segment tardif (petit) est fusionné en entier
+            stored = self.columns.parse("".join(
+                line + "\n" for line in read_tail_lines(self.filename, limit + offset, header=True)
+            ))
+            late = self.late_rows_text()
+            if late.strip():
+                stored = analytics.merge_sorted(stored, self.columns.parse(late))
+        else:
+            stored = self.columns.select()
+        # Lignes encore dans le tampon de réordonnancement : les plus
+        # récentes, sauf les tardives, fusionnées à leur place dans la
+        # fenêtre utile (limit + offset dernières entrées)
+        pending = self.pending_rows()
+        if pending:
+            extra = self.columns.parse("".join(
+                ",".join(str(value) for value in row) + "\n" for row in pending
+            ))
+            keep = len(stored["timestamp"]) if limit is None else min(limit + offset, len(stored["timestamp"]))
+            recent = {field: column[len(column) - keep:] for field, column in stored.items()}
+            stored = analytics.merge_sorted(recent, extra)
+        
+        count = len(stored["timestamp"])
+        stop = max(0, count - offset)
+        first = 0 if limit is None else max(0, stop - limit)
+        data = {}
+        for field in fields:
+            column = stored[field][first:stop]
+            data[field] = column[::-1] if descending else column
+        
+        HISTORY_ROWS.inc(amount=stop - first)
+        HISTORY_SECONDS.observe(time.perf_counter() - start)
         return data
+    
+    @staticmethod
+    def _parse_row(row: dict) -> dict:
+        """Convertit une ligne CSV brute en entrée typée."""
+        return {
+            "timestamp": row.get("timestamp", ""),
+            "temperature": float(row.get("temperature", 0) or 0),
+            "humidity": float(row.get("humidity", 0) or 0),
+            "mass": float(row.get("mass", 0) or 0),
+            "luminosity": float(row.get("luminosity", 0) or 0),
+            "bee_count": int(row.get("bee_count", 0) or 0),
+            "hornet_count": int(row.get("hornet_count", 0) or 0)
+        }
+
+
+class AlertLog:
+    """
+    Journal des alertes, une alerte JSON par ligne (append-only).
+    
+    Les alertes sont rares : écriture immédiate, sans tampon.
+    """
+    
+    def __init__(self, filename: str = ALERTS_FILE) -> None:
+        """
+        Args:
+            filename: Chemin du journal JSON lines
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+    
+    def append(self, alert: dict) -> None:
+        """Ajoute une alerte au journal."""
+        line = json.dumps(alert, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.filename, mode='a', encoding='utf-8') as file:
+                file.write(line)
+    
+    def recent(self, limit: int) -> List[dict]:
+        """
+        Dernières alertes, lues depuis la fin du journal.
+        
+        Args:
+            limit: Nombre maximum d'alertes
+            
+        Returns:
+            Alertes, de la plus ancienne à la plus récente
+        """
+        alerts = []
+        for line in read_tail_lines(self.filename, limit):
+            try:
+                alerts.append(json.loads(line))
+            except ValueError:
+                continue  # Ligne tronquée (arrêt brutal)
+        return alerts
 
 
 # ============================================================================
 # SYSTEM STATE
 # ============================================================================
 
-class SystemState:
+class StateSnapshot(NamedTuple):
     """
-    État global du système en mémoire (Singleton).
+    Photographie immuable de l'état système.
     
-    Maintient les dernières valeurs connues de tous les capteurs.
-    Thread-safe par design (GIL Python + opérations atomiques).
+    `version` augmente à chaque mise à jour : elle identifie un état de
+    façon unique et sert de clé de cache pour les réponses dérivées.
     """
-    
-    def __init__(self) -> None:
-        """Initialise l'état avec des valeurs par défaut."""
-        self.temperature: float = 0.0
-        self.humidity: float = 0.0
-        self.mass: float = 0.0
-        self.luminosity: float = 0.0
-        self.bee_count: int = 0
-        self.hornet_count: int = 0
+    temperature: float = 0.0
+    humidity: float = 0.0
+    mass: float = 0.0
+    luminosity: float = 0.0
+    bee_count: int = 0
+    hornet_count: int = 0
+    version: int = 0
     
     def to_dict(self) -> dict:
-        """Convertit l'état en dictionnaire sérialisable."""
+        """Convertit l'état en dictionnaire sérialisable (sans la version)."""
         return {
             "temperature": self.temperature,
             "humidity": self.humidity,
@@ -184,6 +617,53 @@ class SystemState:
         }
 
 
+class SystemState:
+    """
+    État global du système en mémoire (Singleton).
+    
+    Maintient les dernières valeurs connues de tous les capteurs sous
+    forme de StateSnapshot immuable. Une mise à jour construit un nouveau
+    snapshot (copy-on-write) puis le publie par une simple affectation :
+    les lecteurs (boucle asyncio, thread MQTT) obtiennent toujours un état
+    cohérent sans verrou. Seuls les écrivains sont sérialisés.
+    """
+    
+    def __init__(self) -> None:
+        """Initialise l'état avec des valeurs par défaut."""
+        self._snapshot = StateSnapshot()
+        self._write_lock = threading.Lock()
+    
+    @property
+    def snapshot(self) -> StateSnapshot:
+        """Snapshot courant (lecture sans verrou)."""
+        return self._snapshot
+    
+    @property
+    def version(self) -> int:
+        """Version du snapshot courant."""
+        return self._snapshot.version
+    
+    def update(self, values: dict) -> StateSnapshot:
+        """
+        Publie un nouveau snapshot avec les valeurs données.
+        
+        Args:
+            values: Champs à mettre à jour (clés de to_dict())
+            
+        Returns:
+            Le snapshot publié
+        """
+        with self._write_lock:
+            current = self._snapshot
+            snapshot = current._replace(version=current.version + 1, **values)
+            self._snapshot = snapshot
+        return snapshot
+    
+    def to_dict(self) -> dict:
+        """Convertit l'état courant en dictionnaire sérialisable."""
+        return self._snapshot.to_dict()
+
+
 # ============================================================================
 # WEBSOCKET MANAGER
 # ============================================================================
@@ -194,21 +674,110 @@ class ConnectionManager:
     
     Implémente le pattern Observer pour broadcaster les mises à jour
     à tous les clients connectés.
+    
+    Chaque message diffusé porte un numéro de séquence monotone (`seq`)
+    et est conservé dans un buffer borné. Un client qui se reconnecte
+    avec son dernier `seq` reçoit uniquement les deltas manqués, ou un
+    snapshot complet si l'écart dépasse la capacité du buffer.
+    
+    Un heartbeat (ping applicatif + timeout d'inactivité) détecte les
+    connexions mortes sans attendre l'échec d'un broadcast, et le nombre
+    de connexions simultanées est plafonné.
+    
+    Le même flux alimente les abonnés Server-Sent Events (`/api/stream`)
+    via une file bornée par abonné.
     """
     
-    def __init__(self) -> None:
-        """Initialise la liste des connexions actives."""
+    def __init__(self, replay_size: int = WS_REPLAY_BUFFER) -> None:
+        """
+        Initialise la liste des connexions actives et le buffer de rejeu.
+        
+        Args:
+            replay_size: Nombre maximum de messages conservés pour le rejeu
+        """
         self.active_connections: List[WebSocket] = []
+        # Identifiant du flux : change à chaque redémarrage du serveur,
+        # les numéros de séquence d'un autre flux ne sont pas rejouables
+        self.stream_id: str = uuid.uuid4().hex[:12]
+        self.seq: int = 0
+        self.replay_buffer: Deque[Tuple[int, str]] = deque(maxlen=replay_size)
+        # Horodatage (monotonic) du dernier message reçu par connexion
+        # (None tant que le client n'a rien envoyé : réception seule)
+        self.last_seen: Dict[WebSocket, Optional[float]] = {}
+        # Files des abonnés SSE ; None en tête de file = resynchronisation
+        self.subscribers: List[asyncio.Queue] = []
+        # Appelés à chaque broadcast numéroté (ex: relais vers le bus)
+        self.forwarders: List[Callable[[int, str, str, bool], None]] = []
+        self.max_connections: int = WS_MAX_CONNECTIONS
+        # Compteurs exposés via /api/ws/stats
+        self.accepted_total: int = 0
+        self.rejected_total: int = 0
+        self.reaped_total: int = 0
     
-    async def connect(self, websocket: WebSocket) -> None:
+    async def connect(
+        self,
+        websocket: WebSocket,
+        snapshot: Callable[[], dict],
+        last_seq: Optional[int] = None,
+        stream_id: Optional[str] = None
+    ) -> bool:
         """
-        Accepte une nouvelle connexion WebSocket.
+        Accepte une nouvelle connexion WebSocket et la synchronise.
+        
+        Rejoue les messages postérieurs à `last_seq` si possible, sinon
+        envoie un message `init` construit à partir de `snapshot()`.
+        La connexion n'est ajoutée à la liste active qu'une fois à jour,
+        ce qui garantit l'ordre des séquences côté client.
         
         Args:
             websocket: Connexion WebSocket entrante
+            snapshot: Fournit l'état complet pour le message `init`
+            last_seq: Dernier numéro de séquence reçu par le client
+            stream_id: Identifiant du flux connu par le client
+            
+        Returns:
+            False si la connexion a été refusée (limite atteinte)
         """
         await websocket.accept()
+        
+        if len(self.active_connections) >= self.max_connections:
+            # 1013 = "Try Again Later"
+            self.rejected_total += 1
+            await websocket.close(code=1013)
+            return False
+        
+        async def send_init() -> int:
+            seq = self.seq
+            await websocket.send_text(json.dumps({
+                "type": "init",
+                "seq": seq,
+                "stream": self.stream_id,
+                "data": snapshot()
+            }))
+            return seq
+        
+        if last_seq is not None and stream_id == self.stream_id and self.can_resume(last_seq):
+            sent_seq = last_seq
+        else:
+            sent_seq = await send_init()
+        
+        # Rattrapage jusqu'à la séquence courante (les broadcasts émis
+        # pendant un envoi sont repris au tour suivant). Si le buffer ne
+        # couvre plus l'écart (vide, ou dépassé pendant l'envoi), un
+        # nouvel `init` remplace les messages perdus.
+        while sent_seq < self.seq:
+            missed = self.replay_since(sent_seq)
+            if not missed or missed[0][0] > sent_seq + 1:
+                sent_seq = await send_init()
+                continue
+            for seq, message in missed:
+                await websocket.send_text(message)
+                sent_seq = seq
+        
         self.active_connections.append(websocket)
+        self.last_seen[websocket] = None
+        self.accepted_total += 1
+        return True
     
     def disconnect(self, websocket: WebSocket) -> None:
         """
@@ -219,27 +788,285 @@ class ConnectionManager:
         """
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self.last_seen.pop(websocket, None)
     
-    async def broadcast(self, message: str) -> None:
+    def touch(self, websocket: WebSocket) -> None:
         """
-        Envoie un message à tous les clients connectés.
+        Marque une connexion comme vivante (message ou pong reçu).
         
-        Les erreurs de connexion sont silencieusement ignorées
-        (le client sera nettoyé lors de la prochaine erreur).
+        Args:
+            websocket: Connexion émettrice
+        """
+        if websocket in self.last_seen:
+            self.last_seen[websocket] = time.monotonic()
+    
+    async def _send(self, websocket: WebSocket, message: str) -> bool:
+        """
+        Envoie un message avec timeout.
         
         Args:
-            message: Message JSON à diffuser
+            websocket: Connexion destinataire
+            message: Message JSON à envoyer
+            
+        Returns:
+            False si l'envoi a échoué ou dépassé WS_SEND_TIMEOUT
         """
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception:
-                disconnected.append(connection)
+        try:
+            await asyncio.wait_for(websocket.send_text(message), WS_SEND_TIMEOUT)
+            return True
+        except Exception:
+            return False
+    
+    async def reap(self, websocket: WebSocket) -> None:
+        """
+        Ferme et retire une connexion jugée morte.
+        
+        Args:
+            websocket: Connexion à supprimer
+        """
+        if websocket not in self.last_seen:
+            return
+        self.disconnect(websocket)
+        self.reaped_total += 1
+        try:
+            await asyncio.wait_for(websocket.close(code=1001), WS_SEND_TIMEOUT)
+        except Exception:
+            pass
+    
+    async def heartbeat(self) -> None:
+        """
+        Boucle de heartbeat : ping applicatif périodique.
+        
+        Une connexion est fermée si l'envoi du ping échoue ou dépasse
+        WS_SEND_TIMEOUT, ou si le client a déjà répondu (pong ou autre
+        message) puis est resté muet plus de WS_IDLE_TIMEOUT. Un client en
+        réception seule n'est jamais fermé pour inactivité : ses sockets
+        half-open sont détectés par les pings du protocole (uvicorn). Les
+        pings ne sont pas numérotés et n'entrent pas dans le buffer de rejeu.
+        """
+        while True:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            now = time.monotonic()
+            idle = [ws for ws in list(self.active_connections)
+                    if self.last_seen.get(ws) is not None and now - self.last_seen[ws] > WS_IDLE_TIMEOUT]
+            for websocket in idle:
+                await self.reap(websocket)
+            
+            ping = json.dumps({"type": "ping", "ts": time.time()})
+            alive = list(self.active_connections)
+            results = await asyncio.gather(*(self._send(ws, ping) for ws in alive))
+            for websocket, ok in zip(alive, results):
+                if not ok:
+                    await self.reap(websocket)
+    
+    def stats(self) -> dict:
+        """Retourne les compteurs de connexions WebSocket."""
+        return {
+            "active": len(self.active_connections),
+            "max": self.max_connections,
+            "accepted_total": self.accepted_total,
+            "rejected_total": self.rejected_total,
+            "reaped_total": self.reaped_total,
+            "sse_active": len(self.subscribers),
+            "seq": self.seq
+        }
+    
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Enregistre un abonné au flux de broadcast (hors WebSocket).
+        
+        Returns:
+            File recevant des couples (évènement SSE formaté, prioritaire),
+            ou None pour une resynchronisation
+        """
+        # Bornée par _publish (SSE_QUEUE_SIZE), seules les alertes dépassent
+        queue: asyncio.Queue = asyncio.Queue()
+        self.subscribers.append(queue)
+        return queue
+    
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """
+        Retire un abonné du flux de broadcast.
+        
+        Args:
+            queue: File retournée par subscribe()
+        """
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+    
+    def _publish(self, event: str, priority: bool = False) -> None:
+        """
+        Pousse un évènement dans les files des abonnés SSE.
+        
+        Un abonné dont la file est pleine (SSE_QUEUE_SIZE) est trop en
+        retard : sa file est vidée et remplacée par un marqueur de
+        resynchronisation, il recevra un snapshot complet plutôt que
+        l'arriéré (même repli que /ws). Les évènements prioritaires
+        (alertes) ne sont jamais perdus : ceux en attente sont conservés
+        devant le marqueur, dans l'ordre des séquences, et un nouvel
+        évènement prioritaire est toujours mis en file.
+        
+        Args:
+            event: Évènement SSE déjà formaté (partagé par tous les abonnés)
+            priority: Évènement à ne jamais abandonner
+        """
+        for queue in self.subscribers:
+            if queue.qsize() >= SSE_QUEUE_SIZE and not priority:
+                kept = []
+                while not queue.empty():
+                    item = queue.get_nowait()
+                    if item is not None and item[1]:
+                        kept.append(item)
+                for item in kept:
+                    queue.put_nowait(item)
+                # Le snapshot de resynchronisation inclut cet évènement
+                queue.put_nowait(None)
+                continue
+            queue.put_nowait((event, priority))
+    
+    def _sse_init(self, snapshot: Callable[[], dict]) -> str:
+        """Construit l'évènement SSE `init` à la séquence courante."""
+        message = json.dumps({
+            "type": "init",
+            "seq": self.seq,
+            "stream": self.stream_id,
+            "data": snapshot()
+        })
+        return f"id: {self.stream_id}:{self.seq}\nevent: init\ndata: {message}\n\n"
+    
+    def _sse_event(self, seq: int, text: str, event_type: Optional[str] = None) -> str:
+        """Formate un message sérialisé en évènement SSE."""
+        if event_type is None:
+            event_type = json.loads(text).get("type", "message")
+        return f"id: {self.stream_id}:{seq}\nevent: {event_type}\ndata: {text}\n\n"
+    
+    async def sse_events(
+        self,
+        request: Request,
+        snapshot: Callable[[], dict],
+        last_event_id: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Générateur d'évènements Server-Sent Events.
+        
+        L'identifiant d'évènement vaut `<stream>:<seq>`, ce qui permet la
+        reprise native de EventSource via l'en-tête `Last-Event-ID`.
+        
+        Args:
+            request: Requête HTTP (détection de déconnexion)
+            snapshot: Fournit l'état complet pour l'évènement `init`
+            last_event_id: Valeur de l'en-tête Last-Event-ID
+            
+        Yields:
+            Évènements SSE formatés
+        """
+        last_seq: Optional[int] = None
+        if last_event_id and ":" in last_event_id:
+            stream_id, _, seq_str = last_event_id.partition(":")
+            if stream_id == self.stream_id and seq_str.isdigit():
+                last_seq = int(seq_str)
+        
+        # Abonnement et calcul de l'arriéré sans await entre les deux :
+        # aucun message ne peut être perdu ni dupliqué
+        queue = self.subscribe()
+        if last_seq is not None and self.can_resume(last_seq):
+            backlog = [self._sse_event(seq, text) for seq, text in self.replay_since(last_seq)]
+        else:
+            backlog = [self._sse_init(snapshot)]
+        
+        try:
+            # Délai de reconnexion conseillé au client (ms)
+            yield "retry: 3000\n\n"
+            for event in backlog:
+                yield event
+            
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), WS_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Commentaire SSE : garde la connexion ouverte via proxies
+                    yield ": ping\n\n"
+                    continue
+                
+                yield item[0] if item is not None else self._sse_init(snapshot)
+        finally:
+            self.unsubscribe(queue)
+    
+    def can_resume(self, last_seq: int) -> bool:
+        """
+        Indique si les messages postérieurs à `last_seq` sont encore en buffer.
+        
+        Args:
+            last_seq: Dernier numéro de séquence reçu par le client
+            
+        Returns:
+            True si le rejeu est possible sans perte
+        """
+        if last_seq > self.seq or last_seq < 0:
+            return False
+        if last_seq == self.seq:
+            return True
+        return bool(self.replay_buffer) and self.replay_buffer[0][0] <= last_seq + 1
+    
+    def replay_since(self, last_seq: int) -> List[Tuple[int, str]]:
+        """
+        Retourne les messages bufferisés de séquence strictement supérieure.
+        
+        Args:
+            last_seq: Dernier numéro de séquence reçu
+            
+        Returns:
+            Liste de tuples (seq, message JSON) dans l'ordre d'émission
+        """
+        return [item for item in self.replay_buffer if item[0] > last_seq]
+    
+    async def broadcast(self, message: dict, priority: bool = False) -> None:
+        """
+        Numérote, relaie puis envoie un message à tous les clients.
+        
+        Les envois sont concurrents et bornés par WS_SEND_TIMEOUT : un
+        client lent ou mort ne retarde pas les autres et est nettoyé.
+        
+        Args:
+            message: Message à diffuser ({"type": ..., "data": ...})
+            priority: Canal prioritaire (alertes), jamais abandonné
+        """
+        self.seq += 1
+        text = json.dumps({"seq": self.seq, **message})
+        event_type = message.get("type", "message")
+        for forward in self.forwarders:
+            forward(self.seq, text, event_type, priority)
+        await self.deliver(self.seq, text, event_type, priority)
+    
+    async def deliver(self, seq: int, text: str, event_type: str, priority: bool = False) -> None:
+        """
+        Bufferise et envoie un message déjà numéroté aux clients locaux.
+        
+        Utilisé directement par les workers, dont les messages sont
+        numérotés par le processus propriétaire.
+        
+        Args:
+            seq: Numéro de séquence du message
+            text: Message JSON sérialisé (contient `seq`)
+            event_type: Type du message (nom d'évènement SSE)
+            priority: Canal prioritaire (cf. _publish)
+        """
+        self.seq = max(self.seq, seq)
+        self.replay_buffer.append((seq, text))
+        if self.subscribers:
+            self._publish(self._sse_event(seq, text, event_type), priority)
+        
+        start = time.perf_counter()
+        connections = list(self.active_connections)
+        results = await asyncio.gather(*(self._send(ws, text) for ws in connections))
+        BROADCAST_SECONDS.observe(time.perf_counter() - start)
         
         # Nettoyage des connexions mortes
-        for conn in disconnected:
-            self.disconnect(conn)
+        for conn, ok in zip(connections, results):
+            if not ok:
+                await self.reap(conn)
 
 
 # ============================================================================
@@ -263,14 +1090,320 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Profilage à la demande (/admin/*, désactivé sans ADMIN_TOKEN)
+app.include_router(admin_router())
+
+
+def _json_safe(value: Any) -> Any:
+    """Remplace récursivement les flottants non finis (NaN, Infinity) par leur texte."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    return value
+
+
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError) -> JSONResponse:
+    """
+    Réponse 422 standard de FastAPI.
+    
+    Les entrées refusées sont recopiées dans `detail` : un NaN ou Infinity
+    (accepté par le parseur JSON de Python) y rendrait la réponse
+    elle-même invalide, il est donc converti en texte.
+    """
+    return JSONResponse(status_code=422, content={"detail": _json_safe(jsonable_encoder(exc.errors()))})
+
+# Logs JSON via une file et une thread d'écriture (jamais bloquants)
+jsonlog.setup_logging("backend")
+log = logging.getLogger("smarthive")
+
 # Global instances
 state = SystemState()
 logger = CSVLogger()
 manager = ConnectionManager()
+history_cache = ResponseCache(HISTORY_CACHE_BYTES)
+tracer = LatencyTracker(TRACE_WINDOW)
+alert_log = AlertLog()
+anomaly_monitor = AnomalyMonitor() if ANOMALY_DETECTION else None
+hornet_engine = HornetRuleEngine(HORNET_RULES)
 main_loop: Optional[asyncio.AbstractEventLoop] = None
+heartbeat_task: Optional[asyncio.Task] = None
+persist_task: Optional[asyncio.Task] = None
+bus_server: Optional[BusServer] = None
+bus_client: Optional[BusClient] = None
+# Ouvert par le processus qui ingère (single ou propriétaire), pas par les workers
+recorder: Optional[UplinkRecorder] = None
+
+# MQTT Client (connexion gérée par mqtt_link, cf. start_mqtt)
+mqtt_client = mqtt.Client(transport=MQTT_TRANSPORT)
+mqtt_link: Optional[MqttLink] = None
+started_at = time.time()
+
+
+# ============================================================================
+# INGESTION
+# ============================================================================
+
+SENSOR_FIELDS = ("temperature", "humidity", "mass", "luminosity")
+DETECTION_FIELDS = ("bee_count", "hornet_count")
+# Ruche des entrées sans identifiant (et de l'historique CSV, mono-série)
+DEFAULT_HIVE = "default"
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """
+    Convertit un horodatage ISO 8601 (TTN, client) en epoch.
+    
+    Les fractions au-delà de la microseconde (TTN: nanosecondes) sont
+    tronquées ; un horodatage sans fuseau est en heure locale, comme pour
+    l'API HTTP (cf. ingest) et le CSV.
+    
+    Args:
+        value: Horodatage ISO (ex: "2024-05-01T10:00:00.123456789Z")
+        
+    Returns:
+        Epoch en secondes, None si absent ou invalide
+    """
+    if not value:
+        return None
+    try:
+        text = value.replace("Z", "+00:00")
+        if "." in text:
+            head, _, tail = text.partition(".")
+            digits = len(tail) - len(tail.lstrip("0123456789"))
+            text = f"{head}.{tail[:min(digits, 6)]}{tail[digits:]}"
+        # Sans fuseau, datetime.timestamp() interprète en heure locale
+        return datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        return None
+
+
+def apply_ingest(values: dict, timestamp: Optional[float] = None) -> StateSnapshot:
+    """
+    Applique des mesures à l'état et les persiste.
+    
+    Args:
+        values: Champs de l'état à mettre à jour
+        timestamp: Horodatage source epoch (défaut: réception)
+        
+    Returns:
+        Snapshot publié (c'est lui qui est persisté, pas l'état partagé)
+    """
+    snapshot = state.update(values)
+    logger.log(snapshot, timestamp)
+    return snapshot
+
 
-# MQTT Client
-mqtt_client = mqtt.Client(transport="websockets")
+def build_update(snapshot: StateSnapshot, fields: Iterable[str]) -> dict:
+    """
+    Construit le message de mise à jour pour les champs donnés.
+    
+    Args:
+        snapshot: Snapshot source des valeurs
+        fields: Champs de l'état à inclure
+        
+    Returns:
+        Message `detection_update` si uniquement des compteurs,
+        `sensor_update` sinon
+    """
+    fields = list(fields)
+    kind = "detection_update" if set(fields) <= set(DETECTION_FIELDS) else "sensor_update"
+    return {"type": kind, "data": {field: getattr(snapshot, field) for field in fields}}
+
+
+def record_http(values: dict, timestamp: Optional[float] = None, hive: Optional[str] = None) -> None:
+    """
+    Enregistre une ingestion HTTP si l'enregistrement est actif.
+    
+    Args:
+        values: Champs reçus
+        timestamp: Horodatage fourni par le client (epoch)
+        hive: Ruche émettrice (rejouée en `device_id`)
+    """
+    if recorder is not None:
+        payload = values if timestamp is None else {**values, "timestamp": timestamp}
+        if hive is not None:
+            payload = {**payload, "device_id": hive}
+        recorder.record(KIND_HTTP, json.dumps(payload).encode())
+
+
+async def ingest(
+    values: dict,
+    timestamp: Optional[datetime] = None,
+    trace: Optional[dict] = None,
+    hive: Optional[str] = None
+) -> None:
+    """
+    Traite une ingestion reçue par l'API HTTP.
+    
+    En mode worker, l'ingestion est transmise au propriétaire qui la
+    persiste et la diffuse à tous les workers via le bus.
+    
+    Args:
+        values: Champs de l'état à mettre à jour
+        timestamp: Horodatage fourni par le client (sans fuseau = heure locale)
+        trace: Contexte de trace complété de `received_at`
+        hive: Ruche émettrice (défaut: DEFAULT_HIVE)
+    """
+    epoch = timestamp.timestamp() if timestamp is not None else None
+    await ingest_records([(values, epoch)], trace, hive)
+
+
+async def ingest_records(
+    records: Sequence[Record],
+    trace: Optional[dict] = None,
+    hive: Optional[str] = None
+) -> None:
+    """
+    Traite un lot d'ingestions (une ou plusieurs lignes).
+    
+    En mode worker, le lot est transmis en une seule commande au
+    propriétaire.
+    
+    Args:
+        records: Tuples (valeurs, horodatage epoch ou None)
+        trace: Contexte de trace du lot (optionnel)
+        hive: Ruche émettrice du lot (défaut: DEFAULT_HIVE)
+        
+    Raises:
+        HTTPException: 503 si le propriétaire est injoignable (l'émetteur
+            doit renvoyer le lot)
+    """
+    INGEST_RECORDS.inc(amount=len(records))
+    if bus_client is not None:
+        command = {"op": "ingest", "records": [list(record) for record in records]}
+        if trace is not None:
+            command["trace"] = trace
+        if hive is not None:
+            command["hive"] = hive
+        if not await bus_client.send(command):
+            log.warning("Propriétaire indisponible, ingestion refusée", extra={"records": len(records)})
+            raise HTTPException(status_code=503, detail="Ingestion indisponible, réessayer plus tard")
+        return
+    
+    await apply_records(records, trace, hive)
+
+
+async def apply_records(
+    records: Sequence[Record],
+    trace: Optional[dict] = None,
+    hive: Optional[str] = None
+) -> None:
+    """
+    Persiste chaque enregistrement puis diffuse l'état résultant.
+    
+    Un lot produit au plus un message par type (capteurs, détections)
+    portant les dernières valeurs, pas un message par ligne.
+    
+    Args:
+        records: Tuples (valeurs, horodatage epoch ou None)
+        trace: Contexte de trace : recopié dans les messages diffusés
+            (le dashboard peut mesurer son propre délai d'affichage) puis
+            clôturé après le broadcast
+        hive: Ruche émettrice : clé des détecteurs d'anomalies et des
+            règles frelons (défaut: DEFAULT_HIVE)
+    """
+    sensor_fields, detection_fields = set(), set()
+    snapshot = state.snapshot
+    anomalies, hornet_alerts = [], []
+    for values, timestamp in records:
+        record_http(values, timestamp, hive)
+        snapshot = apply_ingest(values, timestamp)
+        anomalies += detect_anomalies(values, timestamp, hive)
+        if "hornet_count" in values:
+            observed_at = time.time() if timestamp is None else timestamp
+            hornet_alerts += hornet_engine.observe(values["hornet_count"], observed_at, hive or DEFAULT_HIVE)
+        for field in values:
+            (detection_fields if field in DETECTION_FIELDS else sensor_fields).add(field)
+    
+    ingested_at = time.time()
+    
+    # Alertes d'abord, sur le canal prioritaire : elles ne sont ni
+    # regroupées avec les mises à jour du lot ni retardées par leur envoi
+    if hornet_alerts:
+        await publish_alerts(hornet_alerts, kind="hornet")
+    if anomalies:
+        await publish_alerts(anomalies)
+    
+    for fields in (sensor_fields, detection_fields):
+        if fields:
+            message = build_update(snapshot, (f for f in CSV_HEADERS if f in fields))
+            if trace is not None:
+                message["trace"] = {"frame_id": trace["frame_id"], "captured_at": trace["captured_at"]}
+            await manager.broadcast(message)
+    
+    if trace is not None:
+        finish_trace(trace, ingested_at, time.time())
+
+
+def detect_anomalies(
+    values: dict,
+    timestamp: Optional[float] = None,
+    hive: Optional[str] = None
+) -> List[dict]:
+    """
+    Passe une mesure aux détecteurs d'anomalies en ligne.
+    
+    Args:
+        values: Champs reçus
+        timestamp: Horodatage source epoch (défaut: maintenant)
+        hive: Ruche émettrice, une série par ruche (défaut: DEFAULT_HIVE)
+        
+    Returns:
+        Anomalies détectées (souvent vide)
+    """
+    if anomaly_monitor is None:
+        return []
+    return anomaly_monitor.observe(values, time.time() if timestamp is None else timestamp,
+                                   hive or DEFAULT_HIVE)
+
+
+async def publish_alerts(anomalies: Sequence[dict], kind: str = "anomaly") -> None:
+    """
+    Diffuse des alertes (message `alert`, canal prioritaire) puis les persiste.
+    
+    Args:
+        anomalies: Alertes brutes (champ `timestamp` en epoch)
+        kind: Famille d'alerte ("anomaly", "hornet")
+    """
+    for anomaly in anomalies:
+        alert = {
+            "id": uuid.uuid4().hex[:12],
+            "kind": kind,
+            **anomaly,
+            "timestamp": CSVLogger._format_ts(anomaly["timestamp"])
+        }
+        await manager.broadcast({"type": "alert", "data": alert}, priority=True)
+        try:
+            alert_log.append(alert)
+        except OSError as e:
+            log.error("Erreur écriture journal d'alertes", extra={"error": str(e)})
+        ALERTS_RAISED.inc(kind)
+        log.info("Alerte", extra={"alert": alert})
+
+
+def finish_trace(trace: dict, ingested_at: float, broadcast_at: float) -> None:
+    """
+    Clôture une trace : fenêtre de percentiles et histogramme par étape.
+    
+    Args:
+        trace: Contexte de trace complété de `received_at`
+        ingested_at: Fin de l'ingestion (epoch)
+        broadcast_at: Fin du broadcast (epoch)
+    """
+    for stage, ms in tracer.record(trace, ingested_at, broadcast_at).items():
+        TRACE_STAGE_SECONDS.observe(ms / 1000, stage)
+    if bus_server is not None:
+        # Les workers servent /api/latency : ils reçoivent chaque trace close
+        bus_server.publish({
+            "op": "trace",
+            "trace": trace,
+            "ingested_at": ingested_at,
+            "broadcast_at": broadcast_at
+        })
 
 
 # ============================================================================
@@ -287,16 +1420,17 @@ def on_connect(client: mqtt.Client, userdata: any, flags: dict, rc: int) -> None
         flags: Flags de connexion
         rc: Code de retour (0 = succès)
     """
-    print(f"[MQTT] Connecté au broker avec code {rc}")
+    log.info("Connecté au broker MQTT", extra={"rc": rc})
     client.subscribe(MQTT_TOPIC)
-    print(f"[MQTT] Abonné au topic: {MQTT_TOPIC}")
+    log.info("Abonné au topic MQTT", extra={"topic": MQTT_TOPIC})
 
 
 def on_message(client: mqtt.Client, userdata: any, msg: mqtt.MQTTMessage) -> None:
     """
     Callback appelé lors de réception d'un message MQTT.
     
-    Parse le payload TTN et met à jour l'état système.
+    Parse le payload TTN et met à jour l'état système. Si le formatter
+    TTN est désactivé, le `frm_payload` brut est décodé localement.
     
     Args:
         client: Instance client MQTT
@@ -304,56 +1438,247 @@ def on_message(client: mqtt.Client, userdata: any, msg: mqtt.MQTTMessage) -> Non
         msg: Message MQTT reçu
     """
     global main_loop
+    if recorder is not None:
+        recorder.record(KIND_MQTT, msg.payload)
     try:
         payload = json.loads(msg.payload.decode())
         
         # Extraction données TTN
-        if "uplink_message" in payload and "decoded_payload" in payload["uplink_message"]:
-            decoded = payload["uplink_message"]["decoded_payload"]
-            changed = False
+        uplink = payload.get("uplink_message") or {}
+        decoded = uplink.get("decoded_payload")
+        if "frm_payload" in uplink and (
+            FRM_PAYLOAD_DECODE == "always"
+            or (FRM_PAYLOAD_DECODE == "auto" and decoded is None)
+        ):
+            decoded = decode_frm_payload(uplink["frm_payload"], uplink.get("f_port"))
+        
+        if decoded is not None:
+            values = {}
             
             if "temperature1" in decoded:
-                state.temperature = float(decoded["temperature1"])
-                changed = True
+                values["temperature"] = float(decoded["temperature1"])
             if "masse" in decoded:
-                state.mass = float(decoded["masse"])
-                changed = True
+                values["mass"] = float(decoded["masse"])
             if "humd" in decoded:
-                state.humidity = float(decoded["humd"])
-                changed = True
+                values["humidity"] = float(decoded["humd"])
             if "lum" in decoded:
-                state.luminosity = float(decoded["lum"])
-                changed = True
+                values["luminosity"] = float(decoded["lum"])
             
-            if changed:
-                logger.log(state)
+            if values:
+                # Horodatage réseau TTN plutôt que l'heure de traitement
+                timestamp = parse_timestamp(uplink.get("received_at") or payload.get("received_at"))
+                snapshot = apply_ingest(values, timestamp)
+                device_id = (payload.get("end_device_ids") or {}).get("device_id")
+                anomalies = detect_anomalies(values, timestamp, device_id)
                 
-                # Broadcast via WebSocket
-                if main_loop and manager.active_connections:
-                    message = json.dumps({
-                        "type": "sensor_update",
-                        "data": {
-                            "temperature": state.temperature,
-                            "humidity": state.humidity,
-                            "mass": state.mass,
-                            "luminosity": state.luminosity
-                        }
-                    })
+                # Broadcast via WebSocket (toujours numéroté, même sans
+                # client connecté, pour alimenter le buffer de rejeu)
+                if main_loop:
+                    message = build_update(snapshot, SENSOR_FIELDS)
                     asyncio.run_coroutine_threadsafe(
                         manager.broadcast(message), 
                         main_loop
                     )
-                    
+                    if anomalies:
+                        asyncio.run_coroutine_threadsafe(publish_alerts(anomalies), main_loop)
+        
+        MQTT_MESSAGES.inc("ok")
     except Exception as e:
-        print(f"[MQTT] Erreur traitement message: {e}")
+        MQTT_MESSAGES.inc("failed")
+        log.warning("Erreur traitement message MQTT", extra={"error": str(e)})
 
 
 # Configuration MQTT
 mqtt_client.on_connect = on_connect
 mqtt_client.on_message = on_message
 mqtt_client.username_pw_set(MQTT_USER, MQTT_PASSWORD)
-mqtt_client.ws_set_options(path="/ws")
-mqtt_client.tls_set()  # TLS requis pour port 443
+if MQTT_TRANSPORT == "websockets":
+    mqtt_client.ws_set_options(path=MQTT_WS_PATH)
+if MQTT_TLS:
+    mqtt_client.tls_set()  # TLS requis pour port 443
+
+
+async def persist_loop() -> None:
+    """
+    Vide périodiquement le tampon de réordonnancement du CSV.
+    
+    Réévalue aussi les alertes frelons actives : sans nouvelle détection
+    (caméra muette), elles passent à `cleared` sur l'horloge serveur.
+    """
+    while True:
+        await asyncio.sleep(min(1.0, max(0.1, REORDER_WINDOW / 2)))
+        try:
+            logger.flush()
+        except OSError as e:
+            log.error("Erreur écriture historique", extra={"error": str(e)})
+        expired = hornet_engine.expire(time.time())
+        if expired:
+            await publish_alerts(expired, kind="hornet")
+
+
+def restore_state() -> None:
+    """
+    Restaure le dernier état connu et réchauffe les détecteurs.
+    
+    Seules les RESTORE_WINDOW dernières lignes sont lues, le temps de
+    démarrage ne dépend donc pas de la taille du fichier. Chaque ligne
+    du CSV est un état complet : la dernière donne l'état courant, les
+    précédentes sont rejouées dans les détecteurs d'anomalies et les
+    règles frelons (sans émettre d'alerte). Une ligne compte comme mesure
+    capteur, resp. détection, si ces champs ont changé par rapport à la
+    ligne précédente.
+    """
+    start = time.perf_counter()
+    rows = logger.tail(max(1, RESTORE_WINDOW))
+    if not rows:
+        return
+    state.update({field: rows[-1][field] for field in SENSOR_FIELDS + DETECTION_FIELDS})
+    
+    previous = None
+    for row in rows:
+        timestamp = CSVLogger._parse_ts(row["timestamp"])
+        sensors = {field: row[field] for field in SENSOR_FIELDS}
+        detections = {field: row[field] for field in DETECTION_FIELDS}
+        if previous is None or sensors != previous[0]:
+            detect_anomalies(sensors, timestamp)
+        if previous is None or detections != previous[1]:
+            hornet_engine.observe(detections["hornet_count"], timestamp)
+        previous = (sensors, detections)
+    
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    log.info("État restauré", extra={
+        "since": rows[-1]["timestamp"],
+        "rows": len(rows),
+        "elapsed_ms": round(elapsed_ms, 1)
+    })
+
+
+def start_recorder() -> None:
+    """Ouvre le journal d'enregistrement si RECORD_FILE est défini."""
+    global recorder
+    if RECORD_FILE:
+        recorder = UplinkRecorder(RECORD_FILE)
+        log.info("Enregistrement des entrées", extra={"file": RECORD_FILE})
+
+
+def start_mqtt() -> None:
+    """
+    Lance la connexion MQTT en arrière-plan.
+    
+    Retour immédiat : la connexion et les reconnexions se font dans le
+    thread de MqttLink, l'API reste disponible sans broker (mode simulation).
+    """
+    global mqtt_link
+    mqtt_link = MqttLink(
+        mqtt_client, MQTT_BROKER, MQTT_PORT,
+        backoff_min=MQTT_BACKOFF_MIN, backoff_max=MQTT_BACKOFF_MAX
+    )
+    mqtt_link.start()
+    log.info("Connexion MQTT en arrière-plan", extra={"broker": MQTT_BROKER, "port": MQTT_PORT})
+
+
+# ============================================================================
+# MULTI-WORKER (BUS)
+# ============================================================================
+
+def bus_hello() -> dict:
+    """Message d'accueil d'un worker : état, séquence et buffer de rejeu."""
+    return {
+        "stream": manager.stream_id,
+        "seq": manager.seq,
+        "state": state.to_dict(),
+        "replay": list(manager.replay_buffer)
+    }
+
+
+def forward_to_bus(seq: int, text: str, event_type: str, priority: bool = False) -> None:
+    """
+    Relaie un broadcast du propriétaire vers tous les workers.
+    
+    L'état complet accompagne chaque évènement pour que les workers
+    servent des snapshots `init` cohérents sans relire le CSV.
+    """
+    if bus_server is not None:
+        bus_server.publish({
+            "op": "event",
+            "seq": seq,
+            "type": event_type,
+            "text": text,
+            "priority": priority,
+            "state": state.to_dict()
+        })
+
+
+async def handle_bus_command(command: dict) -> None:
+    """
+    Traite une commande reçue d'un worker (côté propriétaire).
+    
+    Args:
+        command: Commande JSON ({"op": "ingest", "records": [[values, ts], ...],
+            "trace"?, "hive"?})
+    """
+    if command.get("op") == "ingest":
+        records = [(values, timestamp) for values, timestamp in command["records"]]
+        await apply_records(records, command.get("trace"), command.get("hive"))
+
+
+async def handle_bus_message(message: dict) -> None:
+    """
+    Traite un message reçu du propriétaire (côté worker).
+    
+    Args:
+        message: Message `hello` (resynchronisation), `event` ou `trace`
+    """
+    op = message.get("op")
+    if op == "hello":
+        state.update(message["state"])
+        if message["stream"] != manager.stream_id:
+            # Nouveau flux (premier contact ou propriétaire redémarré) :
+            # les clients connectés doivent se resynchroniser
+            for websocket in list(manager.active_connections):
+                await manager.reap(websocket)
+            manager.stream_id = message["stream"]
+            manager.replay_buffer.clear()
+            manager.seq = 0
+        for seq, text in message["replay"]:
+            if seq > manager.seq:
+                manager.replay_buffer.append((seq, text))
+        manager.seq = max(manager.seq, message["seq"])
+    elif op == "event":
+        state.update(message["state"])
+        await manager.deliver(message["seq"], message["text"], message["type"], message.get("priority", False))
+    elif op == "trace":
+        finish_trace(message["trace"], message["ingested_at"], message["broadcast_at"])
+
+
+def start_owner() -> None:
+    """
+    Démarre le processus propriétaire dans un thread dédié.
+    
+    Le propriétaire possède le client MQTT et la persistance, et
+    publie tous les évènements sur le bus. Il tourne dans le processus
+    superviseur d'uvicorn, les workers s'y connectent au démarrage.
+    """
+    ready = threading.Event()
+    
+    def run() -> None:
+        global main_loop, bus_server
+        main_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(main_loop)
+        bus_server = BusServer(bus_hello, handle_bus_command)
+        main_loop.run_until_complete(bus_server.start())
+        manager.forwarders.append(forward_to_bus)
+        main_loop.create_task(persist_loop())
+        # Le thread est daemon : vidage du tampon à la sortie du superviseur
+        atexit.register(logger.flush, True)
+        restore_state()
+        start_recorder()
+        start_mqtt()
+        ready.set()
+        main_loop.run_forever()
+    
+    threading.Thread(target=run, name="smarthive-owner", daemon=True).start()
+    ready.wait()
 
 
 # ============================================================================
@@ -373,19 +1698,9 @@ async def receive_lora(data: LoraData) -> dict:
     Returns:
         Confirmation de réception
     """
-    state.temperature = data.temperature
-    state.mass = data.mass
-    logger.log(state)
+    await ingest({"temperature": data.temperature, "mass": data.mass}, data.timestamp, hive=data.device_id)
     
-    await manager.broadcast(json.dumps({
-        "type": "sensor_update",
-        "data": {
-            "temperature": state.temperature,
-            "mass": state.mass
-        }
-    }))
-    
-    return {"status": "ok", "received": data.dict()}
+    return {"status": "ok", "received": data.dict(exclude_none=True)}
 
 
 @app.post("/api/detections", response_model=dict)
@@ -394,58 +1709,415 @@ async def receive_detections(data: YoloData) -> dict:
     Reçoit les statistiques de détection YOLO.
     
     Args:
-        data: Compteurs d'abeilles et frelons détectés
+        data: Compteurs d'abeilles et frelons détectés (+ trace optionnelle)
         
     Returns:
         Confirmation de réception
     """
-    state.bee_count = data.bee_count
-    state.hornet_count = data.hornet_count
-    logger.log(state)
+    trace = None
+    if data.trace is not None:
+        received_at = time.time()
+        stamps = [data.trace.captured_at] + ([data.trace.sent_at] if data.trace.sent_at is not None else [])
+        if all(abs(received_at - stamp) <= TRACE_MAX_SKEW for stamp in stamps):
+            trace = {**data.trace.dict(), "received_at": received_at}
+        else:
+            # Durées négatives ou énormes : fausseraient les percentiles
+            log.warning("Trace ignorée (horodatages hors bornes)", extra={
+                "frame_id": data.trace.frame_id,
+                "captured_at": data.trace.captured_at,
+                "received_at": received_at
+            })
+    await ingest({"bee_count": data.bee_count, "hornet_count": data.hornet_count}, data.timestamp, trace,
+                 data.device_id)
     
-    await manager.broadcast(json.dumps({
-        "type": "detection_update",
-        "data": {
-            "bee_count": state.bee_count,
-            "hornet_count": state.hornet_count
-        }
-    }))
+    return {"status": "ok", "received": data.dict(exclude_none=True)}
+
+
+@app.post("/api/ingest/binary", response_model=dict)
+async def receive_binary(
+    request: Request,
+    device_id: Optional[str] = Query(None, max_length=64, description="Ruche émettrice du lot")
+) -> dict:
+    """
+    Reçoit des enregistrements compacts msgpack ou CBOR (unitaires ou lot).
+    
+    Destiné aux équipements edge : moins d'octets sur le lien et une
+    validation spécialisée au schéma (cf. codec.py pour le format).
     
-    return {"status": "ok", "received": data.dict()}
+    Args:
+        request: Corps binaire du lot
+        device_id: Ruche émettrice (détecteurs par ruche, défaut: DEFAULT_HIVE)
+    
+    Returns:
+        Nombre d'enregistrements acceptés
+        
+    Raises:
+        HTTPException: 415 si le format est non supporté, 400 si le
+            corps est illisible, 422 si un enregistrement est invalide
+    """
+    decode = decoder_for(request.headers.get("content-type", ""))
+    if decode is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Content-Type attendu: application/msgpack ou application/cbor"
+        )
+    
+    try:
+        payload = decode(await request.body())
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Corps illisible: {e}")
+    
+    try:
+        records = parse_records(payload)
+    except RecordError as e:
+        raise HTTPException(status_code=422, detail={"index": e.index, "error": e.reason})
+    
+    await ingest_records(records, hive=device_id)
+    return {"status": "ok", "received": len(records)}
+
+
+@app.get("/api/state")
+async def get_state(if_none_match: Optional[str] = Header(None)) -> Response:
+    """
+    Retourne le snapshot courant de l'état.
+    
+    La version du snapshot sert d'ETag : un client qui renvoie
+    `If-None-Match` reçoit 304 tant que l'état n'a pas changé.
+    
+    Returns:
+        {"version": ..., "data": {...}} ou 304
+    """
+    snapshot = state.snapshot
+    etag = f'"{manager.stream_id}-{snapshot.version}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    body = json.dumps({"version": snapshot.version, "data": snapshot.to_dict()})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 
 @app.get("/api/history")
-async def get_history() -> List[dict]:
+async def get_history(
+    fields: Optional[str] = Query(None, description="Colonnes séparées par des virgules (défaut: toutes)"),
+    limit: Optional[int] = Query(None, ge=1, description="Nombre maximum d'entrées"),
+    offset: int = Query(0, ge=0, description="Entrées les plus récentes à sauter"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="asc: chronologique, desc: plus récente en premier"),
+    format: str = Query("rows", pattern="^(rows|columns)$", description="rows: un objet par entrée, columns: {champ: [...]}")
+) -> Response:
+    """
+    Récupère l'historique des mesures.
+    
+    Seules les colonnes demandées sont lues et sérialisées ; le format
+    `columns` évite de répéter les noms de champs à chaque entrée. La
+    pagination part de l'entrée la plus récente (`limit` seul = dernières
+    entrées, `offset` pour remonter dans le temps).
+    
+    Les requêtes identiques concurrentes partagent une seule lecture du
+    store (hors boucle asyncio) et la réponse sérialisée reste en cache
+    tant que le store n'a pas été modifié.
+    
+    Returns:
+        Entrées ({champ: valeur} par entrée, ou {champ: [valeurs]})
+    """
+    selected = None
+    if fields is not None:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in CSV_HEADERS]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Champs invalides: {fields}")
+    
+    def run() -> bytes:
+        data = logger.get_history(selected, limit, offset, order == "desc")
+        if format == "columns":
+            return analytics.dumps(analytics.to_edge(data))
+        data = analytics.to_lists(data)
+        names = list(data)
+        return analytics.dumps([dict(zip(names, values)) for values in zip(*data.values())])
+    
+    key = ("history", tuple(selected or ()), limit, offset, order, format, logger.write_version())
+    body = await history_cache.get(key, lambda: run_in_threadpool(run))
+    return Response(content=body, media_type="application/json")
+
+
+def parse_range(start: Optional[str], end: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Valide une plage de dates ISO 8601 (heure locale si sans fuseau).
+    
+    Raises:
+        HTTPException: 400 si une borne est illisible
+    """
+    bounds = []
+    for name, value in (("start", start), ("end", end)):
+        if value is None:
+            bounds.append(None)
+            continue
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Date invalide pour '{name}': {value}")
+        if moment.tzinfo is not None:
+            moment = moment.astimezone().replace(tzinfo=None)
+        bounds.append(moment)
+    return bounds[0], bounds[1]
+
+
+async def analytics_response(
+    kind: str,
+    start: Optional[str],
+    end: Optional[str],
+    compute: Callable[[dict], dict],
+    *params: str
+) -> Response:
+    """
+    Calcule (ou relit en cache) une analyse sur une plage de l'historique.
+    
+    La clé de cache combine la plage, les paramètres et la version
+    d'écriture du store : une nouvelle mesure invalide le résultat.
+    
+    Args:
+        kind: Nom de l'analyse
+        start: Début de plage ISO (inclus)
+        end: Fin de plage ISO (exclue)
+        compute: Fonction colonnes -> résultat (module analytics)
+        params: Paramètres supplémentaires de la requête
+        
+    Returns:
+        Réponse JSON
+    """
+    lower, upper = parse_range(start, end)
+    
+    def run() -> bytes:
+        return analytics.dumps(compute(logger.columns.select(lower, upper)))
+    
+    key = ("analytics", kind, lower, upper, params, logger.write_version())
+    body = await history_cache.get(key, lambda: run_in_threadpool(run))
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/api/analytics/correlations")
+async def get_correlations(
+    start: Optional[str] = Query(None, description="Début ISO 8601 (inclus)"),
+    end: Optional[str] = Query(None, description="Fin ISO 8601 (exclue)"),
+    fields: str = Query(",".join(analytics.NUMERIC_FIELDS), description="Champs séparés par des virgules")
+) -> Response:
+    """
+    Corrélations de Pearson entre champs sur une plage.
+    
+    Ex: trafic (bee_count) vs température et luminosité.
+    
+    Returns:
+        Champs et matrice de corrélation (null si indéfinie)
+    """
+    selected = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in selected if field not in analytics.NUMERIC_FIELDS]
+    if unknown or len(selected) < 2:
+        raise HTTPException(status_code=400, detail=f"Champs invalides: {fields}")
+    return await analytics_response(
+        "correlations", start, end,
+        lambda data: analytics.correlations(data, selected), *selected
+    )
+
+
+@app.get("/api/analytics/hourly")
+async def get_hourly_profile(
+    start: Optional[str] = Query(None, description="Début ISO 8601 (inclus)"),
+    end: Optional[str] = Query(None, description="Fin ISO 8601 (exclue)")
+) -> Response:
+    """
+    Profil d'activité moyen par heure de la journée sur une plage.
+    
+    Returns:
+        Échantillons et moyennes de chaque champ pour les heures 0-23
+    """
+    return await analytics_response("hourly", start, end, analytics.hourly_profile)
+
+
+@app.get("/api/analytics/daily")
+async def get_daily_totals(
+    start: Optional[str] = Query(None, description="Début ISO 8601 (inclus)"),
+    end: Optional[str] = Query(None, description="Fin ISO 8601 (exclue)")
+) -> Response:
+    """
+    Totaux journaliers abeilles / frelons sur une plage.
+    
+    Returns:
+        Jours, échantillons, sommes et maxima des comptages
+    """
+    return await analytics_response("daily", start, end, analytics.daily_totals)
+
+
+@app.get("/api/export")
+async def export_history(
+    format: str = Query("csv", pattern="^(csv|ndjson|columnar)$", description="csv, ndjson ou columnar"),
+    start: Optional[str] = Query(None, description="Début ISO 8601 (inclus)"),
+    end: Optional[str] = Query(None, description="Fin ISO 8601 (exclue)"),
+    accept_encoding: Optional[str] = Header(None)
+) -> StreamingResponse:
+    """
+    Export en flux d'une plage de l'historique (fichier à télécharger).
+    
+    Lu par blocs depuis le store et envoyé au fil de l'eau, compressé en
+    gzip si le client l'accepte : ni le backend ni le navigateur n'ont
+    besoin de la plage entière en mémoire. Les entrées encore dans le
+    tampon de réordonnancement ne sont pas exportées.
+    
+    Returns:
+        Réponse en flux (Content-Disposition: attachment)
+    """
+    lower, upper = parse_range(start, end)
+    compress = "gzip" in (accept_encoding or "").lower()
+    media_type, extension = export.FORMATS[format]
+    headers = {
+        "Content-Disposition": f'attachment; filename="smarthive_data_{datetime.now():%Y-%m-%d}.{extension}"',
+        "Vary": "Accept-Encoding"
+    }
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export.stream_export(logger.filename, logger.columns.parse, format, lower, upper, compress,
+                             late_filename=logger.late_filename),
+        media_type=media_type,
+        headers=headers
+    )
+
+
+@app.get("/api/stream")
+async def stream_events(
+    request: Request,
+    last_event_id: Optional[str] = Header(None)
+) -> StreamingResponse:
+    """
+    Flux Server-Sent Events, alternative légère au WebSocket.
+    
+    Diffuse les mêmes messages numérotés que `/ws`. La reprise après
+    reconnexion utilise l'en-tête standard `Last-Event-ID`.
+    
+    Returns:
+        Réponse `text/event-stream`
+    """
+    return StreamingResponse(
+        manager.sse_events(request, state.to_dict, last_event_id),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Désactive le buffering nginx
+        }
+    )
+
+
+@app.get("/api/health")
+async def get_health() -> dict:
     """
-    Récupère l'historique complet des mesures.
+    Liveness : le processus répond.
     
     Returns:
-        Liste chronologique des entrées CSV
+        Statut, rôle et uptime
     """
-    return logger.get_history()
+    return {"status": "ok", "role": RUN_ROLE, "uptime_s": round(time.time() - started_at, 1)}
+
+
+@app.get("/api/ready")
+async def get_ready() -> JSONResponse:
+    """
+    Readiness : le processus peut servir des données à jour.
+    
+    Un worker doit être relié au bus ; MQTT n'est bloquant que si
+    MQTT_REQUIRED est activé (sinon l'API fonctionne sans broker).
+    
+    Returns:
+        Détail des dépendances, 200 si prêt sinon 503
+    """
+    checks: Dict[str, dict] = {}
+    ready = main_loop is not None
+    if RUN_ROLE == "worker":
+        connected = bus_client is not None and bus_client.connected
+        checks["bus"] = {"connected": connected}
+        ready = ready and connected
+    elif mqtt_link is not None:
+        checks["mqtt"] = mqtt_link.status()
+        if MQTT_REQUIRED:
+            ready = ready and mqtt_link.connected
+    body = {"ready": ready, "role": RUN_ROLE, "checks": checks}
+    return JSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.get("/api/alerts")
+async def get_alerts(
+    limit: int = Query(50, ge=1, le=1000, description="Nombre maximum d'alertes")
+) -> List[dict]:
+    """
+    Dernières alertes persistées (anomalies capteurs, frelons).
+    
+    Returns:
+        Alertes, de la plus ancienne à la plus récente
+    """
+    return await run_in_threadpool(alert_log.recent, limit)
+
+
+@app.get("/api/latency")
+async def get_latency(
+    recent: int = Query(5, ge=0, le=100, description="Traces complètes à inclure")
+) -> dict:
+    """
+    Latence de bout en bout des détections tracées.
+    
+    Percentiles par étape (ms) sur les TRACE_WINDOW dernières traces :
+    étapes edge, uplink, ingestion, broadcast et total capture -> dashboard.
+    En multi-worker, chaque trace est clôturée par le processus
+    propriétaire puis diffusée à tous les workers.
+    
+    Returns:
+        Percentiles par étape et dernières traces
+    """
+    return tracer.report(recent)
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """
+    Métriques du processus au format texte Prometheus.
+    
+    Returns:
+        Compteurs, histogrammes de latence et jauges des files
+    """
+    return Response(content=registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/ws/stats")
+async def get_ws_stats() -> dict:
+    """
+    Statistiques des connexions WebSocket.
+    
+    Returns:
+        Connexions actives, acceptées, refusées et nettoyées
+    """
+    return manager.stats()
 
 
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket) -> None:
+async def websocket_endpoint(
+    websocket: WebSocket,
+    last_seq: Optional[int] = Query(None, description="Dernier seq reçu (reprise)"),
+    stream: Optional[str] = Query(None, description="Identifiant de flux reçu dans init")
+) -> None:
     """
     Endpoint WebSocket pour communication temps réel.
     
     Envoie l'état initial à la connexion, puis maintient
-    la connexion ouverte pour broadcasts futurs.
+    la connexion ouverte pour broadcasts futurs. Un client qui se
+    reconnecte avec `?last_seq=N&stream=ID` reçoit uniquement les
+    messages manqués (snapshot `init` si l'écart est trop grand).
     """
-    await manager.connect(websocket)
-    
-    # Envoi état initial
-    await websocket.send_text(json.dumps({
-        "type": "init",
-        "data": state.to_dict()
-    }))
+    if not await manager.connect(websocket, state.to_dict, last_seq=last_seq, stream_id=stream):
+        return
     
     try:
         while True:
-            # Maintien connexion (heartbeat optionnel ici)
+            # Messages entrants (pong optionnel) : marquent la connexion vivante
             await websocket.receive_text()
-    except WebSocketDisconnect:
+            manager.touch(websocket)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
         manager.disconnect(websocket)
 
 
@@ -456,24 +2128,38 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
 @app.on_event("startup")
 async def startup_event() -> None:
     """Initialisation au démarrage de l'application."""
-    global main_loop
+    global main_loop, heartbeat_task, persist_task, bus_client
     main_loop = asyncio.get_running_loop()
+    heartbeat_task = asyncio.create_task(manager.heartbeat())
     
-    try:
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT, 60)
-        mqtt_client.loop_start()
-        print(f"[Startup] MQTT Client démarré sur {MQTT_BROKER}:{MQTT_PORT}")
-    except Exception as e:
-        print(f"[Startup] Erreur connexion MQTT: {e}")
-        print("[Startup] Le serveur fonctionne sans MQTT (mode simulation)")
+    if RUN_ROLE == "worker":
+        # MQTT et persistance sont gérés par le processus propriétaire
+        bus_client = BusClient(handle_bus_message)
+        bus_client.start()
+        log.info("Worker connecté au bus", extra={"pid": os.getpid()})
+    else:
+        persist_task = asyncio.create_task(persist_loop())
+        restore_state()
+        start_recorder()
+        start_mqtt()
 
 
 @app.on_event("shutdown")
 async def shutdown_event() -> None:
     """Nettoyage à l'arrêt de l'application."""
-    mqtt_client.loop_stop()
-    mqtt_client.disconnect()
-    print("[Shutdown] MQTT Client arrêté")
+    if heartbeat_task:
+        heartbeat_task.cancel()
+    if bus_client is not None:
+        await bus_client.stop()
+        return
+    if mqtt_link is not None:
+        mqtt_link.stop()
+    log.info("Client MQTT arrêté")
+    if persist_task:
+        persist_task.cancel()
+    logger.flush(force=True)
+    if recorder is not None:
+        recorder.close()
 
 
 # ============================================================================
@@ -481,10 +2167,36 @@ async def shutdown_event() -> None:
 # ============================================================================
 
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=2000,
-        reload=True,
-        log_level="info"
+    parser = argparse.ArgumentParser(description="SmartHive Backend")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=2000)
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("BACKEND_WORKERS", "1")),
+        help="Nombre de workers uvicorn (>1 = mode production, sans reload)"
     )
+    args = parser.parse_args()
+    
+    if args.workers > 1:
+        # Ce processus (superviseur) possède MQTT + persistance ;
+        # chaque worker sert ses propres clients WebSocket
+        start_owner()
+        os.environ["SMARTHIVE_ROLE"] = "worker"
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            log_level="info",
+            ws_ping_interval=WS_PING_INTERVAL,
+            ws_ping_timeout=WS_IDLE_TIMEOUT
+        )
+    else:
+        uvicorn.run(
+            "main:app",
+            host=args.host,
+            port=args.port,
+            reload=True,
+            log_level="info",
+            ws_ping_interval=WS_PING_INTERVAL,
+            ws_ping_timeout=WS_IDLE_TIMEOUT
+        )
@@ -0,0 +1,195 @@
+"""
+SmartHive - Broker MQTT minimal (développement et benchmarks)
+
+Remplaçant local de TTN pour exercer le chemin MQTT hors ligne :
+- MQTT 3.1.1 sur TCP, sans authentification ni TLS
+- CONNECT, PUBLISH (QoS 0/1 en entrée), SUBSCRIBE/UNSUBSCRIBE
+  (wildcards + et #), PINGREQ, DISCONNECT
+- Distribution aux abonnés en QoS 0, sans messages retenus ni sessions
+
+Usage:
+  python mini_broker.py --port 1883
+  MQTT_BROKER=localhost MQTT_PORT=1883 MQTT_TRANSPORT=tcp MQTT_TLS=0 python main.py
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import argparse
+import asyncio
+import struct
+from typing import Dict, List, Set, Tuple
+
+# Types de paquets MQTT (4 bits de poids fort du premier octet)
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+
+def encode_length(length: int) -> bytes:
+    """Encode la longueur restante (entier variable MQTT, 7 bits par octet)."""
+    out = bytearray()
+    while True:
+        byte = length % 128
+        length //= 128
+        if length:
+            byte |= 0x80
+        out.append(byte)
+        if not length:
+            return bytes(out)
+
+
+def encode_string(value: str) -> bytes:
+    """Encode une chaîne UTF-8 préfixée par sa longueur (2 octets)."""
+    data = value.encode()
+    return struct.pack("!H", len(data)) + data
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """
+    Teste si un topic correspond à un filtre d'abonnement.
+
+    Args:
+        topic_filter: Filtre (peut contenir + et #)
+        topic: Topic de publication
+
+    Returns:
+        True si le topic est couvert par le filtre
+    """
+    filter_levels = topic_filter.split("/")
+    topic_levels = topic.split("/")
+    for i, level in enumerate(filter_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels):
+            return False
+        if level != "+" and level != topic_levels[i]:
+            return False
+    return len(filter_levels) == len(topic_levels)
+
+
+class MiniBroker:
+    """Broker MQTT asyncio en mémoire."""
+
+    def __init__(self) -> None:
+        self.subscriptions: Dict[asyncio.StreamWriter, Set[str]] = {}
+        self.published = 0
+        self.delivered = 0
+        # Cache topic -> abonnés (invalidé à chaque (dés)abonnement)
+        self._routes: Dict[str, List[asyncio.StreamWriter]] = {}
+
+    async def _read_packet(self, reader: asyncio.StreamReader) -> Tuple[int, int, bytes]:
+        """Lit un paquet complet : (type, flags, corps)."""
+        header = (await reader.readexactly(1))[0]
+        length, multiplier = 0, 1
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length += (byte & 0x7F) * multiplier
+            if not byte & 0x80:
+                break
+            multiplier *= 128
+        body = await reader.readexactly(length) if length else b""
+        return header >> 4, header & 0x0F, body
+
+    def _route(self, topic: str) -> List[asyncio.StreamWriter]:
+        route = self._routes.get(topic)
+        if route is None:
+            route = [w for w, filters in self.subscriptions.items()
+                     if any(topic_matches(f, topic) for f in filters)]
+            self._routes[topic] = route
+        return route
+
+    def _forward(self, topic: str, payload: bytes) -> None:
+        """Distribue un message aux abonnés (QoS 0)."""
+        route = self._route(topic)
+        if not route:
+            return
+        body = encode_string(topic) + payload
+        packet = bytes([PUBLISH << 4]) + encode_length(len(body)) + body
+        for writer in route:
+            if not writer.is_closing():
+                writer.write(packet)
+                self.delivered += 1
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Gère un client MQTT jusqu'à sa déconnexion."""
+        self.subscriptions[writer] = set()
+        try:
+            while True:
+                ptype, flags, body = await self._read_packet(reader)
+
+                if ptype == CONNECT:
+                    # Session non persistante, pas d'authentification
+                    writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+
+                elif ptype == PUBLISH:
+                    qos = (flags >> 1) & 0x03
+                    topic_len = struct.unpack("!H", body[:2])[0]
+                    topic = body[2:2 + topic_len].decode()
+                    offset = 2 + topic_len
+                    if qos:
+                        packet_id = body[offset:offset + 2]
+                        offset += 2
+                        writer.write(bytes([PUBACK << 4, 2]) + packet_id)
+                    self.published += 1
+                    self._forward(topic, body[offset:])
+
+                elif ptype == SUBSCRIBE:
+                    packet_id = body[:2]
+                    offset, granted = 2, bytearray()
+                    while offset < len(body):
+                        length = struct.unpack("!H", body[offset:offset + 2])[0]
+                        topic_filter = body[offset + 2:offset + 2 + length].decode()
+                        offset += 2 + length + 1
+                        self.subscriptions[writer].add(topic_filter)
+                        granted.append(0)
+                    self._routes.clear()
+                    payload = packet_id + bytes(granted)
+                    writer.write(bytes([SUBACK << 4]) + encode_length(len(payload)) + payload)
+
+                elif ptype == UNSUBSCRIBE:
+                    packet_id = body[:2]
+                    offset = 2
+                    while offset < len(body):
+                        length = struct.unpack("!H", body[offset:offset + 2])[0]
+                        self.subscriptions[writer].discard(body[offset + 2:offset + 2 + length].decode())
+                        offset += 2 + length
+                    self._routes.clear()
+                    writer.write(bytes([UNSUBACK << 4, 2]) + packet_id)
+
+                elif ptype == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+
+                elif ptype == DISCONNECT:
+                    break
+
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.subscriptions.pop(writer, None)
+            self._routes.clear()
+            writer.close()
+
+
+async def serve(host: str, port: int) -> None:
+    broker = MiniBroker()
+    server = await asyncio.start_server(broker.handle, host, port)
+    print(f"[Broker] MQTT en écoute sur {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broker MQTT minimal SmartHive")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
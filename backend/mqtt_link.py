@@ -0,0 +1,148 @@
+"""
+SmartHive Backend - Connexion MQTT supervisée
+
+Gère la connexion au broker hors de la boucle asyncio : la connexion
+(résolution DNS, TCP, TLS) et la boucle réseau paho tournent dans un
+thread dédié, avec reconnexion par backoff exponentiel et jitter.
+L'API HTTP/WebSocket démarre sans attendre le broker.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+import paho.mqtt.client as mqtt
+
+log = logging.getLogger("smarthive.mqtt")
+
+
+class MqttLink:
+    """
+    Superviseur de connexion d'un client paho.
+
+    Le thread enchaîne : tentative de connexion, boucle réseau tant que
+    la session est saine, puis attente avant nouvelle tentative. Le délai
+    double à chaque échec (borné) et est tiré au hasard dans sa moitié
+    haute, pour éviter que plusieurs instances ne reviennent en rafale
+    sur un broker qui redémarre.
+    """
+
+    def __init__(
+        self,
+        client: mqtt.Client,
+        host: str,
+        port: int,
+        keepalive: int = 60,
+        backoff_min: float = 1.0,
+        backoff_max: float = 60.0
+    ) -> None:
+        """
+        Initialise le superviseur (sans se connecter).
+
+        Args:
+            client: Client paho déjà configuré (callbacks, TLS, identifiants)
+            host: Adresse du broker
+            port: Port du broker
+            keepalive: Intervalle keepalive MQTT (s)
+            backoff_min: Délai après le premier échec (s)
+            backoff_max: Délai maximal entre deux tentatives (s)
+        """
+        self.client = client
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.attempts = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self.connected_since: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def connected(self) -> bool:
+        """True si la session MQTT est établie (CONNACK reçu)."""
+        return self.client.is_connected()
+
+    def backoff(self, failures: int) -> float:
+        """
+        Délai avant la prochaine tentative.
+
+        Args:
+            failures: Nombre d'échecs consécutifs (>= 1)
+
+        Returns:
+            Délai en secondes, dans [plafond/2, plafond]
+        """
+        ceiling = min(self.backoff_max, self.backoff_min * 2 ** (failures - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def start(self) -> None:
+        """Démarre le thread de connexion (retour immédiat)."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="smarthive-mqtt", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        """Déconnecte proprement et attend la fin du thread."""
+        self._stop.set()
+        try:
+            self.client.disconnect()
+        except Exception:
+            pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self) -> None:
+        failures = 0
+        while not self._stop.is_set():
+            self.attempts += 1
+            try:
+                self.client.connect(self.host, self.port, self.keepalive)
+                rc = mqtt.MQTT_ERR_SUCCESS
+                while rc == mqtt.MQTT_ERR_SUCCESS and not self._stop.is_set():
+                    rc = self.client.loop(timeout=1.0)
+                    if self.connected and self.connected_since is None:
+                        self.connected_since = time.time()
+                        self.last_error = None
+                        failures = 0
+                if rc != mqtt.MQTT_ERR_SUCCESS:
+                    self.last_error = mqtt.error_string(rc)
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+            self.connected_since = None
+            if self._stop.is_set():
+                break
+
+            failures += 1
+            self.failures += 1
+            delay = self.backoff(failures)
+            log.warning("Connexion au broker perdue ou impossible", extra={
+                "broker": f"{self.host}:{self.port}",
+                "error": self.last_error,
+                "retry_in_s": round(delay, 1)
+            })
+            self._stop.wait(delay)
+
+    def status(self) -> dict:
+        """
+        État de la connexion pour les endpoints de santé.
+
+        Returns:
+            Broker, état, tentatives et dernière erreur
+        """
+        return {
+            "broker": f"{self.host}:{self.port}",
+            "connected": self.connected,
+            "connected_since": self.connected_since,
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "last_error": self.last_error
+        }
@@ -0,0 +1,100 @@
+"""
+SmartHive Backend - Enregistrement des entrées brutes
+
+Journal binaire append-only des payloads MQTT bruts et des ingestions
+HTTP, horodatés à la réception, pour rejouer un trafic réel
+(cf. replay.py).
+
+Format d'un enregistrement (big-endian) :
+    [ts: float64][kind: 1 octet][len: uint32][payload: len octets]
+
+kind : b"M" = payload MQTT brut, b"H" = valeurs HTTP (JSON)
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import struct
+import threading
+import time
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+KIND_MQTT = b"M"
+KIND_HTTP = b"H"
+
+_HEADER = struct.Struct("!dcI")
+# Intervalle max entre deux flush disque (s)
+FLUSH_INTERVAL = 1.0
+
+
+class UplinkRecorder:
+    """
+    Enregistreur thread-safe (thread paho + boucle asyncio).
+
+    Les écritures sont bufferisées et vidées au plus toutes les
+    FLUSH_INTERVAL secondes pour rester négligeables sur le chemin chaud.
+    """
+
+    def __init__(self, filename: str) -> None:
+        """
+        Ouvre le journal en ajout.
+
+        Args:
+            filename: Chemin du fichier d'enregistrement
+        """
+        self.filename = filename
+        self._file: Optional[BinaryIO] = open(filename, "ab")
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self.count = 0
+
+    def record(self, kind: bytes, payload: bytes, ts: Optional[float] = None) -> None:
+        """
+        Ajoute un enregistrement.
+
+        Args:
+            kind: KIND_MQTT ou KIND_HTTP
+            payload: Données brutes
+            ts: Horodatage epoch (défaut: maintenant)
+        """
+        frame = _HEADER.pack(time.time() if ts is None else ts, kind, len(payload)) + payload
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(frame)
+            self.count += 1
+            now = time.monotonic()
+            if now - self._last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = now
+
+    def close(self) -> None:
+        """Vide le buffer et ferme le journal."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def iter_records(filename: str) -> Iterator[Tuple[float, bytes, bytes]]:
+    """
+    Lit un journal d'enregistrement.
+
+    Un enregistrement final tronqué (arrêt brutal) est ignoré.
+
+    Args:
+        filename: Chemin du fichier d'enregistrement
+
+    Yields:
+        Tuples (timestamp epoch, kind, payload)
+    """
+    with open(filename, "rb") as file:
+        while True:
+            header = file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                return
+            ts, kind, length = _HEADER.unpack(header)
+            payload = file.read(length)
+            if len(payload) < length:
+                return
+            yield ts, kind, payload
@@ -0,0 +1,255 @@
+"""
+Rejeu d'un enregistrement d'entrées SmartHive (cf. RECORD_FILE / recorder.py).
+
+Réinjecte les payloads MQTT bruts et les ingestions HTTP enregistrés,
+en respectant les écarts d'origine divisés par --speed (0 = au plus vite).
+
+Deux cibles :
+  - en processus (défaut) : importe main.py, appelle on_message() et les
+    endpoints HTTP via ASGI, sur un historique temporaire. Idéal avec
+    --profile pour profiler le chemin d'ingestion sur un portable.
+  - distante (--url) : POST HTTP vers une instance en cours et publication
+    MQTT des payloads bruts (--mqtt-host/--mqtt-port).
+
+Usage:
+  RECORD_FILE=uplinks.rec python main.py            # enregistrement en production
+  python replay.py uplinks.rec --speed 100
+  python replay.py uplinks.rec --speed 0 --profile replay.prof
+  python replay.py uplinks.rec --speed 1 --url http://localhost:2000 --mqtt-host localhost
+
+Les ingestions binaires (/api/ingest/binary) portant des champs absents
+des modèles JSON (humidité, luminosité) sont rejouées en msgpack sur ce
+même endpoint, pour ne rien perdre.
+
+Dépendances : httpx (paho-mqtt pour le rejeu MQTT distant, msgpack pour
+le rejeu des ingestions binaires), pip install -r requirements-dev.txt.
+"""
+
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import tempfile
+import time
+from typing import Optional, Tuple
+
+import httpx
+
+try:
+    import msgpack
+except ImportError:  # Dépendance optionnelle
+    msgpack = None
+
+from benchmark.common import format_stats, percentiles
+from recorder import KIND_HTTP, KIND_MQTT, iter_records
+
+DETECTION_FIELDS = ("bee_count", "hornet_count")
+LORA_FIELDS = ("temperature", "mass")
+DEFAULT_TOPIC = "v3/user@ttn/devices/device/up"
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("recording", type=str, help="Fichier d'enregistrement (RECORD_FILE)")
+    p.add_argument("--speed", type=float, default=1.0,
+                   help="Facteur d'accélération (1 = temps réel, 100 = x100, 0 = max)")
+    p.add_argument("--url", type=str, default=None,
+                   help="Instance cible (sinon rejeu en processus)")
+    p.add_argument("--mqtt-host", dest="mqtt_host", type=str, default=None,
+                   help="Broker MQTT pour le rejeu distant des payloads MQTT")
+    p.add_argument("--mqtt-port", dest="mqtt_port", type=int, default=1883)
+    p.add_argument("--mqtt-topic", dest="mqtt_topic", type=str, default=DEFAULT_TOPIC)
+    p.add_argument("--history", type=str, default=None,
+                   help="Historique CSV du rejeu en processus (défaut: fichier temporaire)")
+    p.add_argument("--profile", type=str, default=None,
+                   help="Écrit un profil cProfile du rejeu dans ce fichier")
+    return p.parse_args()
+
+
+def request_for(values: dict) -> Tuple[str, dict]:
+    """
+    Requête HTTP reproduisant des valeurs enregistrées.
+
+    Les valeurs couvertes par YoloData ou LoraData sont rejouées en JSON ;
+    les autres (ingestion binaire avec humidité/luminosité) le sont en
+    msgpack sur /api/ingest/binary, au format map de codec.py.
+
+    Args:
+        values: Champs enregistrés (+ "timestamp" epoch et "device_id"
+            optionnels)
+
+    Returns:
+        Tuple (chemin, arguments de httpx.AsyncClient.post)
+    """
+    fields = set(values) - {"timestamp", "device_id"}
+    if fields <= set(DETECTION_FIELDS):
+        return "/api/detections", {"json": values}
+    if fields <= set(LORA_FIELDS) or msgpack is None:
+        return "/api/lora-uplink", {"json": values}
+    body = {name: value for name, value in values.items() if name != "device_id"}
+    params = {"device_id": values["device_id"]} if "device_id" in values else {}
+    return "/api/ingest/binary", {"content": msgpack.packb(body), "params": params,
+                                  "headers": {"Content-Type": "application/msgpack"}}
+
+
+def is_lossy(values: dict) -> bool:
+    """Vrai si le rejeu JSON perd des champs (msgpack non installé)."""
+    fields = set(values) - {"timestamp", "device_id"}
+    return msgpack is None and not fields <= set(LORA_FIELDS + DETECTION_FIELDS)
+
+
+class InProcessTarget:
+    """Rejoue directement dans l'application (on_message + ASGI)."""
+
+    def __init__(self, history: Optional[str]) -> None:
+        if history is None:
+            history = os.path.join(tempfile.mkdtemp(prefix="replay-"), "history.csv")
+        # Avant l'import de main : historique dédié, pas de ré-enregistrement
+        os.environ["HISTORY_FILE"] = history
+        os.environ.pop("RECORD_FILE", None)
+        import main
+        import paho.mqtt.client as mqtt
+
+        self.main = main
+        self.mqtt = mqtt
+        self.history = history
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app),
+                                        base_url="http://replay")
+
+    async def start(self) -> None:
+        # Pas de startup_event : pas de connexion au broker configuré
+        self.main.main_loop = asyncio.get_running_loop()
+        print(f"Rejeu en processus (historique: {self.history})")
+
+    async def mqtt_payload(self, payload: bytes) -> None:
+        message = self.mqtt.MQTTMessage(topic=DEFAULT_TOPIC.encode())
+        message.payload = payload
+        self.main.on_message(self.main.mqtt_client, None, message)
+        # Laisse le broadcast planifié s'exécuter
+        await asyncio.sleep(0)
+
+    async def http_values(self, values: dict) -> int:
+        path, request = request_for(values)
+        response = await self.client.post(path, **request)
+        return response.status_code
+
+    async def close(self) -> None:
+        await self.client.aclose()
+        self.main.logger.flush(force=True)
+
+
+class RemoteTarget:
+    """Rejoue vers une instance en cours (HTTP + broker MQTT)."""
+
+    def __init__(self, args) -> None:
+        self.client = httpx.AsyncClient(base_url=args.url.rstrip("/"), timeout=5.0)
+        self.topic = args.mqtt_topic
+        self.mqtt_client = None
+        if args.mqtt_host:
+            import paho.mqtt.client as mqtt
+
+            self.mqtt_client = mqtt.Client()
+            self.mqtt_client.connect(args.mqtt_host, args.mqtt_port, 60)
+            self.mqtt_client.loop_start()
+        self.skipped_mqtt = 0
+        print(f"Rejeu vers {args.url}" + (f" + MQTT {args.mqtt_host}:{args.mqtt_port}"
+                                           if args.mqtt_host else " (MQTT ignoré)"))
+
+    async def start(self) -> None:
+        pass
+
+    async def mqtt_payload(self, payload: bytes) -> None:
+        if self.mqtt_client is None:
+            self.skipped_mqtt += 1
+            return
+        self.mqtt_client.publish(self.topic, payload, qos=0)
+
+    async def http_values(self, values: dict) -> int:
+        try:
+            path, request = request_for(values)
+            response = await self.client.post(path, **request)
+            return response.status_code
+        except httpx.HTTPError:
+            return 0
+
+    async def close(self) -> None:
+        await self.client.aclose()
+        if self.mqtt_client is not None:
+            self.mqtt_client.loop_stop()
+            self.mqtt_client.disconnect()
+
+
+async def replay(args, target) -> dict:
+    await target.start()
+    counts = {"mqtt": 0, "http": 0, "http_errors": 0, "http_lossy": 0}
+    lag_ms = []
+    first_ts = None
+    start = time.perf_counter()
+
+    for ts, kind, payload in iter_records(args.recording):
+        if first_ts is None:
+            first_ts = ts
+        if args.speed > 0:
+            due = start + (ts - first_ts) / args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag_ms.append(max(0.0, time.perf_counter() - due) * 1000.0)
+
+        if kind == KIND_MQTT:
+            await target.mqtt_payload(payload)
+            counts["mqtt"] += 1
+        elif kind == KIND_HTTP:
+            values = json.loads(payload)
+            status = await target.http_values(values)
+            counts["http"] += 1
+            if is_lossy(values):
+                counts["http_lossy"] += 1
+            if not 200 <= status < 300:
+                counts["http_errors"] += 1
+
+    # Derniers broadcasts planifiés
+    await asyncio.sleep(0.1)
+    await target.close()
+    elapsed = time.perf_counter() - start
+    total = counts["mqtt"] + counts["http"]
+    return {
+        **counts,
+        "elapsed_s": elapsed,
+        "records_per_s": total / elapsed if elapsed else 0.0,
+        "recorded_span_s": (ts - first_ts) if first_ts is not None else 0.0,
+        "lag_ms": percentiles(lag_ms),
+    }
+
+
+def main():
+    args = parse_args()
+    target = RemoteTarget(args) if args.url else InProcessTarget(args.history)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    report = asyncio.run(replay(args, target))
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+
+    print("\n" + "=" * 60)
+    print(f"REJEU x{args.speed:g}" if args.speed > 0 else "REJEU (vitesse max)")
+    print("=" * 60)
+    print(f"MQTT: {report['mqtt']} | HTTP: {report['http']} (erreurs: {report['http_errors']})")
+    if report["http_lossy"]:
+        print(f"Attention: {report['http_lossy']} ingestions binaires rejouées sans "
+              "humidité/luminosité (installer msgpack)")
+    print(f"Durée: {report['elapsed_s']:.2f}s pour {report['recorded_span_s']:.1f}s enregistrées "
+          f"| {report['records_per_s']:.0f} entrées/s")
+    if report["lag_ms"]:
+        print(f"Retard sur l'horaire: {format_stats(report['lag_ms'])}")
+    if profiler:
+        print(f"Profil: {args.profile} (python -m pstats {args.profile})")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,4 +6,5 @@ if exist history.csv (
 ) else (
     echo No history found.
 )
+if exist history.late.csv del history.late.csv
 pause
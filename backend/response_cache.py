@@ -0,0 +1,108 @@
+"""
+SmartHive Backend - Cache de réponses
+
+Cache LRU de réponses sérialisées, borné en octets, avec coalescence des
+requêtes concurrentes (single-flight) : plusieurs requêtes identiques
+arrivant pendant un calcul attendent ce même calcul au lieu de relancer
+chacune la lecture de l'historique.
+
+La clé inclut la version d'écriture du store : une écriture rend les
+entrées précédentes inaccessibles, elles sortent ensuite par LRU.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class ResponseCache:
+    """Cache LRU asyncio de corps de réponse (bytes) avec single-flight."""
+
+    def __init__(self, max_bytes: int) -> None:
+        """
+        Initialise le cache.
+
+        Args:
+            max_bytes: Taille cumulée maximale des réponses conservées
+                (0 = pas de mise en cache, coalescence seule)
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[bytes]]) -> bytes:
+        """
+        Retourne la réponse associée à une clé, en la calculant au besoin.
+
+        Le calcul tourne dans une tâche indépendante : l'annulation d'une
+        requête (client déconnecté) n'interrompt pas les autres en attente.
+
+        Args:
+            key: Clé de cache (paramètres de requête + version du store)
+            compute: Coroutine produisant le corps de la réponse
+
+        Returns:
+            Corps de la réponse sérialisé
+        """
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._complete(key, done))
+        return await asyncio.shield(task)
+
+    def _complete(self, key: Hashable, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        self._store(key, task.result())
+
+    def _store(self, key: Hashable, body: bytes) -> None:
+        if len(body) > self.max_bytes:
+            return
+        self._entries[key] = body
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Vide le cache (les calculs en cours ne sont pas annulés)."""
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        """
+        Statistiques du cache.
+
+        Returns:
+            Entrées, taille, hits, misses, requêtes coalescées et évictions
+        """
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "inflight": len(self._inflight)
+        }
@@ -1,24 +1,439 @@
-import requests
-import time
+"""
+Générateur de charge LoRaWAN / détections pour le backend SmartHive.
+
+Simule N ruches en asyncio, chacune avec :
+  - des courbes journalières réalistes (température, humidité, luminosité,
+    masse qui monte pendant la miellée et baisse la nuit)
+  - un flux de détections (abeilles proportionnelles au jour, rafales de frelons)
+
+Les mesures sont envoyées en HTTP (/api/lora-uplink, /api/detections) avec
+un pool de connexions, et/ou publiées en MQTT au format TTN
+(uplink_message.decoded_payload). Les latences de requêtes sont agrégées
+en histogrammes. Avec --seed, les valeurs envoyées sont reproductibles :
+chaque boucle (capteurs, détections) de chaque ruche a son propre
+générateur, et le temps simulé dépend du numéro de tick, pas de l'horloge.
+
+Usage:
+  python simulate_lora.py                                   # 1 ruche, 1 uplink / 5 s (comme avant)
+  python simulate_lora.py --devices 50 --sensor-rate 2 --detection-rate 5 --duration 60
+  python simulate_lora.py --devices 20 --mqtt --mqtt-host localhost --mqtt-port 1883 --no-http
+  python simulate_lora.py --time-scale 3600 --duration 24   # 1 journée simulée en 24 s
+
+Dépendances : httpx, paho-mqtt (pip install -r requirements-dev.txt).
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import math
 import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import httpx
+
+from benchmark.common import format_stats, percentiles
+from codec import SENSOR_FRAME
+
+DEFAULT_TOPIC = "v3/user@ttn/devices/device/up"
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--url", type=str, default="http://localhost:2000")
+    p.add_argument("--devices", type=int, default=1, help="Nombre de ruches simulées")
+    p.add_argument("--sensor-rate", dest="sensor_rate", type=float, default=0.2,
+                   help="Uplinks capteurs par seconde et par ruche")
+    p.add_argument("--detection-rate", dest="detection_rate", type=float, default=0.0,
+                   help="POST /api/detections par seconde et par ruche")
+    p.add_argument("--duration", type=float, default=0.0, help="Durée (s), 0 = infini")
+    p.add_argument("--time-scale", dest="time_scale", type=float, default=1.0,
+                   help="Secondes simulées par seconde réelle (courbes journalières)")
+    p.add_argument("--start-hour", dest="start_hour", type=float, default=None,
+                   help="Heure simulée de départ (défaut: heure courante)")
+    p.add_argument("--seed", type=int, default=None,
+                   help="Graine aléatoire (reproductibilité ; heure de départ 0h sauf --start-hour)")
+    p.add_argument("--pool", type=int, default=100, help="Connexions HTTP max du pool")
+    p.add_argument("--no-http", dest="http", action="store_false", help="Désactive l'envoi HTTP")
+    p.add_argument("--mqtt", action="store_true", help="Publie aussi les uplinks en MQTT (format TTN)")
+    p.add_argument("--mqtt-host", dest="mqtt_host", type=str, default="localhost")
+    p.add_argument("--mqtt-port", dest="mqtt_port", type=int, default=1883)
+    p.add_argument("--mqtt-topic", dest="mqtt_topic", type=str, default=DEFAULT_TOPIC)
+    p.add_argument("--mqtt-transport", dest="mqtt_transport", choices=["tcp", "websockets"],
+                   default="tcp")
+    p.add_argument("--mqtt-tls", dest="mqtt_tls", action="store_true")
+    p.add_argument("--mqtt-user", dest="mqtt_user", type=str, default=None)
+    p.add_argument("--mqtt-password", dest="mqtt_password", type=str, default=None)
+    p.add_argument("--mqtt-qos", dest="mqtt_qos", type=int, choices=[0, 1], default=1)
+    p.add_argument("--raw", action="store_true",
+                   help="Publie le frm_payload brut (formatter TTN désactivé) au lieu de decoded_payload")
+    p.add_argument("--report-interval", dest="report_interval", type=float, default=10.0,
+                   help="Intervalle des bilans intermédiaires (s)")
+    p.add_argument("--quiet", action="store_true", help="N'affiche pas chaque envoi")
+    return p.parse_args()
+
+
+# ============================================================================
+# MODÈLE DE RUCHE
+# ============================================================================
+
+class HiveModel:
+    """
+    Ruche simulée : courbes journalières + bruit, détections en rafales.
+
+    Toutes les grandeurs dépendent de l'heure simulée, pas de l'heure réelle.
+    """
+
+    def __init__(self, device_id: str, rng: random.Random) -> None:
+        self.device_id = device_id
+        # Un générateur par boucle : l'ordre des tirages ne dépend pas de
+        # l'ordonnancement des tâches asyncio
+        self.sensor_rng = random.Random(rng.getrandbits(64))
+        self.detection_rng = random.Random(rng.getrandbits(64))
+        # Chaque ruche a ses propres niveaux de base
+        self.base_temp = rng.uniform(14.0, 22.0)
+        self.temp_amplitude = rng.uniform(4.0, 9.0)
+        self.mass = rng.uniform(25.0, 45.0)
+        self.colony_size = rng.uniform(0.5, 1.5)
+        self.hornet_burst_until = 0.0
+        self.last_sim_t: Optional[float] = None
+
+    @staticmethod
+    def daylight(hour: float) -> float:
+        """Ensoleillement relatif (0 la nuit, 1 à midi solaire), jour 6h-21h."""
+        if hour < 6.0 or hour > 21.0:
+            return 0.0
+        return math.sin(math.pi * (hour - 6.0) / 15.0)
+
+    def sensors(self, sim_t: float, hour: float) -> Dict[str, float]:
+        """
+        Mesures capteurs à l'instant simulé.
+
+        Args:
+            sim_t: Temps simulé (s depuis le début)
+            hour: Heure simulée (0-24)
+        """
+        rng = self.sensor_rng
+        light = self.daylight(hour)
+        # Température : minimum vers 5h, maximum vers 15h
+        temperature = self.base_temp + self.temp_amplitude * math.sin(
+            2 * math.pi * (hour - 9.0) / 24.0) + rng.gauss(0, 0.3)
+        humidity = min(100.0, max(20.0, 85.0 - 2.5 * (temperature - self.base_temp)
+                                  + rng.gauss(0, 2.0)))
+        luminosity = max(0.0, 60000.0 * light * rng.uniform(0.6, 1.0))
+
+        # Masse : gain de miellée en journée, perte (consommation/évaporation) la nuit
+        if self.last_sim_t is not None:
+            dt_h = max(0.0, sim_t - self.last_sim_t) / 3600.0
+            rate = 0.15 * light * self.colony_size if light > 0.2 else -0.03
+            self.mass = min(200.0, max(0.0, self.mass + rate * dt_h))
+        self.last_sim_t = sim_t
+        mass = self.mass + rng.gauss(0, 0.02)
+
+        return {
+            "temperature": round(min(80.0, max(-40.0, temperature)), 2),
+            "humidity": round(humidity, 1),
+            "mass": round(mass, 2),
+            "luminosity": round(luminosity, 0),
+        }
+
+    def detections(self, sim_t: float, hour: float) -> Dict[str, int]:
+        """Compteurs de détection : abeilles ~ Poisson(jour), frelons en rafales."""
+        rng = self.detection_rng
+        light = self.daylight(hour)
+        bees = self._poisson(25.0 * light * self.colony_size)
+        if sim_t < self.hornet_burst_until:
+            hornets = self._poisson(3.0)
+        else:
+            hornets = 0
+            # Rafale de frelons (surtout l'après-midi), durée 2-10 min simulées
+            if light > 0.3 and rng.random() < 0.01:
+                self.hornet_burst_until = sim_t + rng.uniform(120.0, 600.0)
+        return {"bee_count": bees, "hornet_count": hornets}
+
+    def _poisson(self, lam: float) -> int:
+        """Tirage de Poisson (Knuth, suffisant pour lam < 50)."""
+        if lam <= 0:
+            return 0
+        limit = math.exp(-lam)
+        k, p = 0, 1.0
+        while True:
+            p *= self.detection_rng.random()
+            if p <= limit:
+                return k
+            k += 1
+
+    def ttn_uplink(self, values: Dict[str, float], received_at: datetime, raw: bool = False) -> dict:
+        """
+        Message TTN v3 avec le decoded_payload attendu par le backend, ou
+        avec le frm_payload brut (trame firmware 5 x float32) si raw.
+        """
+        stamp = received_at.isoformat().replace("+00:00", "Z")
+        uplink = {"f_port": 1, "received_at": stamp}
+        if raw:
+            frame = SENSOR_FRAME.encode({
+                "temperature1": values["temperature"],
+                "masse": values["mass"],
+                "temp3": values["temperature"],
+                "humd": values["humidity"],
+                "lum": values["luminosity"],
+            })
+            uplink["frm_payload"] = base64.b64encode(frame).decode()
+        else:
+            uplink["decoded_payload"] = {
+                "temperature1": values["temperature"],
+                "masse": values["mass"],
+                "humd": values["humidity"],
+                "lum": values["luminosity"],
+            }
+        return {
+            "end_device_ids": {"device_id": self.device_id},
+            "received_at": stamp,
+            "uplink_message": uplink,
+        }
+
+
+# ============================================================================
+# MESURES
+# ============================================================================
+
+class LatencyStats:
+    """Latences par canal + histogramme à buckets logarithmiques."""
+
+    BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, channel: str, ms: float) -> None:
+        self.samples.setdefault(channel, []).append(ms)
+
+    def error(self, channel: str) -> None:
+        self.errors[channel] = self.errors.get(channel, 0) + 1
 
-BACKEND_URL = "http://localhost:2000/api/lora-uplink"
+    def histogram(self, values: List[float]) -> List[tuple]:
+        counts = [0] * (len(self.BUCKETS_MS) + 1)
+        for v in values:
+            for i, bound in enumerate(self.BUCKETS_MS):
+                if v <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        labels = [f"<= {b} ms" for b in self.BUCKETS_MS] + [f"> {self.BUCKETS_MS[-1]} ms"]
+        return list(zip(labels, counts))
 
-print(f"Starting LoRaWAN simulator -> {BACKEND_URL}")
+    def report(self, elapsed: float, histograms: bool = False) -> None:
+        for channel in sorted(set(self.samples) | set(self.errors)):
+            values = self.samples.get(channel, [])
+            rate = len(values) / elapsed if elapsed > 0 else 0.0
+            print(f"  {channel:<12} {len(values):>7} ok ({rate:7.1f}/s) "
+                  f"| erreurs: {self.errors.get(channel, 0)}")
+            print(f"  {'':<12} {format_stats(percentiles(values))}")
+            if histograms and values:
+                peak = max(c for _, c in self.histogram(values)) or 1
+                for label, count in self.histogram(values):
+                    if count:
+                        bar = "#" * max(1, int(40 * count / peak))
+                        print(f"  {'':<12} {label:>10} {count:>7} {bar}")
 
-while True:
-    temperature = 20.0 + random.uniform(-5.0, 5.0)
-    mass = 30.0 + random.uniform(-1.0, 1.0)
-    
-    payload = {
-        "temperature": round(temperature, 2),
-        "mass": round(mass, 2)
-    }
-    
+
+# ============================================================================
+# ENVOIS
+# ============================================================================
+
+class MqttPublisher:
+    """Publication MQTT (thread réseau paho) avec mesure publish -> PUBACK."""
+
+    def __init__(self, args, stats: LatencyStats) -> None:
+        import paho.mqtt.client as mqtt
+
+        self.topic = args.mqtt_topic
+        self.qos = args.mqtt_qos
+        self.raw = args.raw
+        self.stats = stats
+        self.pending: Dict[int, float] = {}
+        self.client = mqtt.Client(transport=args.mqtt_transport)
+        if args.mqtt_user:
+            self.client.username_pw_set(args.mqtt_user, args.mqtt_password)
+        if args.mqtt_tls:
+            self.client.tls_set()
+        self.client.on_publish = self._on_publish
+        self.client.max_inflight_messages_set(1000)
+        self.client.connect(args.mqtt_host, args.mqtt_port, 60)
+        self.client.loop_start()
+
+    def _on_publish(self, client, userdata, mid, *extra) -> None:
+        sent = self.pending.pop(mid, None)
+        if sent is not None:
+            self.stats.record("mqtt", (time.perf_counter() - sent) * 1000.0)
+
+    def publish(self, payload: dict) -> None:
+        info = self.client.publish(self.topic, json.dumps(payload), qos=self.qos)
+        if info.rc != 0:
+            self.stats.error("mqtt")
+        elif self.qos > 0:
+            self.pending[info.mid] = time.perf_counter()
+        else:
+            self.stats.record("mqtt", 0.0)
+
+    def close(self) -> None:
+        self.client.loop_stop()
+        self.client.disconnect()
+
+
+async def post(client: httpx.AsyncClient, path: str, payload: dict,
+               channel: str, stats: LatencyStats) -> Optional[int]:
+    start = time.perf_counter()
     try:
-        response = requests.post(BACKEND_URL, json=payload, timeout=1)
-        print(f"Sent: {payload} -> {response.status_code}")
-    except Exception as e:
-        print(f"Error: {e}")
-        
-    time.sleep(5)
+        response = await client.post(path, json=payload)
+        stats.record(channel, (time.perf_counter() - start) * 1000.0)
+        if response.status_code >= 400:
+            stats.error(channel)
+        return response.status_code
+    except httpx.HTTPError:
+        stats.error(channel)
+        return None
+
+
+class SimClock:
+    """Horloge simulée : accélère les courbes journalières."""
+
+    def __init__(self, time_scale: float, start_hour: Optional[float]) -> None:
+        self.time_scale = time_scale
+        self.t0 = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        if start_hour is not None:
+            now = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(hours=start_hour)
+        self.start = now
+
+    def sim_t(self) -> float:
+        return (time.perf_counter() - self.t0) * self.time_scale
+
+    def now(self, sim_t: Optional[float] = None) -> datetime:
+        return self.start + timedelta(seconds=self.sim_t() if sim_t is None else sim_t)
+
+    def hour(self, sim_t: Optional[float] = None) -> float:
+        now = self.now(sim_t)
+        return now.hour + now.minute / 60.0 + now.second / 3600.0
+
+
+async def device_loop(hive: HiveModel, rate: float, kind: str, clock: SimClock,
+                      client: Optional[httpx.AsyncClient], mqtt_pub: Optional[MqttPublisher],
+                      stats: LatencyStats, stop: asyncio.Event, quiet: bool) -> None:
+    """Boucle d'une ruche pour un type d'envoi (capteurs ou détections)."""
+    if rate <= 0:
+        return
+    interval = 1.0 / rate
+    rng = hive.sensor_rng if kind == "sensor" else hive.detection_rng
+    # Décalage initial aléatoire pour ne pas synchroniser toutes les ruches
+    offset = rng.uniform(0, interval)
+    await asyncio.sleep(offset)
+    next_t = time.perf_counter()
+    tick = 0
+    while not stop.is_set():
+        # Temps simulé du tick (indépendant des retards d'exécution)
+        sim_t = (offset + tick * interval) * clock.time_scale
+        hour = clock.hour(sim_t)
+        tick += 1
+        if kind == "sensor":
+            values = hive.sensors(sim_t, hour)
+            if client is not None:
+                status = await post(client, "/api/lora-uplink",
+                                    {"temperature": values["temperature"], "mass": values["mass"],
+                                     "device_id": hive.device_id},
+                                    "http_lora", stats)
+                if not quiet:
+                    print(f"[{hive.device_id}] Sent: {values} -> {status}")
+            if mqtt_pub is not None:
+                mqtt_pub.publish(hive.ttn_uplink(values, clock.now(sim_t), mqtt_pub.raw))
+        else:
+            counts = hive.detections(sim_t, hour)
+            if client is not None:
+                status = await post(client, "/api/detections", {**counts, "device_id": hive.device_id},
+                                    "http_detect", stats)
+                if not quiet:
+                    print(f"[{hive.device_id}] Sent: {counts} -> {status}")
+
+        next_t += interval
+        delay = next_t - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            # En retard : on ne rattrape pas en rafale
+            next_t = time.perf_counter()
+
+
+async def run(args) -> None:
+    rng = random.Random(args.seed)
+    stats = LatencyStats()
+    start_hour = 0.0 if args.start_hour is None and args.seed is not None else args.start_hour
+    clock = SimClock(args.time_scale, start_hour)
+    hives = [HiveModel(f"hive-{i:04d}", random.Random(rng.random())) for i in range(args.devices)]
+
+    client = None
+    if args.http:
+        limits = httpx.Limits(max_connections=args.pool, max_keepalive_connections=args.pool)
+        client = httpx.AsyncClient(base_url=args.url.rstrip("/"), limits=limits, timeout=5.0)
+    mqtt_pub = MqttPublisher(args, stats) if args.mqtt else None
+
+    channels = []
+    if args.http:
+        channels.append(f"HTTP {args.url}")
+    if args.mqtt:
+        channels.append(f"MQTT {args.mqtt_host}:{args.mqtt_port}/{args.mqtt_topic}")
+    print(f"Starting LoRaWAN simulator: {args.devices} ruche(s) -> {', '.join(channels) or 'rien'}")
+    print(f"Débits: capteurs {args.sensor_rate}/s, détections {args.detection_rate}/s par ruche"
+          f" | échelle de temps x{args.time_scale:g} | seed={args.seed}")
+
+    stop = asyncio.Event()
+    tasks = []
+    for hive in hives:
+        tasks.append(asyncio.create_task(device_loop(
+            hive, args.sensor_rate, "sensor", clock, client, mqtt_pub, stats, stop, args.quiet)))
+        tasks.append(asyncio.create_task(device_loop(
+            hive, args.detection_rate, "detection", clock, client, mqtt_pub, stats, stop, args.quiet)))
+
+    start = time.perf_counter()
+    try:
+        while True:
+            elapsed = time.perf_counter() - start
+            if args.duration and elapsed >= args.duration:
+                break
+            wait = args.report_interval
+            if args.duration:
+                wait = min(wait, args.duration - elapsed)
+            await asyncio.sleep(wait)
+            if not args.duration or time.perf_counter() - start < args.duration:
+                print(f"\n--- {time.perf_counter() - start:.0f}s (heure simulée {clock.now():%H:%M}) ---")
+                stats.report(time.perf_counter() - start)
+    finally:
+        stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if client is not None:
+            await client.aclose()
+        if mqtt_pub is not None:
+            await asyncio.sleep(0.5)  # Derniers PUBACK
+            mqtt_pub.close()
+
+    elapsed = time.perf_counter() - start
+    print("\n" + "=" * 60)
+    print(f"BILAN ({elapsed:.1f}s, {args.devices} ruches)")
+    print("=" * 60)
+    stats.report(elapsed, histograms=True)
+    print("=" * 60)
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
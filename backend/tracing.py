@@ -0,0 +1,133 @@
+"""
+SmartHive Backend - Traces de latence de bout en bout
+
+Une détection porte un contexte de trace depuis la capture de l'image
+(identifiant de frame + horodatage de capture) jusqu'au broadcast vers
+les dashboards. Chaque étape est chronométrée :
+
+    edge.*     durées mesurées sur l'équipement (prétraitement, inférence,
+               annotation, encodage...) avec son horloge monotone
+    uplink     envoi edge -> réception backend (horloges différentes)
+    ingest     réception -> état à jour + ligne dans le tampon CSV
+    broadcast  fan-out WebSocket/SSE
+    total      capture -> fin du broadcast ("glass-to-dashboard" côté serveur)
+
+`uplink` et `total` comparent l'horloge de l'équipement à celle du
+serveur : ils supposent des horloges synchronisées (NTP, ou même machine).
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+# Étapes mesurées par le backend, dans l'ordre du chemin
+SERVER_STAGES = ("uplink", "ingest", "broadcast", "total")
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """
+    Percentiles par rang le plus proche.
+
+    Args:
+        samples: Valeurs (ms)
+
+    Returns:
+        count, p50, p90, p99, max (vide si aucun échantillon)
+    """
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "count": len(ordered),
+        "p50": round(rank(50), 2),
+        "p90": round(rank(90), 2),
+        "p99": round(rank(99), 2),
+        "max": round(ordered[-1], 2)
+    }
+
+
+class LatencyTracker:
+    """
+    Fenêtre glissante des durées par étape.
+
+    Thread-safe ; les percentiles sont calculés à la lecture sur les
+    `window` dernières traces, pour refléter le régime courant.
+    """
+
+    def __init__(self, window: int = 1000, keep_recent: int = 20) -> None:
+        """
+        Args:
+            window: Nombre d'échantillons conservés par étape
+            keep_recent: Nombre de traces complètes conservées (débogage)
+        """
+        self.window = window
+        self._stages: Dict[str, Deque[float]] = {}
+        self._recent: Deque[dict] = deque(maxlen=keep_recent)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def record(self, trace: dict, ingested_at: float, broadcast_at: float) -> Dict[str, float]:
+        """
+        Enregistre une trace terminée.
+
+        Args:
+            trace: Contexte reçu (frame_id, captured_at, sent_at?, stages?)
+                complété par `received_at` (horloge serveur)
+            ingested_at: Fin de l'ingestion (epoch serveur)
+            broadcast_at: Fin du broadcast (epoch serveur)
+
+        Returns:
+            Durées par étape (ms)
+        """
+        durations = {f"edge.{name}": float(ms) for name, ms in (trace.get("stages") or {}).items()}
+        received_at = trace["received_at"]
+        if trace.get("sent_at") is not None:
+            durations["uplink"] = (received_at - trace["sent_at"]) * 1000
+        durations["ingest"] = (ingested_at - received_at) * 1000
+        durations["broadcast"] = (broadcast_at - ingested_at) * 1000
+        durations["total"] = (broadcast_at - trace["captured_at"]) * 1000
+
+        with self._lock:
+            self.total += 1
+            for stage, ms in durations.items():
+                samples = self._stages.get(stage)
+                if samples is None:
+                    samples = self._stages[stage] = deque(maxlen=self.window)
+                samples.append(ms)
+            self._recent.append({
+                "frame_id": trace.get("frame_id"),
+                "captured_at": trace.get("captured_at"),
+                "stages_ms": {stage: round(ms, 2) for stage, ms in durations.items()}
+            })
+        return durations
+
+    def report(self, recent: Optional[int] = None) -> dict:
+        """
+        Percentiles par étape sur la fenêtre courante.
+
+        Args:
+            recent: Nombre de traces complètes à inclure (défaut: toutes)
+
+        Returns:
+            {"traces": n, "window": w, "stages": {étape: percentiles}, "recent": [...]}
+        """
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self._stages.items()}
+            last = list(self._recent)
+        edge = sorted(stage for stage in stages if stage not in SERVER_STAGES)
+        ordered = edge + [stage for stage in SERVER_STAGES if stage in stages]
+        return {
+            "traces": self.total,
+            "window": self.window,
+            "unit": "ms",
+            "stages": {stage: percentiles(stages[stage]) for stage in ordered},
+            "recent": last if recent is None else last[-recent:] if recent else []
+        }
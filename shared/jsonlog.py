@@ -0,0 +1,171 @@
+"""
+SmartHive - Journalisation structurée asynchrone
+
+Logs JSON (une ligne par évènement) écrits par une thread dédiée :
+l'appelant ne fait que filtrer et déposer l'enregistrement dans une file
+bornée, il ne bloque jamais sur stdout. Module partagé par le backend et
+ai-vision : chaque service ajoute le dossier shared/ à son sys.path.
+
+Protections contre les rafales d'erreurs (broker ou backend injoignable) :
+- limitation par site d'appel (fichier:ligne) : LOG_RATE_BURST
+  enregistrements par fenêtre de LOG_RATE_INTERVAL secondes, les suivants
+  sont comptés puis signalés par `suppressed` sur le prochain émis
+- file pleine : l'enregistrement est abandonné et compté (`dropped`)
+- bibliothèques tierces (httpx, paho, ...) plafonnées à
+  LOG_THIRD_PARTY_LEVEL : leurs INFO par requête noieraient la sortie
+
+Usage:
+    import logging, jsonlog
+    jsonlog.setup_logging("backend")
+    log = logging.getLogger("smarthive.mqtt")
+    log.warning("Erreur traitement message", extra={"error": str(e)})
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_RATE_BURST = int(os.getenv("LOG_RATE_BURST", "10"))
+LOG_RATE_INTERVAL = float(os.getenv("LOG_RATE_INTERVAL", "10"))
+LOG_THIRD_PARTY_LEVEL = os.getenv("LOG_THIRD_PARTY_LEVEL", "WARNING").upper()
+THIRD_PARTY_LOGGERS = ("httpx", "httpcore", "paho", "urllib3", "multipart", "asyncio")
+
+# Attributs standard d'un LogRecord : tout le reste vient de `extra`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formate un enregistrement en une ligne JSON."""
+
+    def __init__(self, service: str) -> None:
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "service": self.service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "site": f"{record.module}:{record.lineno}",
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    """Limite le débit par site d'appel (fenêtre fixe, `burst` par fenêtre)."""
+
+    def __init__(self, burst: int = LOG_RATE_BURST, interval: float = LOG_RATE_INTERVAL) -> None:
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.suppressed_total = 0
+        # site -> [début de fenêtre, émis, supprimés]
+        self._sites: Dict[Tuple[str, int], List] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.burst <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._sites.get(site)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._sites[site] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                self.suppressed_total += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler non bloquant : file pleine = enregistrement abandonné."""
+
+    def __init__(self, log_queue: queue.Queue) -> None:
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Message figé dans la thread appelante ; le formatage JSON (et
+        # celui de la trace d'exception) est fait par la thread d'écriture
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_rate_limit: Optional[RateLimitFilter] = None
+
+
+def setup_logging(service: str) -> None:
+    """
+    Configure le logger racine (idempotent).
+
+    Args:
+        service: Nom du service, ajouté à chaque ligne
+    """
+    global _handler, _rate_limit
+    if _handler is not None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter(service))
+    listener = logging.handlers.QueueListener(log_queue, output)
+
+    _rate_limit = RateLimitFilter()
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.addFilter(_rate_limit)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(LOG_LEVEL)
+    for name in THIRD_PARTY_LOGGERS:
+        logging.getLogger(name).setLevel(LOG_THIRD_PARTY_LEVEL)
+
+    listener.start()
+    atexit.register(listener.stop)
+
+
+def stats() -> dict:
+    """
+    Compteurs de pertes volontaires.
+
+    Returns:
+        Enregistrements supprimés par limitation et abandonnés (file pleine)
+    """
+    return {
+        "suppressed": _rate_limit.suppressed_total if _rate_limit else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
@@ -0,0 +1,185 @@
+"""
+SmartHive - Profilage à la demande des services en cours d'exécution
+
+Endpoints d'administration authentifiés, montés par le backend et par le
+serveur vidéo (module partagé, dossier shared/ sur leur sys.path) :
+
+    POST /admin/profile?seconds=N      échantillonnage CPU de toutes les
+                                       threads pendant N secondes, réponse
+                                       au format "collapsed stacks"
+                                       (flamegraph.pl, speedscope)
+    POST /admin/tracemalloc?seconds=N  allocations mémoire sur N secondes
+                                       (différence de snapshots tracemalloc)
+
+Le profileur échantillonne les piles via sys._current_frames() depuis
+une thread dédiée : aucun hook sur les appels, coût proportionnel à la
+fréquence d'échantillonnage, rien ne tourne hors d'une session.
+
+Authentification : en-tête `Authorization: Bearer <ADMIN_TOKEN>`.
+Sans ADMIN_TOKEN, les endpoints répondent 404.
+
+Auteur: SmartHive Team
+Version: 1.0.0
+"""
+
+import asyncio
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+# Durée maximale d'une session de profilage (s)
+PROFILE_MAX_SECONDS = 120.0
+
+
+class StackSampler:
+    """Profileur par échantillonnage des piles de toutes les threads Python."""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        """
+        Args:
+            interval: Période d'échantillonnage (s)
+        """
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _collapse(frame, thread_name: str) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        names.append(thread_name)
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.stacks[self._collapse(frame, names.get(thread_id, str(thread_id)))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        """Démarre l'échantillonnage."""
+        self._thread = threading.Thread(target=self._run, name="smarthive-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Arrête l'échantillonnage."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """Piles au format collapsed ("a;b;c count" par ligne)."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def admin_router(token: str = ADMIN_TOKEN) -> APIRouter:
+    """
+    Construit le routeur des endpoints de profilage.
+
+    Args:
+        token: Jeton d'administration (vide = endpoints désactivés)
+
+    Returns:
+        Routeur FastAPI à monter avec app.include_router()
+    """
+    router = APIRouter(prefix="/admin", tags=["admin"])
+    # Une seule session à la fois (le profilage perturbe les mesures)
+    busy = asyncio.Lock()
+
+    def require_admin(authorization: Optional[str] = Header(None)) -> None:
+        if not token:
+            raise HTTPException(status_code=404, detail="Not Found")
+        scheme, _, provided = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(provided.encode(), token.encode()):
+            raise HTTPException(status_code=401, detail="Jeton d'administration invalide")
+
+    @router.post("/profile", dependencies=[Depends(require_admin)], response_class=PlainTextResponse)
+    async def profile(
+        seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+        interval_ms: float = Query(10.0, ge=1, le=1000)
+    ) -> PlainTextResponse:
+        """
+        Profil CPU par échantillonnage pendant `seconds` secondes.
+
+        Returns:
+            Piles au format collapsed (flamegraph.pl / speedscope)
+        """
+        if busy.locked():
+            raise HTTPException(status_code=409, detail="Profilage déjà en cours")
+        async with busy:
+            sampler = StackSampler(interval_ms / 1000)
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.stop()
+        return PlainTextResponse(
+            sampler.collapsed(),
+            headers={"X-Profile-Samples": str(sampler.samples)}
+        )
+
+    @router.post("/tracemalloc", dependencies=[Depends(require_admin)])
+    async def trace_allocations(
+        seconds: float = Query(10.0, gt=0, le=PROFILE_MAX_SECONDS),
+        top: int = Query(25, ge=1, le=500),
+        frames: int = Query(1, ge=1, le=50)
+    ) -> dict:
+        """
+        Allocations nettes pendant `seconds` secondes (tracemalloc).
+
+        Returns:
+            Mémoire tracée et principales lignes allocatrices (octets, nombre)
+        """
+        if busy.locked():
+            raise HTTPException(status_code=409, detail="Profilage déjà en cours")
+        async with busy:
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(frames)
+            try:
+                before = await run_in_threadpool(tracemalloc.take_snapshot)
+                start = time.time()
+                await asyncio.sleep(seconds)
+                after = await run_in_threadpool(tracemalloc.take_snapshot)
+                current, peak = tracemalloc.get_traced_memory()
+            finally:
+                if started:
+                    tracemalloc.stop()
+        # Les allocations de tracemalloc lui-même ne sont pas pertinentes
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        key = "traceback" if frames > 1 else "lineno"
+        stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), key)[:top]
+        return {
+            "duration_s": round(time.time() - start, 2),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [
+                {
+                    "size_diff": stat.size_diff,
+                    "count_diff": stat.count_diff,
+                    "size": stat.size,
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback]
+                }
+                for stat in stats
+            ]
+        }
+
+    return router